@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'management.metrics.QueryMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,6 +51,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'management.reporting.PrimaryAfterWriteMiddleware',
 
 ]
 
@@ -77,13 +79,46 @@ WSGI_APPLICATION = 'homeowners_association.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# SQLite in WAL mode lets tenants read while staff run billing or imports. Writers wait up to
+# the timeout (seconds) for the lock instead of failing with "database is locked".
+# The test database is a file too, an in-memory one cannot be shared in WAL mode by concurrent connections.
+# db.sqlite3 is not tracked, every connection switches it to WAL and leaves -wal/-shm files next to it.
+# Create it with manage.py migrate.
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'management.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'timeout': 20,
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+        },
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
+# Read-only copy of the primary for the yearly summaries, PDF exports and history lists, refreshed with
+# the refresh_reporting_db command. Until the first refresh, and in tests, these pages read the primary.
+
+DATABASES['reporting'] = {
+    **DATABASES['default'],
+    'NAME': BASE_DIR / 'reporting.sqlite3',
+    'TEST': {
+        'MIRROR': 'default',
+    },
+}
+DATABASE_ROUTERS = ['management.reporting.ReportingRouter']
+REPORTING_DATABASE = 'reporting'
+
+# Seconds a client reads the primary after changing data, so it sees its own changes before the next refresh
+
+REPORTING_PRIMARY_AFTER_WRITE = 300
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -126,6 +161,59 @@ STATIC_ROOT = BASE_DIR / 'static/'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media/'
 
+# Process-local cache, an invalidation is only seen by the worker that made it. Cached values expire on their
+# own, the filter form choices after FORM_CHOICES_TIMEOUT seconds. Point it at a shared backend (Redis,
+# Memcached) to make invalidations visible to every worker at once.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+FORM_CHOICES_TIMEOUT = 60
+
+# Worker processes used for bulk PDF statement exports, None for one per CPU core
+
+PDF_WORKERS = None
+
+# Rendered yearly summary PDFs, invalidated when their inputs change
+
+PDF_CACHE_DIR = BASE_DIR / 'cache' / 'pdf'
+PDF_CACHE_MAX_SIZE = 200 * 1024 * 1024
+
+# Bank statement import. An apartment's acc_number has to equal the last BANK_ACCOUNT_DIGITS digits of the
+# account, a longer acc_number as many digits as it has. BANK_TITLE_PATTERNS find the apartment number
+# in transfer titles, e.g. "czynsz m. 12", "lokal nr 3", "mieszkanie 7", but not an area like "53 m2"
+
+BANK_ACCOUNT_DIGITS = 8
+BANK_TITLE_PATTERNS = (
+    r'\b(?:mieszkani[ea]|mieszk|lokal[u]?|lok|(?<!\d\s)m)\.?\s*(?:nr\.?\s*)?(?P<number>\d{1,4})\b',
+)
+
+# Most queries a view may issue per request, by URL name. Requests over budget are logged as warnings
+# and fail the view budget tests
+
+QUERY_BUDGETS = {
+    'overview': 2,
+    'water-readouts': 4,
+    'admin-water-readouts': 9,
+    'fees': 3,
+    'fees-history': 4,
+    'summary': 6,
+    'admin-summary': 5,
+    'admin-yearly-summary': 7,
+    'billing-runs': 3,
+    'apartment-balance': 5,
+    'association-balance': 6,
+    'calculate-single-payment': 5,
+    'central-heating-surcharge': 6,
+    'parking-card': 5,
+    'big-family-card': 6,
+    'occupancy': 9,
+    'bank-statement-review': 5,
+    'query-metrics': 2,
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import ApartmentUser, Apartment, Fees, WaterReadouts, Occupancy, ApartmentBalance, ParkingCard, \
-    CentralHeatingSurcharge
+    CentralHeatingSurcharge, BillingRun, BankStatementLine
 
 
 # Register your models here.
@@ -43,6 +43,32 @@ class WaterReadoutsAdmin(admin.ModelAdmin):
     ordering = ('-readout_date', 'apartment__number')
 
 
+class BillingRunAdmin(admin.ModelAdmin):
+    model = BillingRun
+    list_display = ('period', 'title', 'total', 'created_at', 'rolled_back_at')
+    readonly_fields = ('key', 'total', 'created_at', 'created_by', 'rolled_back_at')
+
+
+class BankStatementLineAdmin(admin.ModelAdmin):
+    model = BankStatementLine
+    list_display = ('date', 'amount', 'title', 'counterparty', 'status', 'apartment')
+    list_filter = ('status', 'matched_by')
+    readonly_fields = ('fingerprint', 'entry', 'imported_at')
+
+
+class ApartmentBalanceAdmin(admin.ModelAdmin):
+    """Entries can only be added, a mistake is reversed with a correction entry."""
+    model = ApartmentBalance
+    list_display = ('apartment', 'date', 'title', 'amount', 'balance', 'type_of_transaction')
+    readonly_fields = ('balance',)
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 class FeesAdmin(admin.ModelAdmin):
     model = Fees
     ordering = ('-period',)
@@ -53,6 +79,8 @@ admin.site.register(Apartment, ApartmentAdmin)
 admin.site.register(Fees)
 admin.site.register(WaterReadouts, WaterReadoutsAdmin)
 admin.site.register(Occupancy, OccupancyAdmin)
-admin.site.register(ApartmentBalance)
+admin.site.register(ApartmentBalance, ApartmentBalanceAdmin)
 admin.site.register(ParkingCard)
 admin.site.register(CentralHeatingSurcharge)
+admin.site.register(BillingRun, BillingRunAdmin)
+admin.site.register(BankStatementLine, BankStatementLineAdmin)
@@ -0,0 +1,27 @@
+from django.db.backends.sqlite3 import base
+
+PRAGMAS = ('journal_mode', 'synchronous')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite backend for a database shared by concurrent requests.
+    The journal_mode and synchronous OPTIONS are applied as pragmas on every new connection, so with WAL
+    readers are not blocked by a writer. The timeout option is SQLite's busy timeout.
+    Transactions started with begin_immediate set take the write lock with BEGIN IMMEDIATE,
+    see management.db.write_transaction."""
+
+    begin_immediate = False
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = {name: params.pop(name) for name in PRAGMAS if name in params}
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute("BEGIN IMMEDIATE" if self.begin_immediate else "BEGIN")
@@ -0,0 +1,283 @@
+import codecs
+import csv
+import datetime
+import hashlib
+import re
+from collections import Counter, defaultdict, namedtuple
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from .db import write_transaction
+from .models import Apartment, ApartmentBalance, BankStatementLine
+from .utils import IMPORT_BATCH_SIZE
+
+StatementLine = namedtuple('StatementLine', ['date', 'amount', 'title', 'account', 'counterparty', 'reference'])
+
+CSV_COLUMNS = {
+    'date': ('data operacji', 'data transakcji', 'data księgowania', 'data waluty', 'data', 'date'),
+    'amount': ('kwota', 'kwota operacji', 'amount'),
+    'title': ('tytuł', 'tytuł operacji', 'tytułem', 'opis', 'opis operacji', 'title', 'description'),
+    'account': ('rachunek', 'nr rachunku', 'numer rachunku', 'rachunek wirtualny', 'konto', 'account'),
+    'counterparty': ('nadawca', 'kontrahent', 'dane kontrahenta', 'nadawca / odbiorca', 'counterparty'),
+    'reference': ('referencje', 'numer referencyjny', 'id transakcji', 'reference'),
+}
+CSV_DATE_FORMATS = ('%Y-%m-%d', '%d.%m.%Y', '%d-%m-%Y', '%Y.%m.%d', '%d/%m/%Y')
+MT940_TAG = re.compile(r'^:(?P<tag>\d{2}[A-Z]?):(?P<value>.*)$')
+MT940_61 = re.compile(r'^(?P<date>\d{6})(?P<entry_date>\d{4})?(?P<mark>R?[CD])[A-Z]?(?P<amount>\d+,\d{0,2})'
+                      r'(?P<type>[NSF][A-Z0-9]{3})(?P<reference>[^/\n]*)(?://(?P<bank_reference>[^\n]*))?')
+MT940_86 = re.compile(r'[~<^](\d{2})([^~<^]*)')
+
+
+def _amount(value):
+    try:
+        return Decimal(value.replace('\xa0', '').replace(' ', '').replace(',', '.'))
+    except InvalidOperation:
+        raise ValidationError(f"Niepoprawna kwota: {value}")
+
+
+def _aware(date):
+    return timezone.make_aware(datetime.datetime.combine(date, datetime.time(12)))
+
+
+def _csv_date(value):
+    for date_format in CSV_DATE_FORMATS:
+        try:
+            return _aware(datetime.datetime.strptime(value.strip()[:10], date_format).date())
+        except ValueError:
+            continue
+    raise ValidationError(f"Niepoprawna data: {value}")
+
+
+def _lines(file):
+    """Decodes the uploaded file line by line, as UTF-8 or, when the start of the file is not valid UTF-8,
+    as cp1250 used by Polish bank exports."""
+    encoding = 'utf-8-sig'
+    try:
+        codecs.getincrementaldecoder(encoding)().decode(file.read(64 * 1024))
+    except UnicodeDecodeError:
+        encoding = 'cp1250'
+    file.seek(0)
+    return codecs.iterdecode(file, encoding)
+
+
+def read_csv_statement(lines):
+    """Streams a CSV bank export with a header row. Columns are found by their Polish or English names,
+    only the date and the amount are required. The delimiter is a semicolon, a comma or a tab.
+    :returns: generator of StatementLine"""
+    lines = iter(lines)
+    header = next(lines, '')
+    delimiter = max((';', ',', '\t'), key=header.count)
+    names = [name.strip().strip('"').lower() for name in next(csv.reader([header], delimiter=delimiter), [])]
+    columns = {}
+    for field, aliases in CSV_COLUMNS.items():
+        for alias in aliases:
+            if alias in names:
+                columns[field] = names.index(alias)
+                break
+    missing = [field for field in ('date', 'amount') if field not in columns]
+    if missing:
+        raise ValidationError(f"Brak kolumn w pliku CSV: {', '.join(CSV_COLUMNS[field][0] for field in missing)}")
+
+    for row in csv.reader(lines, delimiter=delimiter):
+        if not any(value.strip() for value in row):
+            continue
+        values = {field: row[index].strip() if index < len(row) else '' for field, index in columns.items()}
+        yield StatementLine(date=_csv_date(values['date']), amount=_amount(values['amount']),
+                            title=values.get('title', ''), account=values.get('account', ''),
+                            counterparty=values.get('counterparty', ''), reference=values.get('reference', ''))
+
+
+def _mt940_fields(lines):
+    """:returns: generator of (tag, value) of an MT940 statement, continuation lines joined to their field"""
+    tag, value = None, []
+    for line in lines:
+        line = line.rstrip('\r\n')
+        match = MT940_TAG.match(line)
+        if match or line.startswith('-}') or line == '-':
+            if tag:
+                yield tag, value
+            tag, value = (match.group('tag'), [match.group('value')]) if match else (None, [])
+        elif tag:
+            value.append(line)
+    if tag:
+        yield tag, value
+
+
+def _mt940_details(value):
+    """Splits the :86: field into title, counterparty and account. Polish banks structure it
+    with ~NN subfields, unstructured details are used as the title."""
+    subfields = {}
+    for code, text in MT940_86.findall(''.join(value)):
+        subfields[code] = subfields.get(code, '') + text
+    if not subfields:
+        return ' '.join(line.strip() for line in value), '', ''
+    title = ' '.join(subfields.get(code, '').strip() for code in ('20', '21', '22', '23', '24', '25')
+                     if subfields.get(code, '').strip())
+    counterparty = ' '.join(subfields.get(code, '').strip() for code in ('27', '28', '29', '32', '33')
+                            if subfields.get(code, '').strip())
+    account = subfields.get('38') or subfields.get('31', '')
+    return title, counterparty, account.strip()
+
+
+def read_mt940_statement(lines):
+    """Streams the transactions of an MT940 statement, every :61: line with the :86: details following it.
+    Reversals of credits come out as debits and the other way round.
+    :returns: generator of StatementLine"""
+    pending = None
+    for tag, value in _mt940_fields(lines):
+        if tag == '61':
+            if pending:
+                yield StatementLine(**pending)
+            match = MT940_61.match(value[0])
+            if not match:
+                raise ValidationError(f"Niepoprawna linia :61: {value[0]}")
+            amount = _amount(match.group('amount'))
+            pending = {'date': _aware(datetime.datetime.strptime(match.group('date'), '%y%m%d').date()),
+                       'amount': amount if match.group('mark') in ('C', 'RD') else -amount,
+                       'title': ' '.join(line.strip() for line in value[1:]), 'account': '', 'counterparty': '',
+                       'reference': '/'.join(filter(None, (match.group('reference'),
+                                                           match.group('bank_reference'))))}
+        elif tag == '86' and pending:
+            title, counterparty, account = _mt940_details(value)
+            pending.update(title=title or pending['title'], counterparty=counterparty, account=account)
+        elif tag.startswith('62') and pending:
+            yield StatementLine(**pending)
+            pending = None
+    if pending:
+        yield StatementLine(**pending)
+
+
+def read_bank_statement(file):
+    """Streams the lines of an uploaded CSV or MT940 statement, the format is told by the first line.
+    :returns: generator of StatementLine"""
+    lines = _lines(file)
+    first = ''
+    for first in lines:
+        if first.strip():
+            break
+    rest = (line for part in ([first], lines) for line in part)
+    if first.lstrip().startswith(('{1:', ':20:')):
+        return read_mt940_statement(rest)
+    return read_csv_statement(rest)
+
+
+class ApartmentMatcher:
+    """Matches statement lines to apartments with dict lookups built from one query: the apartment's
+    acc_number against the whole virtual-account tail of the line's account, BANK_ACCOUNT_DIGITS digits
+    or as many as a longer acc_number has, then the apartment number found in the transfer title
+    by BANK_TITLE_PATTERNS."""
+
+    def __init__(self, apartments=None, title_patterns=None, account_digits=None):
+        if apartments is None:
+            apartments = Apartment.objects.values_list('id', 'number', 'acc_number')
+        account_digits = account_digits or settings.BANK_ACCOUNT_DIGITS
+        by_account, self.by_number = defaultdict(dict), {}
+        for apartment_id, number, acc_number in apartments:
+            by_account[max(account_digits, len(str(acc_number)))][acc_number] = apartment_id
+            self.by_number[number] = apartment_id
+        self.by_account = dict(sorted(by_account.items(), reverse=True))
+        patterns = title_patterns or settings.BANK_TITLE_PATTERNS
+        self.title_patterns = [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+
+    def by_account_number(self, account):
+        """:returns: id of the apartment whose acc_number is the account's tail, None for shorter accounts"""
+        digits = re.sub(r'\D', '', account)
+        for length, apartments in self.by_account.items():
+            if len(digits) >= length and int(digits[-length:]) in apartments:
+                return apartments[int(digits[-length:])]
+        return None
+
+    def by_title(self, title):
+        """:returns: set of apartment ids whose numbers are in the title"""
+        found = set()
+        for pattern in self.title_patterns:
+            for match in pattern.finditer(title):
+                apartment_id = self.by_number.get(int(match.group('number')))
+                if apartment_id:
+                    found.add(apartment_id)
+        return found
+
+    def match(self, line):
+        """:returns: apartment id or None, BankStatementLine.matched_by and a note explaining a missing match"""
+        apartment_id = self.by_account_number(line.account) if line.account else None
+        if apartment_id:
+            return apartment_id, 'ACCOUNT', ''
+        found = self.by_title(line.title)
+        if len(found) == 1:
+            return found.pop(), 'TITLE', ''
+        if found:
+            return None, '', "Kilka numerów mieszkań w tytule"
+        return None, '', "Nie rozpoznano mieszkania"
+
+
+def _fingerprint(line, occurrence):
+    key = '|'.join(str(value) for value in (line.date.date(), line.amount, line.account, line.title,
+                                             line.counterparty, line.reference, occurrence))
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _payment(line, apartment_id):
+    return ApartmentBalance(apartment_id=apartment_id, date=line.date, title=line.title[:200] or "Wpłata",
+                            amount=-line.amount, type_of_transaction='BANK')
+
+
+def import_bank_statement(file, source=''):
+    """Reconciles a bank statement in one pass. Credits matched to an apartment are posted as BANK payments
+    with bulk_post, the unmatched ones are queued for review, debits are skipped. Every credit is recorded
+    as a BankStatementLine, a line already imported is recognised by its fingerprint and not posted again.
+    :param source: file name recorded on the lines
+    :returns: dict with the numbers of matched, unmatched, duplicate and debit lines"""
+    matcher = ApartmentMatcher()
+    occurrences = Counter()
+    result = {'matched': 0, 'unmatched': 0, 'duplicates': 0, 'debits': 0}
+    lines = read_bank_statement(file)
+    with write_transaction():
+        while batch := list(islice(lines, IMPORT_BATCH_SIZE)):
+            credits = {}
+            for line in batch:
+                if line.amount <= 0:
+                    result['debits'] += 1
+                    continue
+                occurrences[line] += 1
+                credits[_fingerprint(line, occurrences[line])] = line
+            existing = set(BankStatementLine.objects.filter(fingerprint__in=credits).values_list('fingerprint',
+                                                                                                flat=True))
+            result['duplicates'] += len(existing)
+            records, payments = [], []
+            for fingerprint, line in credits.items():
+                if fingerprint in existing:
+                    continue
+                apartment_id, matched_by, note = matcher.match(line)
+                record = BankStatementLine(fingerprint=fingerprint, date=line.date, amount=line.amount,
+                                           title=line.title[:500], account=line.account[:40],
+                                           counterparty=line.counterparty[:200], apartment_id=apartment_id,
+                                           matched_by=matched_by, note=note, source=source[:200],
+                                           status='MATCHED' if apartment_id else 'UNMATCHED')
+                if apartment_id:
+                    record.entry = _payment(line, apartment_id)
+                    payments.append(record.entry)
+                records.append(record)
+            ApartmentBalance.objects.bulk_post(payments)
+            BankStatementLine.objects.bulk_create(records)
+            result['matched'] += len(payments)
+            result['unmatched'] += len(records) - len(payments)
+    return result
+
+
+def resolve_statement_line(line, apartment=None):
+    """Posts a queued line as a payment of the apartment, or marks it ignored when no apartment is given."""
+    with write_transaction():
+        line = BankStatementLine.objects.select_for_update().get(pk=line.pk)
+        if line.status != 'UNMATCHED':
+            raise ValidationError("Ta operacja została już rozliczona.")
+        if apartment is None:
+            line.status = 'IGNORED'
+        else:
+            line.entry = ApartmentBalance.objects.bulk_post([_payment(line, apartment.pk)])[0]
+            line.apartment, line.status, line.matched_by, line.note = apartment, 'RESOLVED', 'MANUAL', ''
+        line.save(update_fields=['entry', 'apartment', 'status', 'matched_by', 'note'])
+    return line
@@ -0,0 +1,134 @@
+import datetime
+import platform
+import statistics
+import subprocess
+import time
+from io import BytesIO
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+
+from .metrics import record_queries
+from .models import Apartment, ApartmentUser
+from .pdf import render_pdf
+from .statements import yearly_statement
+from .synthetic import SyntheticAssociation
+from .utils import calculate_fees, import_water_readouts
+
+BENCHMARKS = ('calculate_fees', 'calculate_payments', 'admin_summary', 'admin_yearly_summary',
+              'import_water_readouts', 'pdf')
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _run(func, rollback=False):
+    """Runs func, in a transaction rolled back afterwards when rollback is set."""
+    if not rollback:
+        func()
+        return
+    try:
+        with transaction.atomic():
+            func()
+            raise _Rollback
+    except _Rollback:
+        pass
+
+
+def _measure(func, runs, rollback=False):
+    """Runs func the given number of times with _run.
+    :returns: dict with the timings in milliseconds and the query count of the last run"""
+    timings = []
+    for _ in range(runs):
+        with record_queries() as recorder:
+            start = time.perf_counter()
+            _run(func, rollback)
+            timings.append((time.perf_counter() - start) * 1000)
+    return {'runs': len(timings), 'median_ms': round(statistics.median(timings), 3),
+            'min_ms': round(min(timings), 3), 'max_ms': round(max(timings), 3), 'queries': recorder.count}
+
+
+def _benchmark_scale(association, runs, benchmarks):
+    counts = association.create()
+    year = association.end_year
+    apartments = list(Apartment.objects.all())
+    workbook = BytesIO()
+    association.write_readouts_xlsx(workbook)
+
+    client = Client()
+    client.force_login(ApartmentUser.objects.create_superuser('benchmark', 'benchmark@example.com', None))
+    titles = (f"Benchmark {number}" for number in range(runs * len(BENCHMARKS)))
+
+    def calculate_payments():
+        response = client.post(reverse('calculate-balance'), {'date': f'{year}-12-31', 'type_of_transaction': 'HWCH',
+                                                              'title': next(titles)})
+        if response.status_code != 302:
+            raise BenchmarkError(f"Naliczenie nie powiodło się, status {response.status_code}")
+
+    def get(url_name, data=None):
+        response = client.get(reverse(url_name), data)
+        if response.status_code != 200:
+            raise BenchmarkError(f"{url_name} zwrócił status {response.status_code}")
+
+    def import_readouts():
+        workbook.seek(0)
+        import_water_readouts(workbook)
+
+    apartment = apartments[0]
+    targets = {
+        'calculate_fees': (lambda: [calculate_fees(row) for row in apartments], False),
+        'calculate_payments': (calculate_payments, True),
+        'admin_summary': (lambda: get('admin-summary'), False),
+        'admin_yearly_summary': (lambda: get('admin-yearly-summary', {'apartment': 1, 'year': year}), False),
+        'import_water_readouts': (import_readouts, True),
+        'pdf': (lambda: render_pdf('summary-template.html', {'data': yearly_statement(apartment, year),
+                                                             'balance': apartment.get_latest_balance,
+                                                             'apartment': apartment.number}), False),
+    }
+    results = {}
+    for name in benchmarks:
+        func, rollback = targets[name]
+        # the warm-up is rolled back like the measured runs, an import must not leave its readouts behind
+        _run(func, rollback)
+        results[name] = _measure(func, runs, rollback)
+    return {'apartments': association.apartments, 'years': association.years, 'rows': counts, 'results': results}
+
+
+def _version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=settings.BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(scales=(10, 40, 160), years=2, runs=5, seed=0, benchmarks=BENCHMARKS):
+    """Times the billing, summary, import and PDF paths on a synthetic association of every scale.
+    Each scale is created and measured in a transaction that is rolled back, so the database must have
+    no apartments. The first call of every benchmark warms the caches and is not counted.
+    :param scales: numbers of apartments
+    :returns: JSON-serializable report"""
+    report = {'version': _version(), 'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+              'python': platform.python_version(), 'django': django.get_version(),
+              'database': settings.DATABASES['default']['ENGINE'], 'years': years, 'runs': runs, 'seed': seed,
+              'scales': []}
+    for apartments in scales:
+        cache.clear()
+        try:
+            with transaction.atomic():
+                report['scales'].append(_benchmark_scale(SyntheticAssociation(apartments, years, seed=seed),
+                                                         runs, benchmarks))
+                raise _Rollback
+        except _Rollback:
+            pass
+    cache.clear()
+    return report
@@ -0,0 +1,61 @@
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
+from django.utils import timezone
+
+from .db import write_transaction
+from .models import Apartment, ApartmentBalance, BillingRun, billing_period
+from .statements import latest_breakdowns
+
+DUPLICATE_RUN_MESSAGE = "Naliczenie \"{title}\" za {period:%m.%Y} zostało już wykonane."
+
+
+def run_billing(date, title, type_of_transaction, user=None):
+    """Bills every apartment for the latest readouts as one BillingRun.
+    All ledger entries are inserted in a single transaction, a second run with the same period and title
+    is rejected until the first one is rolled back.
+    :returns: BillingRun"""
+    period = billing_period(date)
+    key = BillingRun.make_key(period, title)
+    if BillingRun.objects.filter(key=key, rolled_back_at__isnull=True).exists():
+        raise ValidationError(DUPLICATE_RUN_MESSAGE.format(title=title, period=period))
+
+    apartments = list(Apartment.objects.all())
+    fees = latest_breakdowns(apartments)
+    try:
+        with write_transaction():
+            run = BillingRun.objects.create(period=period, title=title, key=key, date=date,
+                                            type_of_transaction=type_of_transaction,
+                                            created_by=user)
+            entries = [ApartmentBalance(apartment=apartment,
+                                        date=date,
+                                        title=title,
+                                        amount=fees[apartment.pk]['total'],
+                                        type_of_transaction=type_of_transaction,
+                                        billing_run=run)
+                       for apartment in apartments]
+            ApartmentBalance.objects.bulk_post(entries)
+            run.total = sum(entry.amount for entry in entries)
+            run.save(update_fields=['total'])
+    except IntegrityError:
+        raise ValidationError(DUPLICATE_RUN_MESSAGE.format(title=title, period=period))
+    return run
+
+
+def rollback_billing_run(run):
+    """Reverses every entry of the run with a correction entry, so running balances posted
+    after the run stay valid, and frees the run's period and title for a new run."""
+    with write_transaction():
+        run = BillingRun.objects.select_for_update().get(pk=run.pk)
+        if not run.is_active:
+            raise ValidationError("Naliczenie zostało już wycofane.")
+        now = timezone.now()
+        entries = [ApartmentBalance(apartment_id=entry.apartment_id,
+                                    date=now,
+                                    title=f"Storno: {entry.title}",
+                                    amount=-entry.amount,
+                                    type_of_transaction='CORRECTION')
+                   for entry in run.entries.order_by('id')]
+        ApartmentBalance.objects.bulk_post(entries)
+        run.rolled_back_at = now
+        run.save(update_fields=['rolled_back_at'])
+    return run
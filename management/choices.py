@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Apartment, WaterReadouts
+
+APARTMENT_CHOICES_KEY = 'management:choices:apartments'
+YEAR_CHOICES_KEY = 'management:choices:years'
+
+
+def _apartment_numbers():
+    return list(Apartment.objects.order_by('number').values_list('number', flat=True))
+
+
+def _readout_years():
+    return [value.year for value in WaterReadouts.objects.dates('readout_date', 'year')[1:]]
+
+
+def apartment_numbers():
+    """Apartment numbers for the filter forms, cached until an apartment is saved or deleted,
+    or at most FORM_CHOICES_TIMEOUT seconds for the workers that did not see the change."""
+    return cache.get_or_set(APARTMENT_CHOICES_KEY, _apartment_numbers, timeout=settings.FORM_CHOICES_TIMEOUT)
+
+
+def readout_years():
+    """Years with readouts for the filter forms, without the first one which only holds the opening readouts.
+    Cached like apartment_numbers, until a readout is saved or deleted."""
+    return cache.get_or_set(YEAR_CHOICES_KEY, _readout_years, timeout=settings.FORM_CHOICES_TIMEOUT)
+
+
+def apartment_choices():
+    return [(None, "Wszystkie")] + [(number, number) for number in apartment_numbers()]
+
+
+def apartment_choices_blank():
+    return [('', "---------")] + [(number, number) for number in apartment_numbers()]
+
+
+def year_choices():
+    return [(None, "Wszystkie")] + [(year, year) for year in readout_years()]
+
+
+def invalidate_choices():
+    cache.delete_many([APARTMENT_CHOICES_KEY, YEAR_CHOICES_KEY])
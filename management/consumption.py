@@ -0,0 +1,66 @@
+from collections import namedtuple
+
+from .models import WaterReadouts
+
+ReadoutRow = namedtuple('ReadoutRow', ['id', 'apartment_id', 'readout_date', 'cold_water_readout',
+                                       'hot_water_readout', 'new_cold_water_meter', 'new_hot_water_meter'])
+Usage = namedtuple('Usage', ['readout_id', 'apartment_id', 'readout_date', 'cold', 'hot', 'cold_curr', 'hot_curr'])
+
+
+def readout_usage(current, previous, before_previous=None):
+    """Water used between two consecutive readouts.
+    After a meter replacement the new meter starts from zero and the old meter's last period usage is added,
+    which needs the readout before the previous one.
+    :returns: cold, hot"""
+    if (current.new_cold_water_meter or current.new_hot_water_meter) and before_previous is None:
+        raise IndexError("A meter replacement needs two earlier readouts.")
+    if current.new_cold_water_meter:
+        cold = current.cold_water_readout + previous.cold_water_readout - before_previous.cold_water_readout
+    else:
+        cold = current.cold_water_readout - previous.cold_water_readout
+    if current.new_hot_water_meter:
+        hot = current.hot_water_readout + previous.hot_water_readout - before_previous.hot_water_readout
+    else:
+        hot = current.hot_water_readout - previous.hot_water_readout
+    return cold, hot
+
+
+def current_usage(readouts):
+    """Usage of the newest readout.
+    :param readouts: WaterReadouts or ReadoutRow ordered from the newest, only the first three are read
+    :returns: Usage, raises IndexError without enough earlier readouts"""
+    readouts = list(readouts[:3])
+    current = readouts[0]
+    cold, hot = readout_usage(current, readouts[1], readouts[2] if len(readouts) > 2 else None)
+    return Usage(current.id, current.apartment_id, current.readout_date, cold, hot,
+                 current.cold_water_readout, current.hot_water_readout)
+
+
+def consumption_series(readouts):
+    """Computes the usage of every consecutive pair of readouts in one pass.
+    :param readouts: WaterReadouts or ReadoutRow ordered by apartment and readout date
+    :returns: list of Usage, readouts without enough earlier readouts are left out"""
+    result = []
+    apartment_id = previous = before_previous = None
+    for readout in readouts:
+        if readout.apartment_id != apartment_id:
+            apartment_id, previous, before_previous = readout.apartment_id, None, None
+        if previous is not None:
+            try:
+                cold, hot = readout_usage(readout, previous, before_previous)
+            except IndexError:
+                pass
+            else:
+                result.append(Usage(readout.id, apartment_id, readout.readout_date, cold, hot,
+                                    readout.cold_water_readout, readout.hot_water_readout))
+        before_previous, previous = previous, readout
+    return result
+
+
+def building_consumption(queryset=None):
+    """Usage of every readout of the building (or of the given WaterReadouts queryset) from a single
+    values_list query, without instantiating models."""
+    if queryset is None:
+        queryset = WaterReadouts.objects.all()
+    rows = queryset.order_by('apartment', 'readout_date', 'id').values_list(*ReadoutRow._fields)
+    return consumption_series(ReadoutRow._make(row) for row in rows)
@@ -0,0 +1,20 @@
+from contextlib import contextmanager
+
+from django.db import transaction
+
+
+@contextmanager
+def write_transaction(using=None):
+    """transaction.atomic for blocks that read and then write.
+    On the management SQLite backend the outermost block starts with BEGIN IMMEDIATE, so it waits for
+    the busy timeout to get the write lock up front. A deferred transaction would fail with
+    "database is locked" when it upgrades to a writer after another connection has committed.
+    Nested blocks join the transaction that is already open."""
+    connection = transaction.get_connection(using)
+    connection.begin_immediate = True
+    try:
+        with transaction.atomic(using=using):
+            connection.begin_immediate = False
+            yield
+    finally:
+        connection.begin_immediate = False
@@ -0,0 +1,48 @@
+from bisect import bisect_right
+from collections import defaultdict
+
+
+def _value(row, field):
+    return row[field] if isinstance(row, dict) else getattr(row, field)
+
+
+class EffectiveDatedIndex:
+    """In-memory index of effective-dated records (Fees, Occupancy, cards, surcharges).
+    Rows are grouped per key and sorted by their start date once, then "record in force on date D"
+    is answered with a binary search and no queries.
+    :param rows: model instances or values() dicts
+    :param date_field: field the record is effective from
+    :param key_field: field rows are grouped by, None for building-wide records such as Fees
+    :param end_field: optional last day the record is in force"""
+
+    def __init__(self, rows, date_field='start_date', key_field='apartment_id', end_field=None):
+        self.date_field = date_field
+        self.key_field = key_field
+        self.end_field = end_field
+        grouped = defaultdict(list)
+        for row in rows:
+            grouped[_value(row, key_field) if key_field else None].append(row)
+        self._rows = {}
+        self._dates = {}
+        for key, key_rows in grouped.items():
+            key_rows.sort(key=lambda row: _value(row, date_field))
+            self._rows[key] = key_rows
+            self._dates[key] = [_value(row, date_field) for row in key_rows]
+
+    @classmethod
+    def from_queryset(cls, queryset, date_field='start_date', key_field='apartment_id', end_field=None):
+        """Loads the whole queryset in one query, ties on the start date are resolved by id."""
+        return cls(queryset.order_by(date_field, 'id'), date_field, key_field, end_field)
+
+    def as_of(self, date, key=None):
+        """:returns: the record in force on date, None if there is none"""
+        dates = self._dates.get(key)
+        if not dates:
+            return None
+        position = bisect_right(dates, date)
+        if not self.end_field:
+            return self._rows[key][position - 1] if position else None
+        for row in reversed(self._rows[key][:position]):
+            if _value(row, self.end_field) >= date:
+                return row
+        return None
@@ -1,30 +1,28 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 
-from .models import WaterReadouts, Apartment, Fees, ApartmentUser, Balance, ApartmentBalance, CentralHeatingSurcharge, \
+from .models import WaterReadouts, Fees, ApartmentUser, Balance, ApartmentBalance, CentralHeatingSurcharge, \
     ParkingCard, Occupancy, BigFamilyCard, AssociationBalance
-from .validators import file_extension_validator
+from .choices import apartment_choices, apartment_choices_blank, year_choices
+from .utils import read_association_entries
+from .validators import bank_statement_extension_validator, entries_file_extension_validator, \
+    file_extension_validator
 
 
 class AdminSummaryForm(forms.Form):
+    orderings = [('number', "Numer mieszkania"), ('debt', "Zadłużenie")]
     only_not_paid = forms.BooleanField(required=False, )
-    fields = {"only_not_paid"}
+    ordering = forms.ChoiceField(required=False, choices=orderings)
+    fields = {"only_not_paid", "ordering"}
 
 
 class AdminSelectApartmentYearForm(forms.Form):
-    qs = WaterReadouts.objects.dates('readout_date', 'year')
-    qs = qs[1:]
-    years = [(value.year, value.year) for value in qs]
-    years.insert(0, (None, "Wszystkie"))
-    qs = Apartment.objects.values('number').all()
-    apartments = [(nr['number'], nr['number']) for nr in qs]
-    apartments.insert(0, (None, "Wszystkie"))
     months = [(month, month) for month in range(1, 13)]
     months.insert(0, (None, "-----"))
-    apartment = forms.ChoiceField(required=False, choices=apartments)
+    apartment = forms.ChoiceField(required=False, choices=apartment_choices)
     start_date = forms.ChoiceField(required=False, choices=months)
     end_date = forms.ChoiceField(required=False, choices=months)
-    year = forms.ChoiceField(required=False, choices=years)
+    year = forms.ChoiceField(required=False, choices=year_choices)
 
     fields = {'apartment', 'year', 'start_date', 'end_date'}
 
@@ -35,7 +33,7 @@ class SummaryForm(forms.ModelForm):
         self.request = kwargs.pop('request')
         super(SummaryForm, self).__init__(*args, **kwargs)
         self.fields['readout_dates'].queryset = WaterReadouts.objects.filter(
-            apartment=self.request.user.apartment).order_by('readout_date')
+            apartment=self.request.user.apartment).select_related('apartment').order_by('readout_date')
 
     class Meta:
         model = WaterReadouts
@@ -75,7 +73,7 @@ class TransactionHistoryForm(forms.Form):
 
 
 class ApartmentBalanceHistoryForm(TransactionHistoryForm):
-    apartment = forms.ModelChoiceField(queryset=Apartment.objects.values_list('number', flat=True), required=False)
+    apartment = forms.ChoiceField(required=False, choices=apartment_choices_blank)
     fields = ['apartment', 'start_date', 'end_date', 'type_of_transaction']
 
 
@@ -90,6 +88,45 @@ class AssociationBalanceForm(forms.ModelForm):
         widgets = {'date': forms.TextInput(attrs={'type': 'datetime-local'})}
 
 
+class AssociationBalanceRowForm(AssociationBalanceForm):
+    class Meta(AssociationBalanceForm.Meta):
+        fields = AssociationBalanceForm.Meta.fields + ['counterparty']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['counterparty'].required = False
+
+
+class AssociationBalanceImportForm(forms.Form):
+    file = forms.FileField(required=False, validators=[entries_file_extension_validator])
+    text = forms.CharField(required=False, widget=forms.Textarea(attrs={'rows': 8}))
+    fields = {'file', 'text'}
+
+    def clean(self):
+        """Validates every row of the file and the pasted text, the entries are saved only when all rows are valid.
+        Unsaved entries in input order are put in cleaned_data['entries']."""
+        cleaned_data = super().clean()
+        entries, errors = [], []
+        sources = []
+        if cleaned_data.get('file'):
+            sources.append(("Plik", read_association_entries(file=cleaned_data['file'])))
+        if cleaned_data.get('text'):
+            sources.append(("Wklejone dane", read_association_entries(text=cleaned_data['text'])))
+        for source, rows in sources:
+            for number, data in rows:
+                form = AssociationBalanceRowForm(data)
+                if form.is_valid():
+                    entries.append(form.save(commit=False))
+                    continue
+                for field, messages in form.errors.items():
+                    label = form.fields[field].label if field in form.fields else ''
+                    errors.extend(f"{source}, wiersz {number}: {label} {message}" for message in messages)
+        if errors:
+            raise forms.ValidationError(errors)
+        cleaned_data['entries'] = entries
+        return cleaned_data
+
+
 class ApartmentBalanceForm(forms.ModelForm):
     class Meta:
         model = ApartmentBalance
@@ -134,4 +171,15 @@ class BigFamilyCardForm(forms.ModelForm):
 
 class WaterReadoutsImportForm(forms.Form):
     file = forms.FileField(validators=[file_extension_validator])
+    dry_run = forms.BooleanField(required=False, initial=True)
+    fields = {'file', 'dry_run'}
+
+
+class BankStatementImportForm(forms.Form):
+    file = forms.FileField(validators=[bank_statement_extension_validator])
     fields = {'file'}
+
+
+class BankStatementLineResolveForm(forms.Form):
+    apartment = forms.ChoiceField(required=False, choices=apartment_choices_blank)
+    fields = {'apartment'}
@@ -0,0 +1,53 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from management.benchmarks import BENCHMARKS, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = ("Mierzy czas naliczeń, podsumowań, importu odczytów i generowania PDF na wygenerowanych wspólnotach "
+            "różnej wielkości, w osobnej testowej bazie danych. Wynik w formacie JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='10,40,160', help="liczby mieszkań oddzielone przecinkami")
+        parser.add_argument('--years', type=int, default=2, help="liczba lat historii")
+        parser.add_argument('--runs', type=int, default=5, help="liczba pomiarów każdego testu")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--only', action='append', choices=BENCHMARKS, help="uruchom tylko wybrane testy")
+        parser.add_argument('--output', metavar='PLIK', help="zapisz wynik do pliku zamiast na standardowe wyjście")
+
+    def handle(self, *args, **options):
+        try:
+            scales = [int(scale) for scale in options['scales'].split(',')]
+        except ValueError:
+            raise CommandError("--scales przyjmuje liczby oddzielone przecinkami")
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        mirrors = {alias: connections[alias].settings_dict['NAME'] for alias in connections if alias != connection.alias}
+        for alias in mirrors:
+            connections[alias].close()
+            connections[alias].creation.set_as_test_mirror(connection.settings_dict)
+        try:
+            report = run_benchmarks(scales, options['years'], options['runs'], options['seed'],
+                                    options['only'] or BENCHMARKS)
+        finally:
+            for alias, name in mirrors.items():
+                connections[alias].close()
+                connections[alias].settings_dict['NAME'] = name
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+            for scale in report['scales']:
+                for name, result in scale['results'].items():
+                    self.stdout.write(f"{scale['apartments']:>5} {name:<24} median {result['median_ms']:>10.1f} ms "
+                                      f"{result['queries']:>6} queries")
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,49 @@
+import multiprocessing
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from management.models import Apartment
+from management.pdf import STATEMENT_TEMPLATE, render_pdf, setup_worker
+from management.statements import yearly_statement
+
+
+def timed_render(context):
+    """:returns: seconds render_pdf of the yearly summary takes"""
+    start = time.perf_counter()
+    render_pdf(STATEMENT_TEMPLATE, context)
+    return time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = ("Porównuje czas generowania PDF z podsumowaniem rocznym w nowym procesie "
+            "i w procesie, który już go generował.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--apartment', type=int, default=1, help="numer mieszkania")
+        parser.add_argument('--year', type=int, default=2023)
+        parser.add_argument('--runs', type=int, default=5, help="liczba pomiarów każdego wariantu")
+
+    def handle(self, *args, **options):
+        try:
+            apartment = Apartment.objects.select_related('balance_head__entry').get(number=options['apartment'])
+        except Apartment.DoesNotExist:
+            raise CommandError(f"Nie ma mieszkania numer {options['apartment']}")
+        context = {'data': yearly_statement(apartment, options['year']),
+                   'balance': apartment.get_latest_balance,
+                   'apartment': apartment.number}
+
+        spawn = multiprocessing.get_context('spawn')
+        cold = []
+        for _ in range(options['runs']):
+            with spawn.Pool(1, initializer=setup_worker, initargs=(settings.SETTINGS_MODULE,)) as pool:
+                cold.append(pool.apply(timed_render, (context,)))
+
+        timed_render(context)
+        warm = [timed_render(context) for _ in range(options['runs'])]
+
+        for label, timings in (('cold', cold), ('warm', warm)):
+            self.stdout.write(f"{label}: median {statistics.median(timings) * 1000:.1f} ms, "
+                              f"min {min(timings) * 1000:.1f} ms, max {max(timings) * 1000:.1f} ms")
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from management.models import Apartment
+from management.synthetic import SyntheticAssociation
+
+
+class Command(BaseCommand):
+    help = "Generuje przykładową wspólnotę: mieszkania, odczyty wody, stawki, mieszkańców, karty, dopłaty i rachunki."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--apartments', type=int, default=40, help="liczba mieszkań")
+        parser.add_argument('--years', type=int, default=2, help="liczba lat historii")
+        parser.add_argument('--start-year', type=int, default=2022)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--xlsx', metavar='PLIK',
+                            help="zapisz odczyty roku następującego po historii w formacie importu")
+        parser.add_argument('--xlsx-only', action='store_true', help="tylko zapisz plik XLSX, bez zmian w bazie")
+
+    def handle(self, *args, **options):
+        association = SyntheticAssociation(options['apartments'], options['years'], options['start_year'],
+                                           options['seed'])
+        if not options['xlsx_only']:
+            if Apartment.objects.exists():
+                raise CommandError("Baza zawiera już mieszkania, wygeneruj dane w pustej bazie.")
+            for model, count in association.create().items():
+                self.stdout.write(f"{model}: {count}")
+        if options['xlsx']:
+            association.write_readouts_xlsx(options['xlsx'])
+            self.stdout.write(f"Zapisano odczyty z {association.end_year + 1} r. do {options['xlsx']}")
+        elif options['xlsx_only']:
+            raise CommandError("Podaj plik w --xlsx.")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from management.statements import refresh_monthly_statements
+
+
+class Command(BaseCommand):
+    help = "Przelicza od nowa zestawienia miesięczne wszystkich mieszkań."
+
+    def handle(self, *args, **options):
+        rows = refresh_monthly_statements()
+        self.stdout.write(self.style.SUCCESS(f"Przeliczono {rows} zestawień miesięcznych."))
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from management.reporting import refresh_reporting_database
+
+
+class Command(BaseCommand):
+    help = "Kopiuje główną bazę danych do bazy raportowej, z której czytają podsumowania, PDF i historie rachunków."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=getattr(settings, 'REPORTING_DATABASE', None),
+                            help="alias bazy raportowej")
+
+    def handle(self, *args, **options):
+        if options['database'] not in settings.DATABASES:
+            raise CommandError(f"Nie ma bazy danych {options['database']} w ustawieniach.")
+        try:
+            refresh_reporting_database(options['database'])
+        except ImproperlyConfigured as e:
+            raise CommandError(e)
+        self.stdout.write(self.style.SUCCESS(f"Odświeżono bazę {options['database']}."))
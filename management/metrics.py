@@ -0,0 +1,131 @@
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueryRecorder:
+    """Database execute wrapper timing every statement run while it is installed."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(duration for sql, duration in self.queries)
+
+    def slowest(self):
+        """:returns: (sql, seconds) of the slowest statement, None when nothing ran"""
+        return max(self.queries, key=lambda query: query[1], default=None)
+
+    def duplicates(self):
+        """Statements run more than once with any parameters, the usual sign of a query in a loop.
+        :returns: list of (sql, count), most repeated first"""
+        return [(sql, count) for sql, count in Counter(sql for sql, duration in self.queries).most_common()
+                if count > 1]
+
+
+@contextmanager
+def record_queries():
+    """Records the statements of every database connection for the duration of the block."""
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder
+
+
+class ViewMetrics:
+    """Query totals of one URL name since the process started."""
+
+    def __init__(self, url_name):
+        self.url_name = url_name
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.sql_time = 0.0
+        self.response_time = 0.0
+        self.slowest = None
+        self.duplicates = []
+
+    def add(self, recorder, response_time):
+        self.requests += 1
+        self.queries += recorder.count
+        self.max_queries = max(self.max_queries, recorder.count)
+        self.sql_time += recorder.total_time
+        self.response_time += response_time
+        slowest = recorder.slowest()
+        if slowest and (self.slowest is None or slowest[1] > self.slowest[1]):
+            self.slowest = slowest
+        self.duplicates = recorder.duplicates()[:5] or self.duplicates
+
+    @property
+    def average_queries(self):
+        return self.queries / self.requests if self.requests else 0
+
+    @property
+    def budget(self):
+        return query_budget(self.url_name)
+
+
+_metrics = {}
+_lock = threading.Lock()
+
+
+def query_budget(url_name):
+    """:returns: the most queries the view may issue according to QUERY_BUDGETS, None when it has no budget"""
+    return getattr(settings, 'QUERY_BUDGETS', {}).get(url_name)
+
+
+def view_metrics():
+    """:returns: ViewMetrics of every URL name seen, ordered by the total SQL time"""
+    with _lock:
+        return sorted(_metrics.values(), key=lambda metrics: metrics.sql_time, reverse=True)
+
+
+def reset_metrics():
+    with _lock:
+        _metrics.clear()
+
+
+class QueryMetricsMiddleware:
+    """Records the query count, SQL time, slowest and repeated statements of every request per URL name.
+    Each request is logged on the management.metrics logger, at warning level when it exceeds its budget."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        response_time = time.perf_counter() - start
+
+        match = request.resolver_match
+        url_name = match.url_name if match else None
+        if url_name:
+            with _lock:
+                _metrics.setdefault(url_name, ViewMetrics(url_name)).add(recorder, response_time)
+            budget = query_budget(url_name)
+            level = logging.WARNING if budget is not None and recorder.count > budget else logging.DEBUG
+            logger.log(level, "%s %s: %d queries (budget %s), %.1f ms SQL, %.1f ms total",
+                       request.method, url_name, recorder.count, budget, recorder.total_time * 1000,
+                       response_time * 1000)
+        return response
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillingRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField(verbose_name='Okres')),
+                ('title', models.CharField(max_length=200, verbose_name='Tytuł')),
+                ('key', models.CharField(help_text='Period and normalized title, one active run per key.', max_length=220, verbose_name='Klucz naliczenia')),
+                ('date', models.DateTimeField(verbose_name='Data transakcji')),
+                ('type_of_transaction', models.CharField(choices=[('BO', 'Bilans otwarcia'), ('BANK', 'Bank'), ('COMPENSATION', 'Kompensata'), ('HWCH', 'CO/CW'), ('CORRECTION', 'Korekta')], max_length=30, verbose_name='Typ transakcji')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Suma naliczeń')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Utworzono')),
+                ('rolled_back_at', models.DateTimeField(blank=True, null=True, verbose_name='Wycofano')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Utworzone przez')),
+            ],
+            options={
+                'ordering': ('-created_at',),
+            },
+        ),
+        migrations.AddField(
+            model_name='apartmentbalance',
+            name='billing_run',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='entries', to='management.billingrun', verbose_name='Naliczenie'),
+        ),
+        migrations.AddConstraint(
+            model_name='billingrun',
+            constraint=models.UniqueConstraint(condition=models.Q(('rolled_back_at__isnull', True)), fields=('key',), name='unique_active_billing_run'),
+        ),
+    ]
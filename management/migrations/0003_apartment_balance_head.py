@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:46
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def create_balance_heads(apps, schema_editor):
+    ApartmentBalance = apps.get_model('management', 'ApartmentBalance')
+    ApartmentBalanceHead = apps.get_model('management', 'ApartmentBalanceHead')
+    latest = ApartmentBalance.objects.filter(apartment=OuterRef('apartment')).order_by('-id').values('id')[:1]
+    ApartmentBalanceHead.objects.bulk_create(
+        ApartmentBalanceHead(apartment_id=entry.apartment_id, entry=entry, balance=entry.balance)
+        for entry in ApartmentBalance.objects.filter(id=Subquery(latest))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0002_billing_run'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApartmentBalanceHead',
+            fields=[
+                ('apartment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='balance_head', serialize=False, to='management.apartment', verbose_name='Mieszkanie')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Bilans')),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='management.apartmentbalance', verbose_name='Ostatnia transakcja')),
+            ],
+        ),
+        migrations.RunPython(create_balance_heads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0003_apartment_balance_head'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyStatement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('readout_date', models.DateField(verbose_name='Data odczytu')),
+                ('tenants', models.IntegerField(verbose_name='Osoby')),
+                ('cold_water', models.IntegerField(verbose_name='Stan ZW')),
+                ('cold_used', models.IntegerField(verbose_name='Zużycie ZW')),
+                ('hot_water', models.IntegerField(verbose_name='Stan CW')),
+                ('hot_used', models.IntegerField(verbose_name='Zużycie CW')),
+                ('maintenance_fee', models.DecimalField(decimal_places=2, max_digits=5, verbose_name='Opłata eksploatacyjna za m2')),
+                ('repair_fund_fee', models.DecimalField(decimal_places=2, max_digits=5, verbose_name='Fundusz remontowy za m2')),
+                ('central_heating_fee', models.DecimalField(decimal_places=2, max_digits=5, verbose_name='CO za m2')),
+                ('cold_water_fee', models.DecimalField(decimal_places=2, max_digits=5, verbose_name='ZW za m3')),
+                ('hot_water_fee', models.DecimalField(decimal_places=2, max_digits=5, verbose_name='CW za m3')),
+                ('garbage_fee', models.DecimalField(decimal_places=2, max_digits=5, verbose_name='Śmieci za osobę')),
+                ('maintenance_cost', models.DecimalField(decimal_places=4, max_digits=12, verbose_name='Opłata eksploatacyjna')),
+                ('repair_fund_cost', models.DecimalField(decimal_places=4, max_digits=12, verbose_name='Fundusz remontowy')),
+                ('central_heating_cost', models.DecimalField(decimal_places=4, max_digits=12, verbose_name='CO')),
+                ('cold_water_cost', models.DecimalField(decimal_places=4, max_digits=12, verbose_name='ZW')),
+                ('hot_water_cost', models.DecimalField(decimal_places=4, max_digits=12, verbose_name='CW')),
+                ('garbage_cost', models.DecimalField(decimal_places=4, max_digits=12, verbose_name='Śmieci')),
+                ('parking_fee', models.DecimalField(decimal_places=4, max_digits=12, verbose_name='Parking')),
+                ('central_heating_surcharge', models.DecimalField(decimal_places=4, max_digits=12, verbose_name='Dopłata CO')),
+                ('total', models.DecimalField(decimal_places=4, max_digits=12, verbose_name='W sumie')),
+                ('computed_at', models.DateTimeField(auto_now=True, verbose_name='Przeliczono')),
+                ('apartment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statements', to='management.apartment', verbose_name='Mieszkanie')),
+                ('readout', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='statement', to='management.waterreadouts', verbose_name='Odczyt')),
+            ],
+            options={
+                'ordering': ('readout_date',),
+                'indexes': [models.Index(fields=['apartment', 'readout_date'], name='statement_apartment_date')],
+            },
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:26
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+UNIQUE_FIELDS = {
+    'BigFamilyCard': ('apartment', 'start_date'),
+    'Fees': ('period',),
+    'Occupancy': ('apartment', 'start_date'),
+    'ParkingCard': ('apartment', 'start_date'),
+    'WaterReadouts': ('apartment', 'readout_date'),
+}
+
+
+def remove_duplicates(apps, schema_editor):
+    """Keeps the oldest of identical rows that would break the new unique constraints.
+    Duplicates that differ in any other value have to be resolved by hand, the migration stops on them."""
+    conflicts = []
+    for model_name, fields in UNIQUE_FIELDS.items():
+        model = apps.get_model('management', model_name)
+        values = [field.attname for field in model._meta.concrete_fields if not field.primary_key]
+        duplicates = model.objects.values(*fields).annotate(rows=Count('pk'), first=Min('pk')).filter(rows__gt=1)
+        for duplicate in duplicates:
+            rows = model.objects.filter(**{field: duplicate[field] for field in fields})
+            if len(set(rows.values_list(*values))) > 1:
+                conflicts.append(f"{model_name} id {', '.join(str(pk) for pk in rows.values_list('pk', flat=True))}")
+            else:
+                rows.exclude(pk=duplicate['first']).delete()
+    if conflicts:
+        raise RuntimeError("Rekordy o tych samych kluczach różnią się danymi, popraw je przed migracją: "
+                           + "; ".join(conflicts))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0004_monthly_statement'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='apartmentbalance',
+            index=models.Index(fields=['date'], name='balance_date'),
+        ),
+        migrations.AddIndex(
+            model_name='centralheatingsurcharge',
+            index=models.Index(fields=['apartment', 'start_date', 'end_date'], name='surcharge_apartment_dates'),
+        ),
+        migrations.AddConstraint(
+            model_name='bigfamilycard',
+            constraint=models.UniqueConstraint(fields=('apartment', 'start_date'), name='unique_big_family_card_start'),
+        ),
+        migrations.AddConstraint(
+            model_name='fees',
+            constraint=models.UniqueConstraint(fields=('period',), name='unique_fees_period'),
+        ),
+        migrations.AddConstraint(
+            model_name='occupancy',
+            constraint=models.UniqueConstraint(fields=('apartment', 'start_date'), name='unique_occupancy_start'),
+        ),
+        migrations.AddConstraint(
+            model_name='parkingcard',
+            constraint=models.UniqueConstraint(fields=('apartment', 'start_date'), name='unique_parking_card_start'),
+        ),
+        migrations.AddConstraint(
+            model_name='waterreadouts',
+            constraint=models.UniqueConstraint(fields=('apartment', 'readout_date'), name='unique_readout_date'),
+        ),
+    ]
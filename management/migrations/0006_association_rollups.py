@@ -0,0 +1,78 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:57
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def create_rollups(apps, schema_editor):
+    AssociationBalance = apps.get_model('management', 'AssociationBalance')
+    AssociationBalanceHead = apps.get_model('management', 'AssociationBalanceHead')
+    AssociationMonthlyRollup = apps.get_model('management', 'AssociationMonthlyRollup')
+    changes = defaultdict(lambda: [Decimal(0), Decimal(0)])
+    latest = None
+    for entry in AssociationBalance.objects.order_by('id'):
+        date = timezone.localtime(entry.date).date() if timezone.is_aware(entry.date) else entry.date.date()
+        change = changes[entry.type_of_transaction, date.replace(day=1)]
+        if entry.amount >= 0:
+            change[0] += entry.amount
+        else:
+            change[1] -= entry.amount
+        latest = entry
+    if latest is None:
+        return
+    AssociationBalanceHead.objects.create(pk=1, entry=latest, balance=latest.balance)
+    rollups = []
+    closing = defaultdict(Decimal)
+    for (type_of_transaction, period), (inflows, outflows) in sorted(changes.items()):
+        opening = closing[type_of_transaction]
+        closing[type_of_transaction] = opening + inflows - outflows
+        rollups.append(AssociationMonthlyRollup(type_of_transaction=type_of_transaction, period=period,
+                                                opening_balance=opening, inflows=inflows, outflows=outflows,
+                                                closing_balance=closing[type_of_transaction]))
+    AssociationMonthlyRollup.objects.bulk_create(rollups)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0005_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssociationBalanceHead',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Bilans')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AssociationMonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_of_transaction', models.CharField(choices=[('BO', 'Bilans otwarcia'), ('BANK', 'Bank'), ('COMPENSATION', 'Kompensata'), ('HWCH', 'CO/CW'), ('CORRECTION', 'Korekta')], max_length=30, verbose_name='Typ transakcji')),
+                ('period', models.DateField(verbose_name='Okres')),
+                ('opening_balance', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Saldo otwarcia')),
+                ('inflows', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Wpływy')),
+                ('outflows', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Wydatki')),
+                ('closing_balance', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Saldo zamknięcia')),
+            ],
+            options={
+                'ordering': ('period', 'type_of_transaction'),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='associationmonthlyrollup',
+            constraint=models.UniqueConstraint(fields=('type_of_transaction', 'period'), name='unique_rollup_type_period'),
+        ),
+        migrations.AddField(
+            model_name='associationbalancehead',
+            name='entry',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='management.associationbalance', verbose_name='Ostatnia transakcja'),
+        ),
+        migrations.RunPython(create_rollups, migrations.RunPython.noop),
+    ]
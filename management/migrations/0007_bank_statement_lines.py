@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0006_association_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BankStatementLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(help_text='Hash of the line, a statement imported again is not posted twice.', max_length=40, unique=True, verbose_name='Odcisk')),
+                ('date', models.DateTimeField(verbose_name='Data operacji')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Kwota')),
+                ('title', models.CharField(max_length=500, verbose_name='Tytuł')),
+                ('account', models.CharField(blank=True, max_length=40, verbose_name='Rachunek')),
+                ('counterparty', models.CharField(blank=True, max_length=200, verbose_name='Nadawca')),
+                ('status', models.CharField(choices=[('MATCHED', 'Zaksięgowana'), ('UNMATCHED', 'Do wyjaśnienia'), ('RESOLVED', 'Przypisana ręcznie'), ('IGNORED', 'Pominięta')], max_length=20, verbose_name='Status')),
+                ('matched_by', models.CharField(blank=True, choices=[('ACCOUNT', 'Rachunek'), ('TITLE', 'Tytuł przelewu'), ('MANUAL', 'Ręcznie')], max_length=20, verbose_name='Dopasowano po')),
+                ('note', models.CharField(blank=True, max_length=200, verbose_name='Uwagi')),
+                ('source', models.CharField(blank=True, max_length=200, verbose_name='Plik')),
+                ('imported_at', models.DateTimeField(auto_now_add=True, verbose_name='Zaimportowano')),
+                ('apartment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='management.apartment', verbose_name='Mieszkanie')),
+                ('entry', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='bank_line', to='management.apartmentbalance', verbose_name='Wpłata')),
+            ],
+            options={
+                'ordering': ('date', 'id'),
+                'indexes': [models.Index(fields=['status', 'date'], name='bank_line_status_date')],
+            },
+        ),
+    ]
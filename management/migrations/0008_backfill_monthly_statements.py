@@ -0,0 +1,47 @@
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import migrations
+
+from management.consumption import ReadoutRow, consumption_series
+from management.effective_dated import EffectiveDatedIndex
+from management.utils import calculate_fees_from_indexes
+
+
+def backfill_monthly_statements(apps, schema_editor):
+    """Stores the statement of every billable readout. The rows are read and written with the historical
+    models, only the arithmetic on them is shared with the application code."""
+    def model(name):
+        return apps.get_model('management', name)
+
+    MonthlyStatement = model('MonthlyStatement')
+    indexes = {'fees': EffectiveDatedIndex.from_queryset(model('Fees').objects.values(), 'period', key_field=None),
+               'occupancy': EffectiveDatedIndex.from_queryset(model('Occupancy').objects.all()),
+               'parking': EffectiveDatedIndex.from_queryset(model('ParkingCard').objects.all()),
+               'big_family_card': EffectiveDatedIndex.from_queryset(model('BigFamilyCard').objects.all()),
+               'ch_surcharge': EffectiveDatedIndex.from_queryset(model('CentralHeatingSurcharge').objects.all(),
+                                                                 end_field='end_date')}
+    apartments = model('Apartment').objects.in_bulk()
+    readouts = model('WaterReadouts').objects.order_by('apartment', 'readout_date', 'id').values_list(
+        *ReadoutRow._fields)
+    fields = {field.name for field in MonthlyStatement._meta.concrete_fields} - {'id', 'apartment', 'readout',
+                                                                                  'computed_at'}
+    rows = []
+    for usage in consumption_series(ReadoutRow._make(row) for row in readouts):
+        try:
+            breakdown = calculate_fees_from_indexes(apartments[usage.apartment_id], usage, indexes)
+        except ObjectDoesNotExist:
+            continue
+        rows.append(MonthlyStatement(apartment_id=usage.apartment_id, readout_id=usage.readout_id,
+                                     **{field: breakdown[field] for field in fields}))
+    MonthlyStatement.objects.all().delete()
+    MonthlyStatement.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0007_bank_statement_lines'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_monthly_statements, migrations.RunPython.noop, elidable=True),
+    ]
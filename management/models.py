@@ -1,14 +1,47 @@
 from django.db import models
+from django.db.models import F, OuterRef, Prefetch, Q, Subquery
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 import datetime
 import uuid
-from django.core.exceptions import ObjectDoesNotExist
+from collections import defaultdict
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from .db import write_transaction
 from .validators import phone_number_validator
 
 
 # Create your models here.
 
 
+def billing_period(date):
+    """:returns: first day of the month the transaction date falls in"""
+    if isinstance(date, datetime.datetime):
+        date = timezone.localtime(date).date() if timezone.is_aware(date) else date.date()
+    return date.replace(day=1)
+
+
+def current_prefetch(lookup, model, date_field, to_attr, as_of=None):
+    """Prefetch of only the latest related record of every apartment, optionally as of a date."""
+    latest = model.objects.filter(apartment=OuterRef('apartment'))
+    if as_of:
+        latest = latest.filter(**{f'{date_field}__lte': as_of})
+    latest = latest.order_by(f'-{date_field}', '-id').values('id')[:1]
+    return Prefetch(lookup, queryset=model.objects.filter(id=Subquery(latest)), to_attr=to_attr)
+
+
+class ApartmentQuerySet(models.QuerySet):
+
+    def with_current_state(self, as_of=None):
+        """Loads the balance head and the latest water readouts, occupancy, parking card and big family card
+        of every apartment in one query per relation. The get_latest_* properties use the loaded records."""
+        return self.select_related('balance_head__entry').prefetch_related(
+            current_prefetch('waterreadouts_set', WaterReadouts, 'readout_date', '_current_water_readouts', as_of),
+            current_prefetch('occupancy_set', Occupancy, 'start_date', '_current_occupancy', as_of),
+            current_prefetch('parkingcard_set', ParkingCard, 'start_date', '_current_parking_card', as_of),
+            current_prefetch('bigfamilycard_set', BigFamilyCard, 'start_date', '_current_big_family_card', as_of),
+        )
+
+
 class Apartment(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     number = models.IntegerField(unique=True, verbose_name="Numer mieszkania", help_text="Apartment number.")
@@ -16,43 +49,58 @@ class Apartment(models.Model):
                                help_text="Apartment surface area.")
     acc_number = models.IntegerField(verbose_name="Nr konta do przelewów")
 
+    objects = ApartmentQuerySet.as_manager()
+
     class Meta:
         ordering = ('number',)
 
-    def create_new_apartment_balance(self):
-        obj = ApartmentBalance.objects.create(apartment=self,
-                                              date=datetime.date.today(),
-                                              title='Bilans otwarcia',
-                                              type_of_transaction='BO',
-                                              amount=0)
+    def _get_current(self, attr, related_manager, date_field):
+        if hasattr(self, attr):
+            current = getattr(self, attr)
+            if not current:
+                raise related_manager.model.DoesNotExist
+            return current[0]
+        return related_manager.latest(date_field)
 
     @property
     def get_latest_balance(self):
-        if self.apartmentbalance_set.all():
-            return self.apartmentbalance_set.latest('id')
-        self.create_new_apartment_balance()
-        return self.apartmentbalance_set.latest('id')
+        """Latest ledger entry read from the balance head, an unsaved opening balance if there is none yet.
+        Use select_related('balance_head__entry') when listing apartments."""
+        try:
+            entry = self.balance_head.entry
+        except ObjectDoesNotExist:
+            return ApartmentBalance(apartment=self,
+                                    date=datetime.date.today(),
+                                    title='Bilans otwarcia',
+                                    type_of_transaction='BO',
+                                    amount=0,
+                                    balance=0)
+        entry.apartment = self
+        return entry
 
     @property
     def get_latest_water_readouts(self):
-        return self.waterreadouts_set.latest('readout_date')
+        return self._get_current('_current_water_readouts', self.waterreadouts_set, 'readout_date')
 
     @property
     def get_latest_occupancy(self):
-        return self.occupancy_set.latest('start_date')
+        return self._get_current('_current_occupancy', self.occupancy_set, 'start_date')
 
     @property
     def get_latest_parking_card(self):
-        return self.parkingcard_set.latest('start_date')
+        return self._get_current('_current_parking_card', self.parkingcard_set, 'start_date')
 
     @property
     def get_latest_big_family_card(self):
-        return self.bigfamilycard_set.latest('start_date')
+        return self._get_current('_current_big_family_card', self.bigfamilycard_set, 'start_date')
 
     def __str__(self):
         return f"{self.number}"
 
 
+LEDGER_IMMUTABLE_MESSAGE = "Zaksięgowanej operacji nie można zmienić ani usunąć, wprowadź korektę."
+
+
 class TypesOfTransaction(models.Model):
     type = models.CharField(max_length=200)
 
@@ -76,17 +124,62 @@ class Balance(models.Model):
         abstract = True
 
 
+class ApartmentBalanceManager(models.Manager):
+
+    def bulk_post(self, entries):
+        """Computes the running balance of unsaved entries in memory, inserts them with one bulk_create
+        and moves the balance heads of the affected apartments, all under the heads' row locks."""
+        with write_transaction():
+            heads = {head.apartment_id: head for head in ApartmentBalanceHead.objects.select_for_update().filter(
+                apartment__in={entry.apartment_id for entry in entries})}
+            balances = {apartment_id: head.balance for apartment_id, head in heads.items()}
+            for entry in entries:
+                entry.balance = balances.get(entry.apartment_id, 0) + entry.amount
+                balances[entry.apartment_id] = entry.balance
+            entries = self.bulk_create(entries)
+
+            latest = {entry.apartment_id: entry for entry in entries}
+            new_heads = []
+            for apartment_id, entry in latest.items():
+                head = heads.get(apartment_id)
+                if head is None:
+                    new_heads.append(ApartmentBalanceHead(apartment_id=apartment_id, entry=entry,
+                                                          balance=entry.balance))
+                else:
+                    head.entry, head.balance = entry, entry.balance
+            ApartmentBalanceHead.objects.bulk_update(heads.values(), ['entry', 'balance'])
+            ApartmentBalanceHead.objects.bulk_create(new_heads)
+            return entries
+
+
 class ApartmentBalance(Balance):
     apartment = models.ForeignKey(Apartment, on_delete=models.PROTECT, verbose_name="Mieszkanie")
+    billing_run = models.ForeignKey('BillingRun', on_delete=models.PROTECT, null=True, blank=True,
+                                    related_name='entries', verbose_name="Naliczenie")
 
-    def save(self, *args, **kwargs):
-        try:
-            prev_balance = ApartmentBalance.objects.filter(apartment=self.apartment).latest('id')
-            self.balance = prev_balance.balance + self.amount
-        except ObjectDoesNotExist:
-            self.balance = self.amount
+    objects = ApartmentBalanceManager()
 
-        return super(ApartmentBalance, self).save(*args, **kwargs)
+    class Meta:
+        indexes = [models.Index(fields=['date'], name='balance_date')]
+
+    def save(self, *args, **kwargs):
+        """Posts a new entry. Saved entries are final, the running balances after them and the balance head
+        depend on them, a mistake is reversed with a correction entry."""
+        if not self._state.adding:
+            raise ValidationError(LEDGER_IMMUTABLE_MESSAGE)
+
+        with write_transaction():
+            head = ApartmentBalanceHead.objects.select_for_update().filter(apartment_id=self.apartment_id).first()
+            self.balance = (head.balance if head else 0) + self.amount
+            super(ApartmentBalance, self).save(*args, **kwargs)
+            if head is None:
+                ApartmentBalanceHead.objects.create(apartment_id=self.apartment_id, entry=self, balance=self.balance)
+            else:
+                head.entry, head.balance = self, self.balance
+                head.save(update_fields=['entry', 'balance'])
+
+    def delete(self, *args, **kwargs):
+        raise ValidationError(LEDGER_IMMUTABLE_MESSAGE)
 
     def add_to_association_balance(self):
         return AssociationBalance.objects.create(date=self.date,
@@ -98,18 +191,225 @@ class ApartmentBalance(Balance):
         return f"Mieszkanie: {self.apartment} Kwota ostatniej transakcji: {self.amount}  Balans po operacji:{self.balance}"
 
 
+class ApartmentBalanceHead(models.Model):
+    """Current balance of an apartment, moved in the same transaction as every ledger insert."""
+    apartment = models.OneToOneField(Apartment, on_delete=models.CASCADE, primary_key=True,
+                                     related_name='balance_head', verbose_name="Mieszkanie")
+    entry = models.ForeignKey(ApartmentBalance, on_delete=models.PROTECT, related_name='+',
+                              verbose_name="Ostatnia transakcja")
+    balance = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Bilans")
+
+    def __str__(self):
+        return f"Mieszkanie: {self.apartment_id} Bilans: {self.balance}"
+
+
+class AssociationBalanceManager(models.Manager):
+
+    def bulk_post(self, entries):
+        """Computes the running balance of unsaved entries in memory, inserts them with one bulk_create
+        and moves the association balance head and the monthly rollups, all in one write transaction."""
+        with write_transaction():
+            head = AssociationBalanceHead.objects.select_for_update().first()
+            balance = head.balance if head else 0
+            for entry in entries:
+                balance += entry.amount
+                entry.balance = balance
+            entries = self.bulk_create(entries)
+            if entries:
+                AssociationBalanceHead.move(head, entries[-1])
+                AssociationMonthlyRollup.objects.post(entries)
+            return entries
+
+
 class AssociationBalance(Balance):
     description = models.CharField(max_length=200, verbose_name="Opis", blank=True, null=True)
     counterparty = models.CharField(max_length=200, verbose_name="Kontrahent")
 
+    objects = AssociationBalanceManager()
+
     def save(self, *args, **kwargs):
-        try:
-            prev_balance = AssociationBalance.objects.all().latest('id')
-            self.balance = prev_balance.balance + self.amount
-        except ObjectDoesNotExist:
-            self.balance = self.amount
+        """Posts a new entry. Saved entries are final like ApartmentBalance, the head and the monthly rollups
+        include them."""
+        if not self._state.adding:
+            raise ValidationError(LEDGER_IMMUTABLE_MESSAGE)
+
+        with write_transaction():
+            head = AssociationBalanceHead.objects.select_for_update().first()
+            self.balance = (head.balance if head else 0) + self.amount
+            super(AssociationBalance, self).save(*args, **kwargs)
+            AssociationBalanceHead.move(head, self)
+            AssociationMonthlyRollup.objects.post([self])
+
+    def delete(self, *args, **kwargs):
+        raise ValidationError(LEDGER_IMMUTABLE_MESSAGE)
+
+
+class AssociationBalanceHead(models.Model):
+    """Current association balance, a single row moved in the same transaction as every ledger insert."""
+    entry = models.ForeignKey(AssociationBalance, on_delete=models.PROTECT, related_name='+',
+                              verbose_name="Ostatnia transakcja")
+    balance = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Bilans")
+
+    @classmethod
+    def move(cls, head, entry):
+        """Points the head, None before the first entry, at the newest entry."""
+        if head is None:
+            cls.objects.create(pk=1, entry=entry, balance=entry.balance)
+        else:
+            head.entry, head.balance = entry, entry.balance
+            head.save(update_fields=['entry', 'balance'])
+
+    def __str__(self):
+        return f"Bilans wspólnoty: {self.balance}"
+
+
+class AssociationRollupManager(models.Manager):
+
+    def post(self, entries):
+        """Adds saved ledger entries to the rollups of their month and transaction type and carries the change
+        into the opening and closing balances of the later months. Runs inside the ledger insert transaction."""
+        changes = defaultdict(lambda: [0, 0])
+        for entry in entries:
+            change = changes[entry.type_of_transaction, billing_period(entry.date)]
+            if entry.amount >= 0:
+                change[0] += entry.amount
+            else:
+                change[1] -= entry.amount
+        for (type_of_transaction, period), (inflows, outflows) in sorted(changes.items()):
+            rollups = self.filter(type_of_transaction=type_of_transaction)
+            if not rollups.filter(period=period).update(inflows=F('inflows') + inflows,
+                                                        outflows=F('outflows') + outflows,
+                                                        closing_balance=F('closing_balance') + inflows - outflows):
+                opening = rollups.filter(period__lt=period).order_by('-period').values_list(
+                    'closing_balance', flat=True).first() or 0
+                self.create(type_of_transaction=type_of_transaction, period=period, opening_balance=opening,
+                            inflows=inflows, outflows=outflows, closing_balance=opening + inflows - outflows)
+            rollups.filter(period__gt=period).update(opening_balance=F('opening_balance') + inflows - outflows,
+                                                     closing_balance=F('closing_balance') + inflows - outflows)
+
+    def totals(self, start=None, end=None, type_of_transaction=None):
+        """Opening balance, inflows, outflows and closing balance of every transaction type over the months
+        from start to end, read from the rollups with one query.
+        :param start: first month, the beginning of the ledger when None
+        :param end: last month, the end of the ledger when None
+        :returns: dict with a row per transaction type and the total row"""
+        rollups = self.all()
+        if end:
+            rollups = rollups.filter(period__lte=end)
+        if type_of_transaction:
+            rollups = rollups.filter(type_of_transaction=type_of_transaction)
+        labels = dict(Balance.TYPES_OF_TRANSACTION)
+        rows = {}
+        for rollup in rollups.order_by('period'):
+            row = rows.setdefault(rollup.type_of_transaction, {
+                'type_of_transaction': rollup.type_of_transaction, 'label': labels.get(rollup.type_of_transaction),
+                'opening_balance': 0, 'inflows': 0, 'outflows': 0, 'closing_balance': 0})
+            if start and rollup.period < start:
+                row['opening_balance'] = row['closing_balance'] = rollup.closing_balance
+            else:
+                row['inflows'] += rollup.inflows
+                row['outflows'] += rollup.outflows
+                row['closing_balance'] = rollup.closing_balance
+        rows = sorted(rows.values(), key=lambda row: row['type_of_transaction'])
+        total = {field: sum(row[field] for row in rows)
+                 for field in ('opening_balance', 'inflows', 'outflows', 'closing_balance')}
+        return {'rows': rows, 'total': total, 'start': start, 'end': end}
+
+
+class AssociationMonthlyRollup(models.Model):
+    """Association ledger totals per month and transaction type, kept current by every ledger insert.
+    Outflows are stored as a positive amount."""
+    type_of_transaction = models.CharField(max_length=30, choices=Balance.TYPES_OF_TRANSACTION,
+                                           verbose_name="Typ transakcji")
+    period = models.DateField(verbose_name="Okres")
+    opening_balance = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Saldo otwarcia")
+    inflows = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Wpływy")
+    outflows = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Wydatki")
+    closing_balance = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Saldo zamknięcia")
+
+    objects = AssociationRollupManager()
+
+    class Meta:
+        ordering = ('period', 'type_of_transaction')
+        constraints = [
+            models.UniqueConstraint(fields=['type_of_transaction', 'period'], name='unique_rollup_type_period'),
+        ]
+
+    def __str__(self):
+        return f"{self.period:%m.%Y} {self.type_of_transaction}: {self.closing_balance}"
+
+
+class BillingRun(models.Model):
+    period = models.DateField(verbose_name="Okres")
+    title = models.CharField(max_length=200, verbose_name="Tytuł")
+    key = models.CharField(max_length=220, verbose_name="Klucz naliczenia",
+                           help_text="Period and normalized title, one active run per key.")
+    date = models.DateTimeField(verbose_name="Data transakcji")
+    type_of_transaction = models.CharField(max_length=30, choices=Balance.TYPES_OF_TRANSACTION,
+                                           verbose_name="Typ transakcji")
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Suma naliczeń")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Utworzono")
+    created_by = models.ForeignKey('ApartmentUser', on_delete=models.SET_NULL, null=True, blank=True,
+                                   verbose_name="Utworzone przez")
+    rolled_back_at = models.DateTimeField(null=True, blank=True, verbose_name="Wycofano")
 
-        return super(AssociationBalance, self).save(*args, **kwargs)
+    class Meta:
+        ordering = ('-created_at',)
+        constraints = [
+            models.UniqueConstraint(fields=['key'], condition=Q(rolled_back_at__isnull=True),
+                                    name='unique_active_billing_run'),
+        ]
+
+    @staticmethod
+    def make_key(period, title):
+        return f"{period:%Y-%m}/{' '.join(title.lower().split())}"
+
+    @property
+    def is_active(self):
+        return self.rolled_back_at is None
+
+    def __str__(self):
+        return f"{self.period:%m.%Y} - {self.title}"
+
+
+class BankStatementLine(models.Model):
+    """Credit read from a bank statement. Matched lines point at the payment posted for them,
+    the unmatched ones wait in the review queue until they are assigned to an apartment or ignored."""
+    STATUSES = (
+        ("MATCHED", "Zaksięgowana"),
+        ("UNMATCHED", "Do wyjaśnienia"),
+        ("RESOLVED", "Przypisana ręcznie"),
+        ("IGNORED", "Pominięta"),
+    )
+    MATCHED_BY = (
+        ("ACCOUNT", "Rachunek"),
+        ("TITLE", "Tytuł przelewu"),
+        ("MANUAL", "Ręcznie"),
+    )
+
+    fingerprint = models.CharField(max_length=40, unique=True, verbose_name="Odcisk",
+                                   help_text="Hash of the line, a statement imported again is not posted twice.")
+    date = models.DateTimeField(verbose_name="Data operacji")
+    amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Kwota")
+    title = models.CharField(max_length=500, verbose_name="Tytuł")
+    account = models.CharField(max_length=40, blank=True, verbose_name="Rachunek")
+    counterparty = models.CharField(max_length=200, blank=True, verbose_name="Nadawca")
+    status = models.CharField(max_length=20, choices=STATUSES, verbose_name="Status")
+    matched_by = models.CharField(max_length=20, choices=MATCHED_BY, blank=True, verbose_name="Dopasowano po")
+    note = models.CharField(max_length=200, blank=True, verbose_name="Uwagi")
+    apartment = models.ForeignKey(Apartment, on_delete=models.PROTECT, null=True, blank=True,
+                                  verbose_name="Mieszkanie")
+    entry = models.OneToOneField(ApartmentBalance, on_delete=models.PROTECT, null=True, blank=True,
+                                 related_name='bank_line', verbose_name="Wpłata")
+    source = models.CharField(max_length=200, blank=True, verbose_name="Plik")
+    imported_at = models.DateTimeField(auto_now_add=True, verbose_name="Zaimportowano")
+
+    class Meta:
+        ordering = ('date', 'id')
+        indexes = [models.Index(fields=['status', 'date'], name='bank_line_status_date')]
+
+    def __str__(self):
+        return f"{self.date:%d.%m.%Y} {self.amount} {self.title}"
 
 
 class ApartmentUser(AbstractUser):
@@ -137,6 +437,9 @@ class Fees(models.Model):
                                   help_text="Garbage fee per tenant")
     parking_fee = models.DecimalField(max_digits=5, decimal_places=2, verbose_name="Opłata parkingowa")
 
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['period'], name='unique_fees_period')]
+
     def __str__(self):
         return f"{self.period}"
 
@@ -149,6 +452,9 @@ class WaterReadouts(models.Model):
     new_cold_water_meter = models.BooleanField(verbose_name="Nowy licznik zimnej wody", default=False)
     new_hot_water_meter = models.BooleanField(verbose_name="Nowy licznik ciepłej wody", default=False)
 
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['apartment', 'readout_date'], name='unique_readout_date')]
+
     def __str__(self):
         return f"{self.apartment} - {self.readout_date}"
 
@@ -171,6 +477,9 @@ class Occupancy(models.Model):
     start_date = models.DateField(verbose_name="Od")
     occupants = models.IntegerField(verbose_name="Ilość mieszkańców")
 
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['apartment', 'start_date'], name='unique_occupancy_start')]
+
     def __str__(self):
         return f"{self.apartment} - {self.occupants}: {self.start_date}"
 
@@ -180,12 +489,19 @@ class ParkingCard(models.Model):
     start_date = models.DateField(verbose_name="Od")
     number_of_cards = models.IntegerField(verbose_name="Ilość kart parkingowych")
 
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['apartment', 'start_date'], name='unique_parking_card_start')]
+
 
 class BigFamilyCard(models.Model):
     apartment = models.ForeignKey(Apartment, on_delete=models.PROTECT, verbose_name="Mieszkanie")
     start_date = models.DateField(verbose_name="Od")
     amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Kwota")
 
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['apartment', 'start_date'],
+                                               name='unique_big_family_card_start')]
+
 
 class CentralHeatingSurcharge(models.Model):
     apartment = models.ForeignKey(Apartment, on_delete=models.PROTECT, verbose_name="Mieszkanie")
@@ -194,6 +510,9 @@ class CentralHeatingSurcharge(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Kwota")
     amount_per_month = models.DecimalField(max_digits=10, decimal_places=2, null=True, verbose_name="Kwota miesięczna")
 
+    class Meta:
+        indexes = [models.Index(fields=['apartment', 'start_date', 'end_date'], name='surcharge_apartment_dates')]
+
     @property
     def number_of_payments(self):
         return (self.end_date.year - self.start_date.year) * 12 + (self.end_date.month - self.start_date.month) + 1
@@ -208,3 +527,55 @@ class CentralHeatingSurcharge(models.Model):
 
     def __str__(self):
         return f"Mieszkanie nr.:{self.apartment} Do zapłaty: {self.amount}"
+
+
+class MonthlyStatement(models.Model):
+    """Fee breakdown of one readout, kept up to date with the readouts, tariffs and household records
+    by management.statements.refresh_monthly_statements. Readouts that cannot be billed have no row."""
+    BREAKDOWN_FIELDS = ('readout_date', 'hot_water_cost', 'cold_water_cost', 'maintenance_cost', 'repair_fund_cost',
+                        'central_heating_cost', 'garbage_cost', 'tenants', 'hot_used', 'hot_water', 'cold_used',
+                        'cold_water', 'hot_water_fee', 'cold_water_fee', 'maintenance_fee', 'repair_fund_fee',
+                        'central_heating_fee', 'garbage_fee', 'parking_fee', 'central_heating_surcharge', 'total')
+
+    apartment = models.ForeignKey(Apartment, on_delete=models.CASCADE, related_name='statements',
+                                  verbose_name="Mieszkanie")
+    readout = models.OneToOneField(WaterReadouts, on_delete=models.CASCADE, related_name='statement',
+                                   verbose_name="Odczyt")
+    readout_date = models.DateField(verbose_name="Data odczytu")
+    tenants = models.IntegerField(verbose_name="Osoby")
+    cold_water = models.IntegerField(verbose_name="Stan ZW")
+    cold_used = models.IntegerField(verbose_name="Zużycie ZW")
+    hot_water = models.IntegerField(verbose_name="Stan CW")
+    hot_used = models.IntegerField(verbose_name="Zużycie CW")
+    maintenance_fee = models.DecimalField(max_digits=5, decimal_places=2, verbose_name="Opłata eksploatacyjna za m2")
+    repair_fund_fee = models.DecimalField(max_digits=5, decimal_places=2, verbose_name="Fundusz remontowy za m2")
+    central_heating_fee = models.DecimalField(max_digits=5, decimal_places=2, verbose_name="CO za m2")
+    cold_water_fee = models.DecimalField(max_digits=5, decimal_places=2, verbose_name="ZW za m3")
+    hot_water_fee = models.DecimalField(max_digits=5, decimal_places=2, verbose_name="CW za m3")
+    garbage_fee = models.DecimalField(max_digits=5, decimal_places=2, verbose_name="Śmieci za osobę")
+    maintenance_cost = models.DecimalField(max_digits=12, decimal_places=4, verbose_name="Opłata eksploatacyjna")
+    repair_fund_cost = models.DecimalField(max_digits=12, decimal_places=4, verbose_name="Fundusz remontowy")
+    central_heating_cost = models.DecimalField(max_digits=12, decimal_places=4, verbose_name="CO")
+    cold_water_cost = models.DecimalField(max_digits=12, decimal_places=4, verbose_name="ZW")
+    hot_water_cost = models.DecimalField(max_digits=12, decimal_places=4, verbose_name="CW")
+    garbage_cost = models.DecimalField(max_digits=12, decimal_places=4, verbose_name="Śmieci")
+    parking_fee = models.DecimalField(max_digits=12, decimal_places=4, verbose_name="Parking")
+    central_heating_surcharge = models.DecimalField(max_digits=12, decimal_places=4, verbose_name="Dopłata CO")
+    total = models.DecimalField(max_digits=12, decimal_places=4, verbose_name="W sumie")
+    computed_at = models.DateTimeField(auto_now=True, verbose_name="Przeliczono")
+
+    class Meta:
+        ordering = ('readout_date',)
+        indexes = [models.Index(fields=['apartment', 'readout_date'], name='statement_apartment_date')]
+
+    @classmethod
+    def from_breakdown(cls, apartment_id, readout_id, breakdown):
+        return cls(apartment_id=apartment_id, readout_id=readout_id,
+                   **{field: breakdown[field] for field in cls.BREAKDOWN_FIELDS})
+
+    def as_breakdown(self):
+        """:returns: the row as a calculate_fees dict"""
+        return {field: getattr(self, field) for field in self.BREAKDOWN_FIELDS}
+
+    def __str__(self):
+        return f"{self.apartment_id} - {self.readout_date}"
@@ -0,0 +1,97 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
+from pathlib import Path
+from zipfile import ZIP_STORED, ZipFile
+
+import django
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.template.loader import render_to_string
+from xhtml2pdf import pisa
+
+
+STATEMENT_TEMPLATE = 'summary-template.html'
+
+
+class PdfRenderError(Exception):
+    pass
+
+
+def link_callback(uri, rel):
+    """Resolves fonts and images referenced by the PDF templates to absolute local paths,
+    either relative to the project directory or through the static files finders."""
+    path = Path(settings.BASE_DIR) / uri
+    if path.is_file():
+        return str(path)
+    found = finders.find(uri.removeprefix(settings.STATIC_URL))
+    return found or uri
+
+
+def html_to_pdf_bytes(html, link_callback=link_callback):
+    """Converts rendered HTML to a PDF entirely in memory."""
+    result = BytesIO()
+    pdf = pisa.CreatePDF(html, dest=result, encoding='utf-8', link_callback=link_callback)
+    if pdf.err:
+        raise PdfRenderError(f"PDF rendering failed with {pdf.err} error(s)")
+    return result.getvalue()
+
+
+def render_pdf(template_name, context=None):
+    """Renders the template with the context straight to PDF bytes, no files are written."""
+    return html_to_pdf_bytes(render_to_string(template_name, context))
+
+
+def setup_worker(settings_module):
+    """Sets up Django in a fresh worker process."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+
+
+def render_pdfs(documents, max_workers=None):
+    """Converts many rendered HTML documents to PDF on a process pool, one worker per core by default.
+    The workers live for the whole export, so reportlab and the fonts are loaded once per worker.
+    :param documents: iterable of (name, html)
+    :returns: generator of (name, pdf bytes) in completion order"""
+    max_workers = max_workers or getattr(settings, 'PDF_WORKERS', None) or os.cpu_count()
+    if max_workers == 1:
+        for name, html in documents:
+            yield name, html_to_pdf_bytes(html)
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=setup_worker, initargs=(settings.SETTINGS_MODULE,)) as executor:
+        futures = {executor.submit(html_to_pdf_bytes, html): name for name, html in documents}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+class _ZipStream:
+    """Write-only file object handing out what ZipFile wrote since the last read."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def read_written(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(files):
+    """Streams a ZIP archive of (name, bytes) pairs as each file becomes available.
+    PDFs are already compressed, so the entries are stored as they are."""
+    stream = _ZipStream()
+    with ZipFile(stream, mode='w', compression=ZIP_STORED) as archive:
+        for name, data in files:
+            archive.writestr(name, data)
+            yield stream.read_written()
+    yield stream.read_written()
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import BigFamilyCard, CentralHeatingSurcharge, Fees, MonthlyStatement, Occupancy, ParkingCard, \
+    WaterReadouts
+from .statements import statement_range
+
+HOUSEHOLD_INPUTS = (Occupancy, ParkingCard, BigFamilyCard, CentralHeatingSurcharge)
+
+
+def statement_fingerprint(apartment, year, start_month=None, end_month=None):
+    """Fingerprint of everything a yearly statement PDF is rendered from, read from the same database
+    as the statement itself: the MonthlyStatement rows of the range (recomputed rows get new ids and
+    computed_at), the readouts, household records and tariff rows they are computed from, and the latest
+    ledger entry. Editing any input changes it, so signal invalidation only frees disk space.
+    Use select_related('balance_head') on the apartment."""
+    start, end = statement_range(year, start_month, end_month)
+    statements = MonthlyStatement.objects.filter(apartment=apartment, readout_date__range=(start, end)).aggregate(
+        count=Count('id'), last=Max('id'), computed_at=Max('computed_at'))
+    readouts = WaterReadouts.objects.filter(apartment=apartment, readout_date__lte=end).order_by(
+        'readout_date', 'id').values_list('id', 'readout_date', 'cold_water_readout', 'hot_water_readout',
+                                          'new_cold_water_meter', 'new_hot_water_meter')
+    household = [list(model.objects.filter(apartment=apartment, start_date__lte=end).order_by('id').values_list())
+                 for model in HOUSEHOLD_INPUTS]
+    fees = Fees.objects.filter(period__lte=end).order_by('id').values_list()
+    head = getattr(apartment, 'balance_head', None)
+    inputs = {'apartment': str(apartment.pk),
+              'range': [start.isoformat(), end.isoformat()],
+              'statements': [statements['count'], statements['last'], statements['computed_at']],
+              'readouts': list(readouts),
+              'household': household,
+              'fees': list(fees),
+              'ledger': [head.entry_id, head.balance] if head else None}
+    return hashlib.sha256(json.dumps(inputs, default=str).encode()).hexdigest()
+
+
+class PdfCache:
+    """Rendered PDFs on local disk, one directory per apartment, least recently used files are evicted
+    once the total size exceeds max_size bytes."""
+
+    def __init__(self, directory, max_size):
+        self.directory = Path(directory)
+        self.max_size = max_size
+
+    def _path(self, apartment_id, fingerprint):
+        return self.directory / str(apartment_id) / f"{fingerprint}.pdf"
+
+    def get(self, apartment_id, fingerprint):
+        path = self._path(apartment_id, fingerprint)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+        os.utime(path)
+        return data
+
+    def set(self, apartment_id, fingerprint, data):
+        path = self._path(apartment_id, fingerprint)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=path.parent, suffix='.tmp', delete=False) as file:
+            file.write(data)
+        os.replace(file.name, path)
+        self.evict()
+
+    def invalidate(self, apartment_id=None):
+        """Removes the cached PDFs of the apartment, or all of them"""
+        shutil.rmtree(self.directory / str(apartment_id) if apartment_id else self.directory, ignore_errors=True)
+
+    def evict(self):
+        files = []
+        for path in self.directory.glob('*/*.pdf'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+def get_pdf_cache():
+    return PdfCache(settings.PDF_CACHE_DIR, settings.PDF_CACHE_MAX_SIZE)
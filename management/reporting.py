@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PRIMARY_COOKIE = 'primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def reporting_alias():
+    """:returns: the REPORTING_DATABASE alias, or the primary when there is no separate reporting database yet:
+        the alias is not configured, points at the primary (as its test mirror does) or was never refreshed"""
+    alias = getattr(settings, 'REPORTING_DATABASE', None)
+    if alias not in settings.DATABASES:
+        return DEFAULT_DB_ALIAS
+    name = str(connections[alias].settings_dict['NAME'])
+    if name == str(connections[DEFAULT_DB_ALIAS].settings_dict['NAME']):
+        return DEFAULT_DB_ALIAS
+    if connections[alias].vendor == 'sqlite' and not os.path.exists(name):
+        return DEFAULT_DB_ALIAS
+    return alias
+
+
+@contextmanager
+def reporting_database():
+    """Sends every read inside the block to the reporting database, writes still go to the primary."""
+    token = _read_alias.set(reporting_alias())
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReportingRouter:
+    """Reads inside reporting_database go to the reporting alias, everything else uses the primary.
+    The reporting database is a copy made by refresh_reporting_database, so it is never migrated."""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != getattr(settings, 'REPORTING_DATABASE', None)
+
+
+def wrote_recently(request):
+    """:returns: whether the client changed data recently enough for the reporting database not to show it yet"""
+    try:
+        return float(request.COOKIES.get(PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class PrimaryAfterWriteMiddleware:
+    """Marks clients that just changed data with a cookie, so their reporting pages read the primary
+    until the reporting database is refreshed and they can see their own changes."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            seconds = getattr(settings, 'REPORTING_PRIMARY_AFTER_WRITE', 300)
+            response.set_cookie(PRIMARY_COOKIE, str(time.time() + seconds), max_age=seconds, httponly=True,
+                                samesite='Lax')
+        return response
+
+
+def refresh_reporting_database(alias=None):
+    """Copies the primary SQLite database into the reporting one with the online backup API.
+    Readers of the reporting database keep a consistent view while it is replaced."""
+    alias = alias or settings.REPORTING_DATABASE
+    primary, replica = connections[DEFAULT_DB_ALIAS], connections[alias]
+    if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+        raise ImproperlyConfigured("Odświeżanie kopii jest dostępne tylko dla SQLite, "
+                                   "dla innych baz użyj replikacji.")
+    primary.ensure_connection()
+    replica.close()
+    target = sqlite3.connect(replica.settings_dict['NAME'],
+                             timeout=replica.settings_dict['OPTIONS'].get('timeout', 5))
+    try:
+        primary.connection.backup(target)
+    finally:
+        target.close()
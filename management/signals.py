@@ -0,0 +1,101 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .choices import invalidate_choices
+from .models import Apartment, ApartmentBalance, BigFamilyCard, CentralHeatingSurcharge, Fees, Occupancy, ParkingCard, \
+    WaterReadouts
+from .pdf_cache import get_pdf_cache
+from .statements import refresh_monthly_statements
+
+FEE_INPUTS = (WaterReadouts, Occupancy, ParkingCard, BigFamilyCard, CentralHeatingSurcharge)
+APARTMENT_INPUTS = FEE_INPUTS + (ApartmentBalance,)
+
+
+@receiver(post_save, sender=Apartment)
+@receiver(post_delete, sender=Apartment)
+@receiver(post_save, sender=WaterReadouts)
+@receiver(post_delete, sender=WaterReadouts)
+def invalidate_form_choices(sender, **kwargs):
+    invalidate_choices()
+
+
+STATEMENT_INPUTS = {WaterReadouts: 'readout_date', Occupancy: 'start_date', ParkingCard: 'start_date',
+                    BigFamilyCard: 'start_date', CentralHeatingSurcharge: 'start_date'}
+
+
+def remember_statement_input(sender, instance, raw=False, **kwargs):
+    """Keeps the stored apartment and date of an edited record, statements from the old date on change too."""
+    if instance.pk and not raw:
+        instance._statement_input = sender.objects.filter(pk=instance.pk).values_list(
+            'apartment_id', STATEMENT_INPUTS[sender]).first()
+
+
+def refresh_apartment_statements(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    affected = {instance.apartment_id: getattr(instance, STATEMENT_INPUTS[sender])}
+    previous = getattr(instance, '_statement_input', None)
+    if previous:
+        apartment_id, date = previous
+        affected[apartment_id] = min(date, affected.get(apartment_id, date))
+    for apartment_id, since in affected.items():
+        refresh_monthly_statements([apartment_id], since)
+
+
+for model in STATEMENT_INPUTS:
+    pre_save.connect(remember_statement_input, sender=model,
+                     dispatch_uid=f'remember_statement_input_{model.__name__}')
+    post_save.connect(refresh_apartment_statements, sender=model,
+                      dispatch_uid=f'refresh_statements_{model.__name__}')
+    post_delete.connect(refresh_apartment_statements, sender=model,
+                        dispatch_uid=f'refresh_statements_delete_{model.__name__}')
+
+
+@receiver(pre_save, sender=Fees)
+def remember_tariff_period(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._statement_input = sender.objects.filter(pk=instance.pk).values_list('period', flat=True).first()
+
+
+@receiver(post_save, sender=Fees)
+@receiver(post_delete, sender=Fees)
+def refresh_statements_after_tariff_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_statement_input', None)
+    refresh_monthly_statements(since=min(instance.period, previous or instance.period))
+
+
+@receiver(post_save, sender=Apartment)
+def refresh_statements_after_area_change(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        refresh_monthly_statements([instance.pk])
+
+
+# Connected after the statement refresh receivers and run on commit, the cached PDFs are removed once the
+# recomputed statements are visible to the requests that render them again.
+@receiver(post_save, sender=Fees)
+@receiver(post_delete, sender=Fees)
+def invalidate_pdfs_after_tariff_change(sender, **kwargs):
+    transaction.on_commit(lambda: get_pdf_cache().invalidate())
+
+
+def invalidate_apartment_statement_pdfs(sender, instance, **kwargs):
+    apartment_ids = {instance.apartment_id}
+    previous = getattr(instance, '_statement_input', None)
+    if previous:
+        apartment_ids.add(previous[0])
+
+    def invalidate():
+        pdf_cache = get_pdf_cache()
+        for apartment_id in apartment_ids:
+            pdf_cache.invalidate(apartment_id)
+    transaction.on_commit(invalidate)
+
+
+for model in APARTMENT_INPUTS:
+    post_save.connect(invalidate_apartment_statement_pdfs, sender=model,
+                      dispatch_uid=f'invalidate_statement_pdfs_{model.__name__}')
+    post_delete.connect(invalidate_apartment_statement_pdfs, sender=model,
+                        dispatch_uid=f'invalidate_statement_pdfs_delete_{model.__name__}')
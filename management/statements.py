@@ -0,0 +1,117 @@
+import datetime
+from itertools import groupby
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .consumption import building_consumption
+from .db import write_transaction
+from .models import Apartment, MonthlyStatement, WaterReadouts
+from .utils import calculate_fees, calculate_fees_bulk, calculate_fees_from_indexes, load_fee_indexes
+
+
+def statement_range(year, start_month=None, end_month=None):
+    """:returns: first and last day of the month range of the year"""
+    year = int(year)
+    start = datetime.date(year, int(start_month or 1), 1)
+    end_month = int(end_month or 12)
+    if end_month == 12:
+        end = datetime.date(year, 12, 31)
+    else:
+        end = datetime.date(year, end_month + 1, 1) - datetime.timedelta(days=1)
+    return start, end
+
+
+def _breakdowns(apartment, usages, indexes, start):
+    """:param usages: consumption.Usage of the apartment's readouts in date order
+    :returns: {readout id: fee breakdown} of the readouts from start on, None for readouts that cannot be billed"""
+    breakdowns = {}
+    for usage in usages:
+        if usage.readout_date < start:
+            continue
+        try:
+            breakdowns[usage.readout_id] = calculate_fees_from_indexes(apartment, usage, indexes)
+        except ObjectDoesNotExist:
+            breakdowns[usage.readout_id] = None
+    return breakdowns
+
+
+def refresh_monthly_statements(apartment_ids=None, since=None):
+    """Recomputes the MonthlyStatement rows of the apartments for the readouts taken on or after since.
+    Earlier readouts are loaded too, the usage of every readout comes from one building_consumption pass.
+    :param apartment_ids: apartments to refresh, all when None
+    :param since: first readout date to refresh, all readouts when None
+    :returns: number of rows written"""
+    since = since or datetime.date.min
+    with write_transaction():
+        apartments = Apartment.objects.all()
+        if apartment_ids is not None:
+            apartments = apartments.filter(pk__in=apartment_ids)
+        apartments = list(apartments)
+        usages = building_consumption(WaterReadouts.objects.filter(apartment__in=apartments))
+        usages = {apartment_id: list(rows) for apartment_id, rows in groupby(usages, lambda row: row.apartment_id)}
+        indexes = load_fee_indexes(None if apartment_ids is None else [apartment.pk for apartment in apartments])
+        rows = []
+        for apartment in apartments:
+            breakdowns = _breakdowns(apartment, usages.get(apartment.pk, []), indexes, since)
+            rows.extend(MonthlyStatement.from_breakdown(apartment.pk, readout_id, breakdown)
+                        for readout_id, breakdown in breakdowns.items() if breakdown is not None)
+        MonthlyStatement.objects.filter(apartment__in=apartments, readout_date__gte=since).delete()
+        MonthlyStatement.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def yearly_statement(apartment, year, start_month=None, end_month=None):
+    """Fee breakdown of every billed readout of the apartment in the given year and month range,
+    read from MonthlyStatement with one indexed query.
+    :returns: list of calculate_fees dicts ordered by readout date"""
+    start, end = statement_range(year, start_month, end_month)
+    rows = MonthlyStatement.objects.filter(apartment=apartment, readout_date__range=(start, end)).order_by(
+        'readout_date', 'readout')
+    return [row.as_breakdown() for row in rows]
+
+
+def building_statements(year, start_month=None, end_month=None, apartments=None):
+    """yearly_statement of every apartment, read with one query.
+    :returns: generator of (apartment, statement) in apartment number order"""
+    start, end = statement_range(year, start_month, end_month)
+    if apartments is None:
+        apartments = Apartment.objects.select_related('balance_head__entry')
+    apartments = list(apartments)
+    rows = MonthlyStatement.objects.filter(apartment__in=apartments, readout_date__range=(start, end)).order_by(
+        'apartment', 'readout_date', 'readout')
+    rows = {apartment_id: [row.as_breakdown() for row in group]
+            for apartment_id, group in groupby(rows, lambda row: row.apartment_id)}
+    for apartment in apartments:
+        yield apartment, rows.get(apartment.pk, [])
+
+
+def apartment_breakdown(apartment, readout_id=None):
+    """Fee breakdown of the readout, the newest one by default, read from MonthlyStatement in one query.
+    Readouts without a row are calculated, raising like calculate_fees."""
+    readouts = WaterReadouts.objects.filter(apartment=apartment)
+    if readout_id:
+        readouts = readouts.filter(pk=readout_id)
+    readout = readouts.select_related('statement').order_by('-readout_date', '-id').first()
+    try:
+        return readout.statement.as_breakdown()
+    except (AttributeError, ObjectDoesNotExist):
+        return calculate_fees(apartment, readout_id)
+
+
+def latest_breakdowns(apartments, strict=True):
+    """Fee breakdown of the newest readout of every apartment, as calculate_fees_bulk.
+    Read from MonthlyStatement in one query.
+    :param strict: calculate apartments whose newest readout has no row, raising when one cannot be billed,
+        otherwise they are left out
+    :returns: {apartment.pk: fees dict}"""
+    apartments = list(apartments)
+    latest = WaterReadouts.objects.filter(apartment__in=apartments).annotate(
+        row=Window(RowNumber(), partition_by=F('apartment'), order_by=[F('readout_date').desc(), F('id').desc()]))
+    statements = MonthlyStatement.objects.filter(readout__in=latest.filter(row=1).values('id'))
+    result = {row.apartment_id: row.as_breakdown() for row in statements}
+    missing = [apartment for apartment in apartments if apartment.pk not in result]
+    if missing and strict:
+        result.update(calculate_fees_bulk(missing, strict=strict))
+    return result
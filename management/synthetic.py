@@ -0,0 +1,159 @@
+import datetime
+import random
+from decimal import Decimal
+
+from django.db import transaction
+from openpyxl import Workbook
+
+from .choices import invalidate_choices
+from .models import Apartment, ApartmentBalance, BigFamilyCard, CentralHeatingSurcharge, Fees, MonthlyStatement, \
+    Occupancy, ParkingCard, WaterReadouts
+from .statements import refresh_monthly_statements
+
+READOUT_DAY = 28
+CENT = Decimal('0.01')
+
+
+class SyntheticAssociation:
+    """Deterministic fake association for benchmarks: apartments with monthly water readouts including
+    meter replacements, a tariff change every half year, occupancy changes, parking and big family cards,
+    heating surcharges and a ledger with monthly charges and payments.
+    The same seed always gives the same data.
+    :param apartments: number of apartments
+    :param years: years of history saved by create, starting in January of start_year
+    :param replacement_rate: chance of a meter replacement in a month"""
+
+    def __init__(self, apartments=40, years=2, start_year=2022, seed=0, replacement_rate=0.02):
+        self.apartments = apartments
+        self.years = years
+        self.start_year = start_year
+        self.seed = seed
+        self.replacement_rate = replacement_rate
+        self._readings = None
+
+    @property
+    def end_year(self):
+        return self.start_year + self.years - 1
+
+    def dates(self, year):
+        return [datetime.date(year, month, READOUT_DAY) for month in range(1, 13)]
+
+    def readings(self):
+        """Simulates the meters of every apartment for the saved years and the year after them.
+        The year after is left for write_readouts_xlsx, the sheet has no meter replacement flags
+        so there are no replacements in it.
+        :returns: {apartment number: [(date, cold, hot, new cold meter, new hot meter)]}"""
+        if self._readings is None:
+            rng = random.Random(self.seed)
+            self._readings = {}
+            for number in range(1, self.apartments + 1):
+                cold_rate, hot_rate = rng.uniform(2, 8), rng.uniform(1, 5)
+                cold, hot = rng.randint(0, 500), rng.randint(0, 300)
+                rows = []
+                for year in range(self.start_year, self.end_year + 2):
+                    for date in self.dates(year):
+                        new_cold = new_hot = False
+                        if len(rows) >= 2 and year <= self.end_year:
+                            new_cold = rng.random() < self.replacement_rate
+                            new_hot = rng.random() < self.replacement_rate
+                        cold_used = max(0, round(rng.gauss(cold_rate, 1)))
+                        hot_used = max(0, round(rng.gauss(hot_rate, 1)))
+                        cold = cold_used if new_cold else cold + cold_used
+                        hot = hot_used if new_hot else hot + hot_used
+                        rows.append((date, cold, hot, new_cold, new_hot))
+                self._readings[number] = rows
+        return self._readings
+
+    def create(self):
+        """Saves the association with bulk inserts and builds its monthly statements.
+        Expects a database without apartments.
+        :returns: {model name: number of rows created}"""
+        rng = random.Random(self.seed + 1)
+        start = datetime.date(self.start_year, 1, 1)
+        with transaction.atomic():
+            fees = []
+            for index, year_month in enumerate((year, month) for year in range(self.start_year, self.end_year + 1)
+                                               for month in (1, 7)):
+                growth = 1 + Decimal(index) / 50
+                fees.append(Fees(period=datetime.date(*year_month, 1),
+                                 maintenance_fee=(Decimal('2.10') * growth).quantize(CENT),
+                                 repair_fund=(Decimal('1.50') * growth).quantize(CENT),
+                                 central_heating=(Decimal('3.20') * growth).quantize(CENT),
+                                 cold_water=(Decimal('11.80') * growth).quantize(CENT),
+                                 hot_water=(Decimal('24.50') * growth).quantize(CENT),
+                                 garbage=(Decimal('32.00') * growth).quantize(CENT),
+                                 parking_fee=Decimal('15.00')))
+            Fees.objects.bulk_create(fees)
+
+            apartments = Apartment.objects.bulk_create(
+                Apartment(number=number, area=Decimal(rng.randint(2800, 9500)) / 100, acc_number=10000 + number)
+                for number in range(1, self.apartments + 1))
+
+            occupancy, parking, big_family, surcharges, readouts = [], [], [], [], []
+            for apartment in apartments:
+                occupancy.append(Occupancy(apartment=apartment, start_date=start, occupants=rng.randint(1, 5)))
+                if rng.random() < 0.3:
+                    parking.append(ParkingCard(apartment=apartment, start_date=start,
+                                               number_of_cards=rng.randint(1, 2)))
+                if rng.random() < 0.1:
+                    big_family.append(BigFamilyCard(apartment=apartment, start_date=start,
+                                                    amount=Decimal(rng.randint(5, 30))))
+                for year in range(self.start_year, self.end_year + 1):
+                    if rng.random() < 0.2:
+                        occupancy.append(Occupancy(apartment=apartment, start_date=datetime.date(year, 7, 1),
+                                                   occupants=rng.randint(1, 6)))
+                    if rng.random() < 0.2:
+                        amount = Decimal(rng.randint(100, 600))
+                        surcharges.append(CentralHeatingSurcharge(
+                            apartment=apartment, start_date=datetime.date(year, 10, 1),
+                            end_date=datetime.date(year + 1, 3, 1), amount=amount,
+                            amount_per_month=(amount / 6).quantize(CENT)))
+                for date, cold, hot, new_cold, new_hot in self.readings()[apartment.number]:
+                    if date.year <= self.end_year:
+                        readouts.append(WaterReadouts(apartment=apartment, readout_date=date,
+                                                      cold_water_readout=cold, hot_water_readout=hot,
+                                                      new_cold_water_meter=new_cold, new_hot_water_meter=new_hot))
+            Occupancy.objects.bulk_create(occupancy)
+            ParkingCard.objects.bulk_create(parking)
+            BigFamilyCard.objects.bulk_create(big_family)
+            CentralHeatingSurcharge.objects.bulk_create(surcharges)
+            WaterReadouts.objects.bulk_create(readouts, batch_size=1000)
+            statements = refresh_monthly_statements()
+
+            entries = []
+            for statement in MonthlyStatement.objects.order_by('readout_date', 'apartment'):
+                date = datetime.datetime.combine(statement.readout_date, datetime.time(12),
+                                                 tzinfo=datetime.timezone.utc)
+                total = statement.total.quantize(CENT)
+                entries.append(ApartmentBalance(apartment_id=statement.apartment_id, date=date,
+                                                title=f"Opłaty {statement.readout_date:%m.%Y}", amount=total,
+                                                type_of_transaction='HWCH'))
+                if rng.random() < 0.9:
+                    entries.append(ApartmentBalance(apartment_id=statement.apartment_id,
+                                                    date=date + datetime.timedelta(days=10),
+                                                    title="Wpłata", amount=-total, type_of_transaction='BANK'))
+            entries.sort(key=lambda entry: entry.date)
+            ApartmentBalance.objects.bulk_post(entries)
+        invalidate_choices()
+        return {'Apartment': len(apartments), 'Fees': len(fees), 'Occupancy': len(occupancy),
+                'ParkingCard': len(parking), 'BigFamilyCard': len(big_family),
+                'CentralHeatingSurcharge': len(surcharges), 'WaterReadouts': len(readouts),
+                'MonthlyStatement': statements, 'ApartmentBalance': len(entries)}
+
+    def write_readouts_xlsx(self, file, year=None):
+        """Writes the readouts of a year in the import_water_readouts layout, by default of the year
+        after the saved history, which imports as new readouts."""
+        year = year or self.end_year + 1
+        wb = Workbook(write_only=True)
+        sheet = wb.create_sheet()
+        header = [None]
+        for date in self.dates(year):
+            header += [datetime.datetime.combine(date, datetime.time()), None]
+        sheet.append(header)
+        for number, rows in self.readings().items():
+            row = [number]
+            for date, cold, hot, new_cold, new_hot in rows:
+                if date.year == year:
+                    row += [cold, hot]
+            sheet.append(row)
+        wb.save(file)
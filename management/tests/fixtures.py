@@ -0,0 +1,19 @@
+from management.models import Apartment, WaterReadouts, Fees, Occupancy
+import datetime
+
+
+def create_building(apartments=3, year=2023, months=12):
+    """Creates apartments with one tariff, occupancy and monthly readouts for the given year."""
+    Fees.objects.create(period=datetime.date(year, 1, 1), maintenance_fee=2, repair_fund=1, central_heating=3,
+                        cold_water=10, hot_water=20, garbage=30, parking_fee=15)
+    created = []
+    for number in range(1, apartments + 1):
+        apartment = Apartment.objects.create(number=number, area=50, acc_number=1000 + number)
+        Occupancy.objects.create(apartment=apartment, start_date=datetime.date(year, 1, 1), occupants=2)
+        for month in range(1, months + 1):
+            WaterReadouts.objects.create(apartment=apartment,
+                                         readout_date=datetime.date(year, month, 28),
+                                         cold_water_readout=month * 2,
+                                         hot_water_readout=month)
+        created.append(apartment)
+    return created
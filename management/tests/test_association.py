@@ -0,0 +1,160 @@
+from decimal import Decimal
+from io import BytesIO
+
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+from management.models import ApartmentUser, AssociationBalance, AssociationBalanceHead, AssociationMonthlyRollup
+from management.utils import read_association_entries
+from openpyxl import Workbook
+import datetime
+
+
+def entry(month, amount, type_of_transaction='BANK', day=10):
+    return AssociationBalance(date=datetime.datetime(2023, month, day, 12, tzinfo=datetime.timezone.utc),
+                              title=f"Operacja {month}.{day}", amount=Decimal(amount), counterparty='Bank',
+                              type_of_transaction=type_of_transaction)
+
+
+class TestAssociationRollups(TestCase):
+
+    def rollups(self, type_of_transaction='BANK'):
+        return list(AssociationMonthlyRollup.objects.filter(type_of_transaction=type_of_transaction).values_list(
+            'period__month', 'opening_balance', 'inflows', 'outflows', 'closing_balance'))
+
+    def test_inserts_update_rollups_and_head(self):
+        entry(1, 100).save()
+        entry(1, -30).save()
+        entry(3, 50).save()
+        self.assertEqual(self.rollups(), [(1, 0, 100, 30, 70), (3, 70, 50, 0, 120)])
+        head = AssociationBalanceHead.objects.get()
+        self.assertEqual(head.balance, 120)
+        self.assertEqual(head.entry, AssociationBalance.objects.latest('id'))
+
+    def test_saved_entries_are_final(self):
+        saved = entry(1, 100)
+        saved.save()
+        saved.amount = 200
+        with self.assertRaises(ValidationError):
+            saved.save()
+        with self.assertRaises(ValidationError):
+            saved.delete()
+        self.assertEqual(self.rollups(), [(1, 0, 100, 0, 100)])
+        self.assertEqual(AssociationBalanceHead.objects.get().balance, 100)
+
+    def test_backdated_entry_moves_later_months(self):
+        entry(1, 100).save()
+        entry(3, 50).save()
+        entry(2, -20).save()
+        entry(1, 5, day=20).save()
+        self.assertEqual(self.rollups(), [(1, 0, 105, 0, 105), (2, 105, 0, 20, 85), (3, 85, 50, 0, 135)])
+
+    def test_bulk_post_matches_saves(self):
+        entries = [entry(1, 100), entry(2, -40, 'HWCH'), entry(2, 10), entry(4, -5)]
+        for saved in entries:
+            saved.save()
+        expected = self.rollups(), self.rollups('HWCH'), list(AssociationBalance.objects.values_list('balance'))
+        AssociationBalanceHead.objects.all().delete()
+        AssociationMonthlyRollup.objects.all().delete()
+        AssociationBalance.objects.all().delete()
+        entries = [entry(1, 100), entry(2, -40, 'HWCH'), entry(2, 10), entry(4, -5)]
+        with self.assertNumQueries(2 + 3 + 4 * 4):
+            AssociationBalance.objects.bulk_post(entries)
+        self.assertEqual((self.rollups(), self.rollups('HWCH'), list(AssociationBalance.objects.values_list('balance'))),
+                         expected)
+        self.assertEqual(AssociationBalanceHead.objects.get().balance, 65)
+
+    def test_totals(self):
+        for month, amount, type_of_transaction in [(1, 100, 'BANK'), (2, -40, 'HWCH'), (3, 10, 'BANK'),
+                                                   (4, -5, 'BANK'), (5, 7, 'HWCH')]:
+            entry(month, amount, type_of_transaction).save()
+        with self.assertNumQueries(1):
+            totals = AssociationMonthlyRollup.objects.totals(datetime.date(2023, 2, 1), datetime.date(2023, 4, 1))
+        self.assertEqual([(row['type_of_transaction'], row['opening_balance'], row['inflows'], row['outflows'],
+                           row['closing_balance']) for row in totals['rows']],
+                         [('BANK', 100, 10, 5, 105), ('HWCH', 0, 0, 40, -40)])
+        self.assertEqual(totals['total'], {'opening_balance': 100, 'inflows': 10, 'outflows': 45,
+                                           'closing_balance': 65})
+        self.assertEqual(AssociationMonthlyRollup.objects.totals(type_of_transaction='HWCH')['total']['closing_balance'],
+                         -33)
+
+
+class TestAssociationBalanceView(TestCase):
+    def setUp(self):
+        self.client.force_login(ApartmentUser.objects.create_superuser('admin', 'admin@example.com', 'x'))
+        AssociationBalance.objects.bulk_post([entry(month, 10 * month, day=day) for month in range(1, 7)
+                                              for day in range(1, 11)])
+
+    def test_totals_and_pages(self):
+        response = self.client.get(reverse('association-balance'), {'start_date': '2023-03-05',
+                                                                    'end_date': '2023-04-30'})
+        self.assertEqual(response.context['balance'], 2100)
+        self.assertEqual(response.context['totals']['total'], {'opening_balance': 300, 'inflows': 700,
+                                                               'outflows': 0, 'closing_balance': 1000})
+        self.assertEqual(response.context['paginator'].count, 16)
+        response = self.client.get(reverse('association-balance'), {'page': 2})
+        self.assertEqual(len(response.context['object_list']), 20)
+        self.assertContains(response, '?&page=1')
+
+
+class TestAssociationBalanceCreate(TestCase):
+    def setUp(self):
+        self.client.force_login(ApartmentUser.objects.create_superuser('admin', 'admin@example.com', 'x'))
+        entry(1, 1000).save()
+
+    def post(self, rows=(), **data):
+        post = {'form-TOTAL_FORMS': len(rows) + 1, 'form-INITIAL_FORMS': 0, 'text': ''}
+        for index, row in enumerate(rows):
+            post.update({f'form-{index}-{field}': value for field, value in zip(
+                ('date', 'type_of_transaction', 'title', 'amount'), row)})
+        post.update(data)
+        return self.client.post(reverse('association-balance-create'), post)
+
+    def test_formset_size(self):
+        response = self.client.get(reverse('association-balance-create'), {'forms': 12})
+        self.assertEqual(len(response.context['formset'].forms), 12)
+
+    def test_bulk_entry(self):
+        csv_file = SimpleUploadedFile('faktury.csv', "Data;Typ;Tytuł;Kwota;Kontrahent\n"
+                                                     "2023-02-03;Bank;Faktura 1/02;-1 200,50;Wodociągi\n"
+                                                     "\n"
+                                                     "2023-02-05;hwch;Faktura 2/02;-99,50;Ciepłownia\n".encode('cp1250'))
+        text = "2023-02-10 10:00\tBANK\tOdsetki\t0.40\n"
+        response = self.post([('2023-02-01T08:00', 'CORRECTION', 'Korekta', '-10')], file=csv_file, text=text)
+        self.assertRedirects(response, reverse('association-balance'))
+        entries = list(AssociationBalance.objects.order_by('id').values_list('title', 'amount', 'balance',
+                                                                          'counterparty'))
+        self.assertEqual(entries[1:], [('Korekta', -10, 990, ''),
+                                       ('Faktura 1/02', Decimal('-1200.50'), Decimal('-210.50'), 'Wodociągi'),
+                                       ('Faktura 2/02', Decimal('-99.50'), -310, 'Ciepłownia'),
+                                       ('Odsetki', Decimal('0.40'), Decimal('-309.60'), '')])
+        self.assertEqual(AssociationBalanceHead.objects.get().balance, Decimal('-309.60'))
+        self.assertEqual(AssociationMonthlyRollup.objects.get(type_of_transaction='BANK',
+                                                              period=datetime.date(2023, 2, 1)).outflows,
+                         Decimal('1200.50'))
+
+    def test_invalid_row_saves_nothing(self):
+        text = "2023-02-10\tBANK\tOdsetki\t0.40\n2023-02-31\tPRZELEW\tBłąd\t1\n"
+        response = self.post([('2023-02-01T08:00', 'BANK', 'Wpłata', '10')], text=text)
+        self.assertEqual(response.status_code, 200)
+        errors = response.context['form'].non_field_errors()
+        self.assertEqual(len(errors), 2)
+        self.assertTrue(all(error.startswith("Wklejone dane, wiersz 2:") for error in errors))
+        self.assertEqual(AssociationBalance.objects.count(), 1)
+
+    def test_empty_post(self):
+        response = self.post()
+        self.assertEqual(response.context['form'].non_field_errors(), ["Nie podano żadnej operacji"])
+
+    def test_read_xlsx(self):
+        wb = Workbook()
+        wb.active.append(['Data', 'Typ', 'Tytuł', 'Kwota'])
+        wb.active.append([datetime.datetime(2023, 3, 1, 9), 'Kompensata', 'Kompensata 03', -15.5])
+        file = BytesIO()
+        wb.save(file)
+        file.seek(0)
+        file.name = 'operacje.xlsx'
+        self.assertEqual(list(read_association_entries(file)), [
+            (2, {'date': datetime.datetime(2023, 3, 1, 9), 'type_of_transaction': 'COMPENSATION',
+                 'title': 'Kompensata 03', 'amount': -15.5})])
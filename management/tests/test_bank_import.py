@@ -0,0 +1,175 @@
+from decimal import Decimal
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from management.bank_import import ApartmentMatcher, StatementLine, import_bank_statement, read_bank_statement
+from management.models import Apartment, ApartmentBalance, ApartmentUser, BankStatementLine
+import datetime
+
+CSV_STATEMENT = """Data operacji;Kwota;Tytuł;Nadawca;Rachunek
+2023-03-02;450,00;Czynsz marzec;Jan Kowalski;PL61 1090 1014 0000 0712 1981 0101
+03.03.2023;1 200,50;czynsz m. 3 za marzec;Anna Nowak;
+2023-03-04;-80,00;Opłata za prowadzenie rachunku;Bank;
+2023-03-05;300,00;Darowizna;Ktoś;
+2023-03-06;120,00;Przelew za m 2 i m 4;Rodzina;
+
+2023-03-02;450,00;Czynsz marzec;Jan Kowalski;PL61 1090 1014 0000 0712 1981 0101
+"""
+
+MT940_STATEMENT = """:20:ST230331
+:25:/PL61109010140000071219812874
+:28C:00031
+:60F:C230301PLN1000,00
+:61:2303030303CN450,00N240NONREF//BANKREF1
+:86:240~00VE02~20Czynsz marzec~21lokal nr 2~27Jan Kowal~28ski~38PL611090101400000712198103
+:61:2303100310DN80,00N026NONREF
+:86:026~00VE02~20Opłata za rachunek
+:61:2303150315RCN450,00N240NONREF
+:86:240~20Zwrot~21czynsz
+:62F:C230331PLN920,00
+-
+"""
+
+
+def upload(content, name='wyciag.csv', encoding='utf-8'):
+    return SimpleUploadedFile(name, content.encode(encoding))
+
+
+class TestBankStatementReaders(TestCase):
+
+    def test_csv(self):
+        lines = list(read_bank_statement(upload(CSV_STATEMENT, encoding='cp1250')))
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(lines[1], StatementLine(date=lines[1].date, amount=Decimal('1200.50'),
+                                                 title='czynsz m. 3 za marzec', account='', counterparty='Anna Nowak',
+                                                 reference=''))
+        self.assertEqual(lines[1].date.date(), datetime.date(2023, 3, 3))
+        self.assertEqual(lines[2].amount, -80)
+
+    def test_csv_missing_columns(self):
+        with self.assertRaisesMessage(Exception, "Brak kolumn w pliku CSV: kwota"):
+            list(read_bank_statement(upload("Data;Tytuł\n2023-03-02;Czynsz\n")))
+
+    def test_mt940(self):
+        lines = list(read_bank_statement(upload("\n" + MT940_STATEMENT, name='wyciag.sta')))
+        self.assertEqual([(line.date.date(), line.amount) for line in lines],
+                         [(datetime.date(2023, 3, 3), 450), (datetime.date(2023, 3, 10), -80),
+                          (datetime.date(2023, 3, 15), -450)])
+        self.assertEqual(lines[0].title, 'Czynsz marzec lokal nr 2')
+        self.assertEqual(lines[0].counterparty, 'Jan Kowal ski')
+        self.assertEqual(lines[0].account, 'PL611090101400000712198103')
+        self.assertEqual(lines[0].reference, 'NONREF/BANKREF1')
+
+
+class TestApartmentMatcher(TestCase):
+    def setUp(self):
+        self.matcher = ApartmentMatcher([('a', 1, 101), ('b', 2, 102), ('c', 3, 3), ('d', 12, 10102)])
+
+    def line(self, title='', account=''):
+        return StatementLine(None, Decimal(1), title, account, '', '')
+
+    def test_account_whole_tail(self):
+        self.assertEqual(self.matcher.match(self.line(account='PL 0000 0101')), ('a', 'ACCOUNT', ''))
+        self.assertEqual(self.matcher.match(self.line(account='PL 0001 0102')), ('d', 'ACCOUNT', ''))
+        self.assertEqual(self.matcher.match(self.line(account='PL 0000 0102')), ('b', 'ACCOUNT', ''))
+        self.assertEqual(self.matcher.match(self.line(account='PL 0000 0003')), ('c', 'ACCOUNT', ''))
+
+    def test_account_partial_tail_goes_to_review(self):
+        self.assertEqual(self.matcher.match(self.line(account='PL 0000 0103')), (None, '', "Nie rozpoznano mieszkania"))
+        self.assertEqual(self.matcher.match(self.line(account='PL 12 0003')), (None, '', "Nie rozpoznano mieszkania"))
+        self.assertEqual(self.matcher.match(self.line('czynsz m 1', account='PL 0000 0103')), ('a', 'TITLE', ''))
+
+    def test_title(self):
+        self.assertEqual(self.matcher.match(self.line('Czynsz lok. nr 12')), ('d', 'TITLE', ''))
+        self.assertEqual(self.matcher.match(self.line('MIESZKANIE 2 marzec')), ('b', 'TITLE', ''))
+        self.assertEqual(self.matcher.match(self.line('m1 oraz m2'))[2], "Kilka numerów mieszkań w tytule")
+        self.assertEqual(self.matcher.match(self.line('faktura 12/2023'))[2], "Nie rozpoznano mieszkania")
+
+    def test_title_ignores_area(self):
+        self.assertEqual(self.matcher.match(self.line('czynsz lokal 12 pow. 53 m2')), ('d', 'TITLE', ''))
+        self.assertEqual(self.matcher.match(self.line('woda m 2, zużycie 12 m3')), ('b', 'TITLE', ''))
+
+    def test_account_longer_than_tail(self):
+        matcher = ApartmentMatcher([('a', 1, 101), ('e', 5, 1234567890)])
+        self.assertEqual(matcher.match(self.line(account='PL 12 1234 5678 90')), ('e', 'ACCOUNT', ''))
+        self.assertEqual(matcher.match(self.line(account='PL 12 0000 0000 0101')), ('a', 'ACCOUNT', ''))
+
+
+class TestImportBankStatement(TestCase):
+    def setUp(self):
+        for number in range(1, 6):
+            Apartment.objects.create(number=number, area=50, acc_number=1981_0100 + number)
+
+    def test_import(self):
+        result = import_bank_statement(upload(CSV_STATEMENT), source='marzec.csv')
+        self.assertEqual(result, {'matched': 3, 'unmatched': 2, 'duplicates': 0, 'debits': 1})
+        payments = ApartmentBalance.objects.order_by('id').values_list('apartment__number', 'amount', 'balance',
+                                                                       'type_of_transaction')
+        self.assertEqual(list(payments), [(1, -450, -450, 'BANK'),
+                                          (3, Decimal('-1200.50'), Decimal('-1200.50'), 'BANK'),
+                                          (1, -450, -900, 'BANK')])
+        self.assertEqual(Apartment.objects.get(number=1).get_latest_balance.balance, -900)
+        self.assertEqual(list(BankStatementLine.objects.filter(status='UNMATCHED').values_list('title', 'note')),
+                         [('Darowizna', "Nie rozpoznano mieszkania"),
+                          ('Przelew za m 2 i m 4', "Kilka numerów mieszkań w tytule")])
+        self.assertEqual(set(BankStatementLine.objects.filter(status='MATCHED').values_list('matched_by', flat=True)),
+                         {'ACCOUNT', 'TITLE'})
+
+    def test_import_mt940(self):
+        result = import_bank_statement(upload(MT940_STATEMENT, name='wyciag.sta'))
+        self.assertEqual(result, {'matched': 1, 'unmatched': 0, 'duplicates': 0, 'debits': 2})
+        line = BankStatementLine.objects.get()
+        self.assertEqual((line.apartment.number, line.matched_by, line.entry.amount), (2, 'TITLE', -450))
+
+    def test_import_again_posts_nothing(self):
+        import_bank_statement(upload(CSV_STATEMENT))
+        result = import_bank_statement(upload(CSV_STATEMENT))
+        self.assertEqual(result, {'matched': 0, 'unmatched': 0, 'duplicates': 5, 'debits': 1})
+        self.assertEqual(ApartmentBalance.objects.count(), 3)
+
+    def test_query_count_does_not_grow_with_lines(self):
+        rows = ''.join(f"2023-03-{day % 28 + 1:02d};{day}0,00;Czynsz m {day % 5 + 1} nr {day};Lokator;\n"
+                       for day in range(1200))
+        with CaptureQueriesContext(connection) as queries:
+            result = import_bank_statement(upload("Data;Kwota;Tytuł;Nadawca;Rachunek\n" + rows))
+        self.assertEqual(result['matched'], 1199)
+        # a few bulk inserts for every IMPORT_BATCH_SIZE lines, SQLite splits them by its variable limit
+        self.assertLess(len(queries), 60)
+
+
+class TestBankStatementViews(TestCase):
+    def setUp(self):
+        self.client.force_login(ApartmentUser.objects.create_superuser('admin', 'admin@example.com', 'x'))
+        for number in range(1, 6):
+            Apartment.objects.create(number=number, area=50, acc_number=1981_0100 + number)
+
+    def test_import_and_review(self):
+        response = self.client.post(reverse('bank-statement-import'), {'file': upload(CSV_STATEMENT)})
+        self.assertRedirects(response, reverse('bank-statement-review'))
+        response = self.client.get(reverse('bank-statement-review'))
+        self.assertEqual(len(response.context['object_list']), 2)
+        donation, family = response.context['object_list']
+
+        response = self.client.post(reverse('bank-statement-resolve', args=[family.pk]), {'apartment': 4})
+        self.assertRedirects(response, reverse('bank-statement-review'))
+        family.refresh_from_db()
+        self.assertEqual((family.status, family.matched_by, family.apartment.number), ('RESOLVED', 'MANUAL', 4))
+        self.assertEqual(family.entry.amount, -120)
+        self.client.post(reverse('bank-statement-resolve', args=[donation.pk]), {'apartment': '', 'ignore': 'Pomiń'})
+        donation.refresh_from_db()
+        self.assertEqual(donation.status, 'IGNORED')
+        self.assertIsNone(donation.entry)
+
+        response = self.client.post(reverse('bank-statement-resolve', args=[family.pk]), {'apartment': 5},
+                                    follow=True)
+        self.assertContains(response, "Ta operacja została już rozliczona.")
+        self.assertFalse(ApartmentBalance.objects.filter(apartment__number=5).exists())
+
+    def test_invalid_file(self):
+        response = self.client.post(reverse('bank-statement-import'),
+                                    {'file': upload(":20:X\n:61:zepsuta\n", name='wyciag.sta')})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(BankStatementLine.objects.count(), 0)
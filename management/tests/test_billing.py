@@ -0,0 +1,102 @@
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+from django.urls import reverse
+from management.billing import run_billing, rollback_billing_run
+from management.models import Apartment, ApartmentBalance, ApartmentBalanceHead, ApartmentUser, BillingRun
+from management.tests.fixtures import create_building
+import datetime
+from decimal import Decimal
+
+
+class TestBillingRun(TestCase):
+    def setUp(self):
+        self.apartments = create_building(apartments=4)
+        self.date = datetime.datetime(2023, 12, 30, 12, tzinfo=datetime.timezone.utc)
+
+    def test_run_creates_one_entry_per_apartment(self):
+        ApartmentBalance.objects.create(apartment=self.apartments[0], date=self.date, title='Wpłata',
+                                        amount=-100, type_of_transaction='BANK')
+        run = run_billing(self.date, 'Grudzień', 'HWCH')
+        self.assertEqual(run.entries.count(), 4)
+        self.assertEqual(run.total, Decimal('1600.00'))
+        self.assertEqual(run.entries.get(apartment=self.apartments[0]).balance, Decimal('300.00'))
+        self.assertEqual(run.entries.get(apartment=self.apartments[1]).balance, Decimal('400.00'))
+
+    def test_run_is_idempotent_per_period_and_title(self):
+        run_billing(self.date, 'Grudzień', 'HWCH')
+        with self.assertRaises(ValidationError):
+            run_billing(self.date.replace(day=2), '  grudzień ', 'HWCH')
+        self.assertEqual(ApartmentBalance.objects.count(), 4)
+
+    def test_rollback_reverses_entries_and_frees_key(self):
+        run = run_billing(self.date, 'Grudzień', 'HWCH')
+        rollback_billing_run(run)
+        for apartment in self.apartments:
+            self.assertEqual(apartment.apartmentbalance_set.latest('id').balance, 0)
+        with self.assertRaises(ValidationError):
+            rollback_billing_run(run)
+        run_billing(self.date, 'Grudzień', 'HWCH')
+        self.assertEqual(BillingRun.objects.filter(rolled_back_at__isnull=True).count(), 1)
+
+    def test_failed_run_leaves_no_entries(self):
+        self.apartments[2].occupancy_set.all().delete()
+        with self.assertRaises(Exception):
+            run_billing(self.date, 'Grudzień', 'HWCH')
+        self.assertFalse(ApartmentBalance.objects.exists())
+        self.assertFalse(BillingRun.objects.exists())
+
+
+class TestApartmentBalanceHead(TestCase):
+    def setUp(self):
+        self.apartment = Apartment.objects.create(number=1, area=50, acc_number=1001)
+        self.date = datetime.datetime(2023, 12, 30, 12, tzinfo=datetime.timezone.utc)
+
+    def test_reading_balance_does_not_write(self):
+        balance = self.apartment.get_latest_balance
+        self.assertEqual(balance.balance, 0)
+        self.assertIsNone(balance.pk)
+        self.assertFalse(ApartmentBalance.objects.exists())
+
+    def test_head_follows_inserts(self):
+        for amount in (100, -30, 5):
+            entry = ApartmentBalance.objects.create(apartment=self.apartment, date=self.date, title='Opłata',
+                                                    amount=amount, type_of_transaction='HWCH')
+        apartment = Apartment.objects.select_related('balance_head__entry').get(pk=self.apartment.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(apartment.get_latest_balance, entry)
+            self.assertEqual(apartment.get_latest_balance.balance, Decimal('75.00'))
+
+    def test_bulk_post_moves_head(self):
+        ApartmentBalance.objects.create(apartment=self.apartment, date=self.date, title='Opłata',
+                                        amount=10, type_of_transaction='HWCH')
+        entries = ApartmentBalance.objects.bulk_post([
+            ApartmentBalance(apartment=self.apartment, date=self.date, title='Wpłata', amount=-4,
+                             type_of_transaction='BANK'),
+            ApartmentBalance(apartment=self.apartment, date=self.date, title='Wpłata', amount=-1,
+                             type_of_transaction='BANK'),
+        ])
+        head = ApartmentBalanceHead.objects.get(apartment=self.apartment)
+        self.assertEqual(head.entry_id, entries[-1].pk)
+        self.assertEqual(head.balance, Decimal('5.00'))
+
+    def test_saved_entries_are_final(self):
+        entry = ApartmentBalance.objects.create(apartment=self.apartment, date=self.date, title='Opłata',
+                                                amount=10, type_of_transaction='HWCH')
+        entry.amount = 20
+        with self.assertRaises(ValidationError):
+            entry.save()
+        with self.assertRaises(ValidationError):
+            entry.delete()
+        self.assertEqual(ApartmentBalanceHead.objects.get(apartment=self.apartment).balance, 10)
+
+    def test_admin_is_read_only(self):
+        entry = ApartmentBalance.objects.create(apartment=self.apartment, date=self.date, title='Opłata',
+                                                amount=10, type_of_transaction='HWCH')
+        self.client.force_login(ApartmentUser.objects.create_superuser('admin', 'admin@example.com', 'x'))
+        url = reverse('admin:management_apartmentbalance_change', args=[entry.pk])
+        self.client.post(url, {'apartment': self.apartment.pk, 'date_0': '2023-12-30', 'date_1': '12:00:00',
+                               'title': 'Opłata', 'amount': 20, 'type_of_transaction': 'HWCH'})
+        self.assertEqual(self.client.get(reverse('admin:management_apartmentbalance_delete',
+                                                 args=[entry.pk])).status_code, 403)
+        entry.refresh_from_db()
+        self.assertEqual(entry.amount, 10)
@@ -0,0 +1,88 @@
+import statistics
+import threading
+import time
+from io import BytesIO
+
+from django.db import connection
+from django.test import Client, TransactionTestCase
+from django.urls import reverse
+from management.billing import run_billing
+from management.models import Apartment, ApartmentBalance, ApartmentUser
+from management.synthetic import SyntheticAssociation
+from management.utils import import_water_readouts
+import datetime
+
+
+class TestConcurrentWrites(TransactionTestCase):
+    """Billing, a readout import and single payments run in parallel with tenants and staff reading pages.
+    Needs the on-disk WAL test database, an in-memory one serializes everything behind table locks."""
+    readers = 3
+
+    def setUp(self):
+        association = SyntheticAssociation(apartments=20, years=1)
+        association.create()
+        self.workbook = BytesIO()
+        association.write_readouts_xlsx(self.workbook)
+        self.workbook.seek(0)
+        self.user = ApartmentUser.objects.create_superuser('admin', 'admin@example.com', 'x')
+        self.errors = []
+        self.latencies = []
+
+    def thread(self, func):
+        def run():
+            try:
+                func()
+            except Exception as e:
+                self.errors.append(e)
+            finally:
+                connection.close()
+        return threading.Thread(target=run)
+
+    def read(self, done):
+        client = Client()
+        client.force_login(self.user)
+        while True:
+            for url_name in ('admin-summary', 'apartment-balance'):
+                start = time.perf_counter()
+                response = client.get(reverse(url_name))
+                self.latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    self.errors.append(f"{url_name}: {response.status_code}")
+            # at least one pass, the writers may finish before a reader gets going
+            if done.is_set():
+                break
+
+    def pay(self):
+        for apartment in Apartment.objects.all():
+            ApartmentBalance.objects.create(apartment=apartment, title='Wpłata', amount=-100,
+                                            date=datetime.datetime(2024, 1, 10, tzinfo=datetime.timezone.utc),
+                                            type_of_transaction='BANK')
+
+    def test_no_lock_errors(self):
+        self.assertEqual(connection.vendor, 'sqlite')
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+
+        done = threading.Event()
+        readers = [self.thread(lambda: self.read(done)) for _ in range(self.readers)]
+        writers = [self.thread(lambda: run_billing(datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc),
+                                                   'Opłaty 01.2024', 'HWCH')),
+                   self.thread(lambda: import_water_readouts(self.workbook)),
+                   self.thread(self.pay)]
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        done.set()
+        for thread in readers:
+            thread.join()
+
+        self.assertEqual(self.errors, [])
+        self.assertEqual(ApartmentBalance.objects.filter(billing_run__isnull=False).count(), 20)
+        self.assertEqual(ApartmentBalance.objects.filter(title='Wpłata', date__year=2024).count(), 20)
+        for apartment in Apartment.objects.all():
+            self.assertEqual(apartment.get_latest_balance,
+                             ApartmentBalance.objects.filter(apartment=apartment).latest('id'))
+        self.assertTrue(self.latencies)
+        self.assertLess(max(self.latencies), 2, f"median {statistics.median(self.latencies):.3f}s")
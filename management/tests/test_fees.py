@@ -0,0 +1,213 @@
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.test import TestCase
+from django.urls import reverse
+from unittest import mock
+from management.models import Apartment, ApartmentUser, WaterReadouts, Fees, Occupancy, ParkingCard, \
+    BigFamilyCard, CentralHeatingSurcharge, MonthlyStatement
+from management.consumption import building_consumption
+from management.effective_dated import EffectiveDatedIndex
+from management.statements import apartment_breakdown, latest_breakdowns, refresh_monthly_statements, \
+    yearly_statement
+from management.utils import calculate_fees, calculate_fees_bulk, calculate_water_usage
+import datetime
+import importlib
+from decimal import Decimal
+
+
+class FeeInputsMixin:
+    def setUp(self):
+        Fees.objects.create(period=datetime.date(2023, 1, 1), maintenance_fee=2, repair_fund=1, central_heating=3,
+                            cold_water=10, hot_water=20, garbage=30, parking_fee=15)
+        Fees.objects.create(period=datetime.date(2023, 6, 1), maintenance_fee=Decimal('2.5'), repair_fund=1,
+                            central_heating=3, cold_water=11, hot_water=22, garbage=33, parking_fee=15)
+        for number in range(1, 6):
+            apartment = Apartment.objects.create(number=number, area=40 + number, acc_number=number)
+            Occupancy.objects.create(apartment=apartment, start_date=datetime.date(2023, 1, 1), occupants=2)
+            for month in range(1, 13):
+                WaterReadouts.objects.create(apartment=apartment,
+                                             readout_date=datetime.date(2023, month, 28),
+                                             cold_water_readout=month * number,
+                                             hot_water_readout=month * 2,
+                                             new_cold_water_meter=number == 2 and month == 12,
+                                             new_hot_water_meter=False)
+        apartment = Apartment.objects.get(number=3)
+        Occupancy.objects.create(apartment=apartment, start_date=datetime.date(2023, 11, 1), occupants=4)
+        ParkingCard.objects.create(apartment=apartment, start_date=datetime.date(2023, 1, 1), number_of_cards=1)
+        ParkingCard.objects.create(apartment=apartment, start_date=datetime.date(2023, 10, 1), number_of_cards=2)
+        BigFamilyCard.objects.create(apartment=apartment, start_date=datetime.date(2023, 2, 1), amount=10)
+        CentralHeatingSurcharge.objects.create(apartment=apartment, start_date=datetime.date(2023, 10, 1),
+                                               end_date=datetime.date(2024, 3, 1), amount=120)
+
+
+class TestCalculateFeesBulk(FeeInputsMixin, TestCase):
+
+    def test_bulk_matches_single(self):
+        apartments = list(Apartment.objects.all())
+        bulk = calculate_fees_bulk(apartments)
+        for apartment in apartments:
+            self.assertEqual(bulk[apartment.pk], calculate_fees(apartment))
+
+    def test_bulk_as_of_matches_readout(self):
+        apartments = list(Apartment.objects.all())
+        as_of = datetime.date(2023, 5, 30)
+        bulk = calculate_fees_bulk(apartments, as_of)
+        for apartment in apartments:
+            readout = apartment.waterreadouts_set.get(readout_date=datetime.date(2023, 5, 28))
+            self.assertEqual(bulk[apartment.pk], calculate_fees(apartment, readout.id))
+
+    def test_bulk_query_count_is_constant(self):
+        apartments = list(Apartment.objects.all())
+        with self.assertNumQueries(6):
+            calculate_fees_bulk(apartments)
+
+    def test_bulk_skips_incomplete_apartments(self):
+        empty = Apartment.objects.create(number=99, area=30, acc_number=99)
+        with self.assertRaises(IndexError):
+            calculate_fees_bulk([empty])
+        self.assertEqual(calculate_fees_bulk([empty], strict=False), {})
+
+
+class TestYearlyStatement(FeeInputsMixin, TestCase):
+
+    def test_statement_matches_calculate_fees(self):
+        for apartment in Apartment.objects.all():
+            expected = [calculate_fees(apartment, readout.id)
+                        for readout in apartment.waterreadouts_set.filter(readout_date__month__gte=3,
+                                                                          readout_date__month__lte=11)]
+            self.assertEqual(yearly_statement(apartment, 2023, 3, 11), expected)
+
+    def test_statement_skips_first_readout(self):
+        apartment = Apartment.objects.get(number=1)
+        statement = yearly_statement(apartment, 2023)
+        self.assertEqual([row['readout_date'].month for row in statement], list(range(2, 13)))
+
+    def test_statement_query_count(self):
+        apartment = Apartment.objects.get(number=3)
+        with self.assertNumQueries(1):
+            yearly_statement(apartment, 2023)
+
+
+class TestMonthlyStatement(FeeInputsMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.apartment = Apartment.objects.get(number=3)
+
+    def assertStatementsCurrent(self):
+        for apartment in Apartment.objects.all():
+            readouts = apartment.waterreadouts_set.order_by('readout_date')[1:]
+            self.assertEqual(yearly_statement(apartment, 2023), [calculate_fees(apartment, readout.id)
+                                                                 for readout in readouts])
+
+    def test_rows_follow_input_changes(self):
+        self.assertStatementsCurrent()
+        readout = self.apartment.waterreadouts_set.get(readout_date=datetime.date(2023, 7, 28))
+        readout.cold_water_readout += 5
+        readout.save()
+        Occupancy.objects.filter(apartment=self.apartment, start_date=datetime.date(2023, 11, 1)).get().delete()
+        BigFamilyCard.objects.create(apartment=self.apartment, start_date=datetime.date(2023, 5, 1), amount=20)
+        fees = Fees.objects.latest('period')
+        fees.period = datetime.date(2023, 4, 1)
+        fees.save()
+        self.assertStatementsCurrent()
+        self.apartment.area = 70
+        self.apartment.save()
+        self.apartment.waterreadouts_set.get(readout_date=datetime.date(2023, 9, 28)).delete()
+        self.assertStatementsCurrent()
+
+    def test_moved_record_refreshes_old_date(self):
+        card = ParkingCard.objects.get(apartment=self.apartment, start_date=datetime.date(2023, 10, 1))
+        card.start_date = datetime.date(2023, 12, 1)
+        card.save()
+        self.assertStatementsCurrent()
+
+    def test_rebuild(self):
+        MonthlyStatement.objects.all().delete()
+        self.assertEqual(refresh_monthly_statements(), 5 * 11)
+        self.assertStatementsCurrent()
+
+    def test_migration_backfills_existing_readouts(self):
+        migration = importlib.import_module('management.migrations.0008_backfill_monthly_statements')
+        state = MigrationLoader(connection).project_state(('management', '0008_backfill_monthly_statements'))
+        MonthlyStatement.objects.all().delete()
+        migration.backfill_monthly_statements(state.apps, None)
+        self.assertStatementsCurrent()
+
+    def test_only_affected_rows_are_rewritten(self):
+        before = dict(MonthlyStatement.objects.values_list('readout_id', 'computed_at'))
+        Occupancy.objects.create(apartment=self.apartment, start_date=datetime.date(2023, 8, 1), occupants=3)
+        after = dict(MonthlyStatement.objects.values_list('readout_id', 'computed_at'))
+        changed = set(MonthlyStatement.objects.filter(readout_id__in=[
+            readout_id for readout_id in after if before.get(readout_id) != after[readout_id]]).values_list(
+            'apartment__number', 'readout_date__month'))
+        self.assertEqual(changed, {(3, month) for month in range(8, 13)})
+
+    def test_latest_breakdowns(self):
+        apartments = list(Apartment.objects.all())
+        expected = calculate_fees_bulk(apartments)
+        with self.assertNumQueries(1):
+            self.assertEqual(latest_breakdowns(apartments), expected)
+
+
+class TestApartmentBreakdown(FeeInputsMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.apartment = Apartment.objects.get(number=3)
+
+    def test_without_statement_row_is_calculated(self):
+        readout = self.apartment.waterreadouts_set.get(readout_date=datetime.date(2023, 5, 28))
+        MonthlyStatement.objects.filter(readout=readout).delete()
+        self.assertEqual(apartment_breakdown(self.apartment, readout.id), calculate_fees(self.apartment, readout.id))
+
+    def test_single_payment_computes_once_per_request(self):
+        self.client.force_login(ApartmentUser.objects.create_superuser('admin', 'admin@example.com', 'x'))
+        with mock.patch('management.views.apartment_breakdown', wraps=apartment_breakdown) as calculate:
+            response = self.client.get(reverse('calculate-single-payment', args=[3]))
+        self.assertEqual(calculate.call_count, 1)
+        self.assertEqual(response.context['fees'], calculate_fees(self.apartment))
+
+
+class TestWaterUsage(FeeInputsMixin, TestCase):
+
+    def test_building_consumption_matches_calculate_water_usage(self):
+        with self.assertNumQueries(1):
+            usage = building_consumption()
+        self.assertEqual(len(usage), 5 * 11)
+        for row in usage:
+            readouts = WaterReadouts.objects.filter(apartment=row.apartment_id,
+                                                    readout_date__lte=row.readout_date).order_by('-readout_date')
+            self.assertEqual((row.cold, row.hot, row.cold_curr, row.hot_curr), calculate_water_usage(readouts))
+
+    def test_new_meter(self):
+        readouts = WaterReadouts.objects.filter(apartment__number=2).order_by('-readout_date')
+        with self.assertNumQueries(1):
+            cold, hot, cold_curr, hot_curr = calculate_water_usage(readouts)
+        self.assertEqual((cold, hot, cold_curr), (12 * 2 + 2, 2, 24))
+
+
+class TestEffectiveDatedIndex(TestCase):
+    def test_as_of(self):
+        rows = [{'apartment_id': 1, 'start_date': datetime.date(2023, month, 1), 'value': month}
+                for month in (6, 1, 3)]
+        index = EffectiveDatedIndex(rows)
+        self.assertIsNone(index.as_of(datetime.date(2022, 12, 31), 1))
+        self.assertEqual(index.as_of(datetime.date(2023, 1, 1), 1)['value'], 1)
+        self.assertEqual(index.as_of(datetime.date(2023, 5, 31), 1)['value'], 3)
+        self.assertEqual(index.as_of(datetime.date(2030, 1, 1), 1)['value'], 6)
+        self.assertIsNone(index.as_of(datetime.date(2030, 1, 1), 2))
+
+    def test_as_of_with_end_date(self):
+        rows = [{'apartment_id': 1, 'start_date': datetime.date(2023, 1, 1), 'end_date': datetime.date(2023, 12, 31)},
+                {'apartment_id': 1, 'start_date': datetime.date(2023, 3, 1), 'end_date': datetime.date(2023, 4, 30)}]
+        index = EffectiveDatedIndex(rows, end_field='end_date')
+        self.assertEqual(index.as_of(datetime.date(2023, 4, 1), 1), rows[1])
+        self.assertEqual(index.as_of(datetime.date(2023, 6, 1), 1), rows[0])
+        self.assertIsNone(index.as_of(datetime.date(2024, 1, 1), 1))
+
+    def test_from_queryset_single_query(self):
+        Fees.objects.create(period=datetime.date(2023, 1, 1), maintenance_fee=2, repair_fund=1, central_heating=3,
+                            cold_water=10, hot_water=20, garbage=30, parking_fee=15)
+        with self.assertNumQueries(1):
+            index = EffectiveDatedIndex.from_queryset(Fees.objects.values(), 'period', key_field=None)
+        with self.assertNumQueries(0):
+            self.assertEqual(index.as_of(datetime.date(2023, 7, 1))['cold_water'], 10)
@@ -1,8 +1,11 @@
+from django.core.exceptions import ValidationError
 from django.test import TestCase, Client
 from management.models import WaterReadouts, Apartment
-from management.utils import import_water_readouts, calculate_water_usage
+from management.synthetic import SyntheticAssociation
+from management.utils import import_water_readouts, calculate_water_usage, preview_water_readouts
 import datetime
-from openpyxl import load_workbook
+import os
+import tempfile
 
 
 class TestWaterReadouts(TestCase):
@@ -20,36 +23,115 @@ class TestWaterReadouts(TestCase):
         self.assertIsInstance(self.water_readouts, WaterReadouts)
 
 
-class TestImportFromXlsx(TestCase):
+class GeneratedWorkbookMixin:
+    """Imports the year after the saved history of a 40 apartment synthetic association from an xlsx file."""
+
     def setUp(self):
-        self.file = 'test_files/water_22.xlsx'
+        self.association = SyntheticAssociation(apartments=40, years=1)
         for number in range(1, 41):
             Apartment.objects.create(number=number, area=53, acc_number=123456)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.file = os.path.join(self.directory.name, 'water_readouts.xlsx')
+        self.association.write_readouts_xlsx(self.file)
+        self.readings = {number: [row for row in rows if row[0].year == self.association.end_year + 1]
+                         for number, rows in self.association.readings().items()}
+
+
+class TestImportFromXlsx(GeneratedWorkbookMixin, TestCase):
 
     def test_import_from_xlsx(self):
-        print(WaterReadouts.objects.count())
-        import_water_readouts(self.file)
-        print(WaterReadouts.objects.count())
-        print(WaterReadouts.objects.filter(apartment__number=40).latest('readout_date').hot_water_readout)
+        self.assertEqual(import_water_readouts(self.file), (40 * 12, 0))
+        self.assertEqual(WaterReadouts.objects.count(), 40 * 12)
+        latest = WaterReadouts.objects.filter(apartment__number=40).latest('readout_date')
+        date, cold, hot, new_cold, new_hot = self.readings[40][-1]
+        self.assertEqual((latest.readout_date, latest.cold_water_readout, latest.hot_water_readout), (date, cold, hot))
 
 
-class TestNewWaterMeters(TestCase):
-    def setUp(self):
-        self.file = 'test_files/water_readouts.xlsx'
-        for number in range(1, 41):
-            Apartment.objects.create(number=number, area=53, acc_number=123456)
+class TestNewWaterMeters(GeneratedWorkbookMixin, TestCase):
 
     def test_new_water_meter(self):
         import_water_readouts(self.file)
         water_usage = WaterReadouts.objects.filter(apartment__number=15).order_by('-readout_date')
-        hot, cold, x, y = calculate_water_usage(water_usage)
-        print(f'Hot water: {hot}, Cold water: {cold}')
-        WaterReadouts.objects.create(readout_date=datetime.date.today(),
+        (_, cold_previous, hot_previous, *_), (_, cold_last, hot_last, *_) = self.readings[15][-2:]
+        self.assertEqual(calculate_water_usage(water_usage),
+                         (cold_last - cold_previous, hot_last - hot_previous, cold_last, hot_last))
+
+        WaterReadouts.objects.create(readout_date=datetime.date(self.association.end_year + 2, 1, 28),
                                      apartment=Apartment.objects.get(number=15),
-                                     new_cold_water_meter=False,
+                                     new_cold_water_meter=True,
                                      new_hot_water_meter=False,
-                                     hot_water_readout=1,
+                                     hot_water_readout=hot_last + 1,
                                      cold_water_readout=2)
+        self.assertEqual(calculate_water_usage(water_usage), (2 + cold_last - cold_previous, 1, 2, hot_last + 1))
+
+
+def build_readouts_workbook(apartments, dates, reading=lambda apt, value: (apt * 10 + value, apt + value)):
+    """Builds an import sheet in memory: dates in the first row, cold/hot pairs per apartment below."""
+    from openpyxl import Workbook
+    from io import BytesIO
+    wb = Workbook()
+    sheet = wb.active
+    header = [None]
+    for date in dates:
+        header += [datetime.datetime.combine(date, datetime.time()), None]
+    sheet.append(header)
+    for apt in apartments:
+        row = [apt]
+        for value, date in enumerate(dates):
+            row += list(reading(apt, value))
+        sheet.append(row)
+    file = BytesIO()
+    wb.save(file)
+    file.seek(0)
+    return file
+
+
+class TestBulkImport(TestCase):
+    def setUp(self):
+        for number in range(1, 6):
+            Apartment.objects.create(number=number, area=53, acc_number=123456)
+        self.dates = [datetime.date(2023, month, 28) for month in range(1, 13)]
+
+    def test_import_creates_readouts(self):
+        created, updated = import_water_readouts(build_readouts_workbook(range(1, 6), self.dates))
+        self.assertEqual((created, updated), (60, 0))
+        readout = WaterReadouts.objects.get(apartment__number=3, readout_date=datetime.date(2023, 2, 28))
+        self.assertEqual(readout.get_water_readout, (31, 4))
+
+    def test_reimport_updates_instead_of_duplicating(self):
+        import_water_readouts(build_readouts_workbook(range(1, 6), self.dates))
+        created, updated = import_water_readouts(build_readouts_workbook(
+            range(1, 6), self.dates, reading=lambda apt, value: (apt * 100 + value, 1)))
+        self.assertEqual((created, updated), (0, 60))
+        self.assertEqual(WaterReadouts.objects.count(), 60)
+        self.assertEqual(WaterReadouts.objects.get(apartment__number=2, readout_date=self.dates[0])
+                         .cold_water_readout, 200)
+
+    def test_unknown_apartment_rolls_back(self):
+        with self.assertRaises(ValidationError):
+            import_water_readouts(build_readouts_workbook([1, 2, 77], self.dates))
+        self.assertFalse(WaterReadouts.objects.exists())
+
+
+class TestImportPreview(TestCase):
+    def setUp(self):
+        for number in range(1, 4):
+            apartment = Apartment.objects.create(number=number, area=53, acc_number=123456)
+            WaterReadouts.objects.create(apartment=apartment, readout_date=datetime.date(2022, 12, 28),
+                                         cold_water_readout=10, hot_water_readout=5)
+        self.dates = [datetime.date(2023, 1, 28), datetime.date(2023, 2, 28)]
 
-        cold, hot, x, y = calculate_water_usage(water_usage)
-        print(f'Hot water: {hot}, Cold water: {cold}')
+    def test_preview_reports_usage_and_anomalies_without_writing(self):
+        WaterReadouts.objects.create(apartment=Apartment.objects.get(number=2), readout_date=self.dates[0],
+                                     cold_water_readout=1, hot_water_readout=1)
+        file = build_readouts_workbook([1, 2, 3, 42], self.dates,
+                                       reading=lambda apt, value: (12 + value, 4 if apt == 3 else 6 + value))
+        with self.assertNumQueries(3):
+            preview = {apartment['number']: apartment for apartment in preview_water_readouts(file)}
+        self.assertEqual(WaterReadouts.objects.count(), 4)
+        self.assertEqual(preview[1]['anomalies'], [])
+        self.assertEqual([(row['cold_used'], row['hot_used']) for row in preview[1]['rows']], [(2, 1), (1, 1)])
+        self.assertEqual(len(preview[2]['anomalies']), 1)
+        self.assertIn("niższy", preview[3]['anomalies'][0])
+        self.assertFalse(preview[42]['known'])
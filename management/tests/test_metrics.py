@@ -0,0 +1,100 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from management.metrics import query_budget, record_queries, reset_metrics, view_metrics
+from management.models import Apartment, ApartmentBalance, ApartmentUser
+from management.tests.test_fees import FeeInputsMixin
+import datetime
+
+# Arguments of the budgeted views whose URLs need them
+URL_ARGS = {
+    'calculate-single-payment': [3],
+}
+
+
+class QueryBudgetMixin:
+    """Fails when a view issues more queries than QUERY_BUDGETS allows it,
+    either with cold caches or with the caches warmed by a previous request."""
+
+    def assertWithinBudget(self, url_name, *args, data=None):
+        budget = query_budget(url_name)
+        self.assertIsNotNone(budget, f"{url_name} has no query budget")
+        url = reverse(url_name, args=args)
+        cache.clear()
+        for state in ('cold', 'warm'):
+            with record_queries() as recorder:
+                response = self.client.get(url, data)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(recorder.count, budget, f"{url_name} ran {recorder.count} queries with {state} "
+                                                         f"caches, budget {budget}: repeated {recorder.duplicates()}")
+
+
+class TestQueryBudgets(QueryBudgetMixin, FeeInputsMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+        self.client.force_login(ApartmentUser.objects.create_superuser(
+            'admin', 'admin@example.com', 'x', apartment=Apartment.objects.get(number=3)))
+
+    def test_views_within_budget(self):
+        for url_name in settings.QUERY_BUDGETS:
+            with self.subTest(url_name):
+                self.assertWithinBudget(url_name, *URL_ARGS.get(url_name, []))
+
+    def test_filtered_views_within_budget(self):
+        for url_name in ('admin-water-readouts', 'parking-card', 'big-family-card', 'occupancy',
+                         'central-heating-surcharge'):
+            with self.subTest(url_name):
+                self.assertWithinBudget(url_name, data={'apartment': 3, 'year': 2023})
+
+    def test_ledger_within_budget(self):
+        for apartment in Apartment.objects.all():
+            for day in range(1, 4):
+                ApartmentBalance.objects.create(apartment=apartment, title='Wpłata', amount=100,
+                                                date=datetime.datetime(2023, 12, day, tzinfo=datetime.timezone.utc),
+                                                type_of_transaction='BANK')
+        for data in ({}, {'apartment': 3}, {'start_date': '2023-01-01', 'end_date': '2023-12-31'}):
+            with self.subTest(**data):
+                self.assertWithinBudget('apartment-balance', data=data)
+
+
+class TestQueryMetrics(FeeInputsMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_metrics()
+        super().setUp()
+        self.client.force_login(ApartmentUser.objects.create_superuser('admin', 'admin@example.com', 'x'))
+
+    def test_requests_are_recorded_per_url_name(self):
+        self.client.get(reverse('parking-card'))
+        self.client.get(reverse('parking-card'), {'apartment': 3})
+        metrics = {row.url_name: row for row in view_metrics()}
+        self.assertEqual(metrics['parking-card'].requests, 2)
+        self.assertGreater(metrics['parking-card'].queries, 0)
+        self.assertIsNotNone(metrics['parking-card'].slowest)
+        self.assertEqual(metrics['parking-card'].budget, settings.QUERY_BUDGETS['parking-card'])
+
+    def test_duplicates(self):
+        with record_queries() as recorder:
+            for apartment in Apartment.objects.all():
+                apartment.occupancy_set.first()
+        duplicates = recorder.duplicates()
+        self.assertEqual(len(duplicates), 1)
+        self.assertIn('management_occupancy', duplicates[0][0])
+        self.assertEqual(duplicates[0][1], 5)
+
+    @override_settings(QUERY_BUDGETS={'parking-card': 1})
+    def test_over_budget_is_logged(self):
+        with self.assertLogs('management.metrics', 'WARNING') as logs:
+            self.client.get(reverse('parking-card'))
+        self.assertIn('parking-card', logs.output[0])
+
+    def test_metrics_page(self):
+        self.client.get(reverse('admin-summary'))
+        response = self.client.get(reverse('query-metrics'))
+        self.assertContains(response, 'admin-summary')
+
+    def test_metrics_page_is_staff_only(self):
+        self.client.force_login(ApartmentUser.objects.create_user('tenant', 'tenant@example.com', 'x'))
+        self.assertEqual(self.client.get(reverse('query-metrics')).status_code, 403)
@@ -0,0 +1,45 @@
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+import datetime
+
+BEFORE = [('management', '0004_monthly_statement')]
+AFTER = [('management', '0005_lookup_indexes')]
+
+
+class TestLookupConstraintsMigration(TransactionTestCase):
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(BEFORE)
+        self.apps = executor.loader.project_state(BEFORE).apps
+        self.apartment = self.apps.get_model('management', 'Apartment').objects.create(number=1, area=50,
+                                                                                        acc_number=1)
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def migrate(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(AFTER)
+
+    def create_readout(self, cold_water):
+        return self.apps.get_model('management', 'WaterReadouts').objects.create(
+            apartment=self.apartment, readout_date=datetime.date(2023, 3, 28), cold_water_readout=cold_water,
+            hot_water_readout=5)
+
+    def test_identical_duplicates_are_removed(self):
+        first = self.create_readout(10)
+        self.create_readout(10)
+        self.migrate()
+        self.assertEqual(list(self.apps.get_model('management', 'WaterReadouts').objects.values_list('pk', flat=True)),
+                         [first.pk])
+
+    def test_conflicting_duplicates_stop_the_migration(self):
+        first = self.create_readout(10)
+        second = self.create_readout(11)
+        with self.assertRaisesMessage(RuntimeError, f"WaterReadouts id {first.pk}, {second.pk}"):
+            self.migrate()
+        second.delete()
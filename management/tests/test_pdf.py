@@ -0,0 +1,133 @@
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from io import StringIO
+from io import BytesIO
+from unittest import mock
+from zipfile import ZipFile
+from django.urls import reverse
+from management.models import Apartment, ApartmentUser, Fees, Occupancy
+from management.pdf import PdfRenderError, render_pdf
+from management.pdf_cache import PdfCache
+from management.tests.fixtures import create_building
+import datetime
+import tempfile
+from pathlib import Path
+
+
+class TempPdfCacheMixin:
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache_dir = directory.name
+        settings_override = override_settings(PDF_CACHE_DIR=self.cache_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        super().setUp()
+
+
+class TestPdfRendering(TempPdfCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        create_building(apartments=2)
+        self.client.force_login(ApartmentUser.objects.create_superuser('admin', 'admin@example.com', 'x'))
+
+    def test_render_pdf_in_memory(self):
+        pdf = render_pdf('summary-template.html', {'data': [], 'apartment': 1})
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        self.assertIn(b'DMSans', pdf)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_pdf', apartment=2, runs=1, stdout=out)
+        self.assertIn('cold: median', out.getvalue())
+        self.assertIn('warm: median', out.getvalue())
+
+    def test_pdf_view(self):
+        response = self.client.get(reverse('generate-pdf'), {'apartment': 2, 'year': 2023})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        pdf = b''.join(response.streaming_content)
+        self.assertEqual(int(response['Content-Length']), len(pdf))
+        self.assertTrue(pdf.startswith(b'%PDF'))
+
+    def test_pdf_view_render_error(self):
+        with mock.patch('management.views.render_pdf', side_effect=PdfRenderError("PDF rendering failed")):
+            response = self.client.get(reverse('generate-pdf'), {'apartment': 2, 'year': 2023}, follow=True)
+        self.assertRedirects(response, f"{reverse('admin-yearly-summary')}?apartment=2&year=2023")
+        self.assertContains(response, "Nie udało się wygenerować pliku PDF")
+        self.assertEqual(list(Path(self.cache_dir).glob('*/*.pdf')), [])
+
+
+class TestBulkPdfExport(TestCase):
+    def setUp(self):
+        create_building(apartments=3)
+        self.client.force_login(ApartmentUser.objects.create_superuser('admin', 'admin@example.com', 'x'))
+
+    def test_zip_contains_every_apartment(self):
+        for workers in (1, 2):
+            with self.settings(PDF_WORKERS=workers):
+                response = self.client.get(reverse('generate-pdf-zip'), {'year': 2023})
+                archive = ZipFile(BytesIO(b''.join(response.streaming_content)))
+            self.assertEqual(sorted(archive.namelist()),
+                             [f"podsumowanie-{number}-2023.pdf" for number in (1, 2, 3)])
+            self.assertTrue(archive.read("podsumowanie-2-2023.pdf").startswith(b'%PDF'))
+
+
+class TestPdfCache(TempPdfCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        create_building(apartments=2)
+        self.client.force_login(ApartmentUser.objects.create_superuser('admin', 'admin@example.com', 'x'))
+
+    def get_pdf(self, **params):
+        with mock.patch('management.views.render_pdf', wraps=render_pdf) as render:
+            response = self.client.get(reverse('generate-pdf'), {'apartment': 1, 'year': 2023, **params})
+            b''.join(response.streaming_content)
+        return render.call_count
+
+    def test_repeat_download_is_served_from_cache(self):
+        self.assertEqual(self.get_pdf(), 1)
+        self.assertEqual(self.get_pdf(), 0)
+        self.assertEqual(self.get_pdf(start_date=3), 1)
+
+    def test_input_changes_invalidate(self):
+        self.get_pdf()
+        Occupancy.objects.create(apartment=Apartment.objects.get(number=1), start_date=datetime.date(2023, 6, 1),
+                                 occupants=3)
+        self.assertEqual(self.get_pdf(), 1)
+        fees = Fees.objects.get()
+        fees.garbage = 31
+        fees.save()
+        self.assertEqual(self.get_pdf(), 1)
+        self.assertEqual(self.get_pdf(), 0)
+
+    def test_fingerprint_follows_edits_without_invalidation(self):
+        self.get_pdf()
+        with mock.patch.object(PdfCache, 'invalidate'):
+            occupancy = Occupancy.objects.get(apartment__number=1)
+            occupancy.occupants += 1
+            occupancy.save()
+            self.assertEqual(self.get_pdf(), 1)
+            fees = Fees.objects.get()
+            fees.hot_water += 1
+            fees.save()
+            self.assertEqual(self.get_pdf(), 1)
+        self.assertEqual(self.get_pdf(), 0)
+
+    def test_invalidation_runs_on_commit(self):
+        self.get_pdf()
+        with self.captureOnCommitCallbacks() as callbacks:
+            Occupancy.objects.create(apartment=Apartment.objects.get(number=1), start_date=datetime.date(2023, 6, 1),
+                                     occupants=3)
+            self.assertTrue(list(Path(self.cache_dir).glob('*/*.pdf')))
+        self.assertTrue(callbacks)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(list(Path(self.cache_dir).glob('*/*.pdf')), [])
+
+    def test_eviction_by_size(self):
+        cache = PdfCache(self.cache_dir, max_size=25)
+        for number in range(4):
+            cache.set('apartment', f'{number}', b'0123456789')
+        self.assertIsNone(cache.get('apartment', '0'))
+        self.assertEqual(cache.get('apartment', '3'), b'0123456789')
@@ -0,0 +1,69 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from management.models import Apartment, ApartmentBalance, ApartmentUser
+from management.tests.test_fees import FeeInputsMixin
+from management.utils import calculate_fees
+import datetime
+import re
+
+# SQLite before 3.36 prints "SCAN TABLE name"
+FULL_SCAN = re.compile(r'SCAN (?:TABLE )?(management_\w+)')
+
+
+class QueryPlanMixin:
+    """Runs EXPLAIN QUERY PLAN on every SELECT issued inside the block and fails on full table scans.
+    Walking a table in primary key order up to a LIMIT, as the paginated ledger does, is allowed."""
+
+    def full_scans(self, queries):
+        scans = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT'):
+                    continue
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                for detail in (row[-1] for row in cursor.fetchall()):
+                    match = FULL_SCAN.fullmatch(detail)
+                    if match and not re.search(rf'ORDER BY "{match[1]}"\."id" (ASC|DESC) LIMIT', sql):
+                        scans.append((detail, sql))
+        return scans
+
+    def assertNoFullScans(self, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            func(*args, **kwargs)
+        self.assertEqual(self.full_scans(context.captured_queries), [])
+
+
+class TestQueryPlans(QueryPlanMixin, FeeInputsMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.apartment = Apartment.objects.get(number=3)
+        user = ApartmentUser.objects.create_superuser('admin', 'admin@example.com', 'x', apartment=self.apartment)
+        self.client.force_login(user)
+
+    def test_calculate_fees(self):
+        readout = self.apartment.waterreadouts_set.get(readout_date=datetime.date(2023, 6, 28))
+        self.assertNoFullScans(calculate_fees, self.apartment)
+        self.assertNoFullScans(calculate_fees, self.apartment, readout.id)
+
+    def test_apartment_balance_save(self):
+        date = datetime.datetime(2023, 12, 30, 12, tzinfo=datetime.timezone.utc)
+        for amount in (100, -40):
+            self.assertNoFullScans(ApartmentBalance.objects.create, apartment=self.apartment, date=date,
+                                   title='Wpłata', amount=amount, type_of_transaction='BANK')
+
+    def test_list_views(self):
+        ApartmentBalance.objects.create(apartment=self.apartment, title='Wpłata', amount=100,
+                                        date=datetime.datetime(2023, 12, 30, 12, tzinfo=datetime.timezone.utc),
+                                        type_of_transaction='BANK')
+        filters = [{}, {'apartment': 3}, {'apartment': 3, 'year': 2023}]
+        for name in ('admin-water-readouts', 'occupancy', 'parking-card', 'big-family-card',
+                     'central-heating-surcharge', 'admin-summary', 'water-readouts', 'fees-history'):
+            for params in filters:
+                with self.subTest(view=name, params=params):
+                    self.assertNoFullScans(self.client.get, reverse(name), params)
+        for params in ({}, {'apartment': 3}, {'start_date': '2023-01-01', 'end_date': '2023-12-31'}):
+            with self.subTest(view='apartment-balance', params=params):
+                self.assertNoFullScans(self.client.get, reverse('apartment-balance'), params)
@@ -0,0 +1,81 @@
+import os
+import re
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connections, router
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from management.models import Apartment, ApartmentBalance, ApartmentUser
+from management.reporting import refresh_reporting_database, reporting_alias, reporting_database
+from management.tests.test_fees import FeeInputsMixin
+import datetime
+
+
+class TestReportingDatabase(FeeInputsMixin, TransactionTestCase):
+    """The reporting alias is a test mirror of the primary, these tests point it at a separate copy."""
+    databases = {'default', 'reporting'}
+
+    def setUp(self):
+        super().setUp()
+        self.replica = connections['reporting']
+        self.mirror_name = self.replica.settings_dict['NAME']
+        self.directory = tempfile.TemporaryDirectory()
+        self.replica.close()
+        self.replica.settings_dict['NAME'] = os.path.join(self.directory.name, 'reporting.sqlite3')
+        self.apartment = Apartment.objects.get(number=3)
+        self.client.force_login(ApartmentUser.objects.create_superuser('admin', 'admin@example.com', 'x'))
+        call_command('refresh_reporting_db', stdout=StringIO())
+
+    def tearDown(self):
+        self.replica.close()
+        self.replica.settings_dict['NAME'] = self.mirror_name
+        self.directory.cleanup()
+        super().tearDown()
+
+    def add_payment(self, title):
+        return ApartmentBalance.objects.create(apartment=self.apartment, title=title, amount=-100,
+                                               date=datetime.datetime(2023, 12, 1, tzinfo=datetime.timezone.utc),
+                                               type_of_transaction='BANK')
+
+    def test_reporting_views_read_the_copy(self):
+        self.assertEqual(reporting_alias(), 'reporting')
+        urls = [reverse('admin-yearly-summary') + '?apartment=3&year=2023', reverse('apartment-balance'),
+                reverse('association-balance'), reverse('generate-pdf-zip') + '?year=2023']
+        for url in urls:
+            with self.subTest(url):
+                with CaptureQueriesContext(connections['default']) as primary, \
+                        CaptureQueriesContext(connections['reporting']) as replica:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(replica.captured_queries)
+                self.assertEqual(set(re.findall(r'FROM "(\w+)"', ' '.join(
+                    query['sql'] for query in primary.captured_queries))), {'django_session', 'management_apartmentuser'})
+
+    def test_copy_is_stale_until_refreshed(self):
+        self.add_payment('Wpłata po kopii')
+        self.assertNotContains(self.client.get(reverse('apartment-balance')), 'Wpłata po kopii')
+        refresh_reporting_database()
+        self.assertContains(self.client.get(reverse('apartment-balance')), 'Wpłata po kopii')
+
+    def test_client_reads_own_writes(self):
+        response = self.client.post(reverse('add-payment', args=[3]), {
+            'apartment': self.apartment.pk, 'date': '2023-12-01 12:00', 'type_of_transaction': 'BANK',
+            'title': 'Moja wpłata', 'amount': '-50'})
+        self.assertEqual(response.status_code, 302)
+        self.assertContains(self.client.get(reverse('apartment-balance')), 'Moja wpłata')
+
+    def test_writes_go_to_primary(self):
+        with reporting_database():
+            self.assertEqual(router.db_for_read(ApartmentBalance), 'reporting')
+            entry = self.add_payment('Zapis w raporcie')
+        self.assertEqual(router.db_for_read(ApartmentBalance), 'default')
+        self.assertEqual(entry._state.db, 'default')
+        self.assertTrue(ApartmentBalance.objects.using('default').filter(pk=entry.pk).exists())
+        self.assertEqual(self.apartment.get_latest_balance, entry)
+
+    def test_mirror_reads_primary(self):
+        self.replica.settings_dict['NAME'] = self.mirror_name
+        self.assertEqual(reporting_alias(), 'default')
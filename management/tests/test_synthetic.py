@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Sum
+from django.test import TestCase
+from management.benchmarks import run_benchmarks
+from management.models import Apartment, ApartmentBalance, WaterReadouts
+from management.statements import yearly_statement
+from management.synthetic import SyntheticAssociation
+from management.utils import calculate_fees, import_water_readouts
+
+
+class TestSyntheticAssociation(TestCase):
+    def setUp(self):
+        self.association = SyntheticAssociation(apartments=4, years=1, start_year=2023, replacement_rate=0.2)
+        self.counts = self.association.create()
+
+    def test_statements_match_calculate_fees(self):
+        self.assertEqual(self.counts['WaterReadouts'], 4 * 12)
+        self.assertTrue(WaterReadouts.objects.filter(new_cold_water_meter=True).exists())
+        for apartment in Apartment.objects.all():
+            readouts = apartment.waterreadouts_set.order_by('readout_date')[1:]
+            self.assertEqual(yearly_statement(apartment, 2023),
+                             [calculate_fees(apartment, readout.id) for readout in readouts])
+
+    def test_ledger_heads_match_entries(self):
+        for apartment in Apartment.objects.all():
+            total = ApartmentBalance.objects.filter(apartment=apartment).aggregate(total=Sum('amount'))['total']
+            self.assertEqual(apartment.get_latest_balance.balance, total)
+
+    def test_same_seed_same_data(self):
+        self.assertEqual(SyntheticAssociation(apartments=4, years=1, start_year=2023,
+                                              replacement_rate=0.2).readings(), self.association.readings())
+
+    def test_xlsx_imports_next_year(self):
+        file = BytesIO()
+        self.association.write_readouts_xlsx(file)
+        file.seek(0)
+        self.assertEqual(import_water_readouts(file), (4 * 12, 0))
+        apartment = Apartment.objects.get(number=2)
+        self.assertEqual(len(yearly_statement(apartment, 2024)), 12)
+
+
+class TestGenerateAssociationCommand(TestCase):
+    def test_generate(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'odczyty.xlsx')
+            call_command('generate_association', apartments=3, years=1, xlsx=path, stdout=StringIO())
+            self.assertTrue(os.path.getsize(path))
+        self.assertEqual(Apartment.objects.count(), 3)
+        with self.assertRaises(CommandError):
+            call_command('generate_association', apartments=3, years=1, stdout=StringIO())
+
+
+class TestBenchmarks(TestCase):
+    def test_report(self):
+        report = json.loads(json.dumps(run_benchmarks(scales=[3], years=1, runs=1)))
+        results = report['scales'][0]['results']
+        self.assertEqual(set(results), {'calculate_fees', 'calculate_payments', 'admin_summary',
+                                        'admin_yearly_summary', 'import_water_readouts', 'pdf'})
+        self.assertEqual(results['admin_summary']['runs'], 1)
+        self.assertFalse(Apartment.objects.exists())
+
+    def test_every_import_run_creates_the_readouts(self):
+        imports = []
+
+        def record(file):
+            imports.append(import_water_readouts(file))
+            return imports[-1]
+        with mock.patch('management.benchmarks.import_water_readouts', side_effect=record):
+            run_benchmarks(scales=[3], years=1, runs=2, benchmarks=['import_water_readouts'])
+        self.assertEqual(len(imports), 3)
+        self.assertEqual(len(set(imports)), 1)
+        self.assertEqual(imports[0][1], 0)
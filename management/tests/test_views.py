@@ -0,0 +1,95 @@
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from management.forms import AdminSelectApartmentYearForm, ApartmentBalanceHistoryForm
+from management.models import Apartment, ApartmentBalance, ApartmentUser, WaterReadouts
+from management.tests.fixtures import create_building
+import datetime
+import time
+
+
+class TestAdminSummaryView(TestCase):
+    def setUp(self):
+        self.apartments = create_building(apartments=6)
+        date = datetime.datetime(2023, 12, 30, 12, tzinfo=datetime.timezone.utc)
+        for amount, apartment in zip((50, -20, 300, 0), self.apartments):
+            ApartmentBalance.objects.create(apartment=apartment, date=date, title='Opłata', amount=amount,
+                                            type_of_transaction='HWCH')
+        self.client.force_login(ApartmentUser.objects.create_superuser('admin', 'admin@example.com', 'x'))
+
+    def test_query_count_does_not_grow_with_apartments(self):
+        self.client.get(reverse('admin-summary'))
+        with self.assertNumQueries(5):
+            self.client.get(reverse('admin-summary'))
+        extra = [Apartment.objects.create(number=number, area=40, acc_number=number)
+                                 for number in range(10, 20)]
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('admin-summary'))
+        self.assertEqual(len(response.context['object_list']), 6 + len(extra))
+
+    def test_only_not_paid_sorted_by_debt(self):
+        response = self.client.get(reverse('admin-summary'), {'only_not_paid': 'on', 'ordering': 'debt'})
+        self.assertEqual([apartment.number for apartment in response.context['object_list']], [3, 1])
+        self.assertEqual(response.context['object_list'][0].current_balance, 300)
+
+
+class TestWithCurrentState(TestCase):
+    def setUp(self):
+        self.apartments = create_building(apartments=4)
+        self.client.force_login(ApartmentUser.objects.create_superuser('admin', 'admin@example.com', 'x'))
+
+    def test_properties_use_prefetched_records(self):
+        with self.assertNumQueries(5):
+            apartments = list(Apartment.objects.with_current_state())
+        with self.assertNumQueries(0):
+            for apartment in apartments:
+                self.assertEqual(apartment.get_latest_water_readouts.readout_date, datetime.date(2023, 12, 28))
+                self.assertEqual(apartment.get_latest_occupancy.occupants, 2)
+                with self.assertRaises(apartment.parkingcard_set.model.DoesNotExist):
+                    apartment.get_latest_parking_card
+
+    def test_as_of(self):
+        apartment = Apartment.objects.with_current_state(datetime.date(2023, 6, 30)).get(number=1)
+        self.assertEqual(apartment.get_latest_water_readouts.readout_date, datetime.date(2023, 6, 28))
+
+    def test_list_views_query_count_is_constant(self):
+        for name in ('admin-water-readouts', 'occupancy'):
+            self.client.get(reverse(name))
+            with self.assertNumQueries(7):
+                self.client.get(reverse(name))
+
+
+class TestFilterFormChoices(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.apartments = create_building(apartments=3, year=2022)
+        self.add_readout(datetime.date(2023, 1, 28))
+
+    def add_readout(self, date):
+        WaterReadouts.objects.create(apartment=self.apartments[0], readout_date=date, cold_water_readout=100,
+                                     hot_water_readout=100, new_cold_water_meter=False, new_hot_water_meter=False)
+
+    def test_choices_are_cached_and_invalidated(self):
+        with self.assertNumQueries(2):
+            form = AdminSelectApartmentYearForm()
+            self.assertEqual(list(form.fields['apartment'].choices), [(None, "Wszystkie"), (1, 1), (2, 2), (3, 3)])
+            self.assertEqual(list(form.fields['year'].choices), [(None, "Wszystkie"), (2023, 2023)])
+        with self.assertNumQueries(0):
+            list(AdminSelectApartmentYearForm().fields['apartment'].choices)
+            list(ApartmentBalanceHistoryForm().fields['apartment'].choices)
+        Apartment.objects.create(number=4, area=40, acc_number=4)
+        self.assertIn((4, 4), list(ApartmentBalanceHistoryForm().fields['apartment'].choices))
+        self.add_readout(datetime.date(2024, 1, 28))
+        self.assertIn((2024, 2024), list(AdminSelectApartmentYearForm().fields['year'].choices))
+
+    def test_choices_expire_without_invalidation(self):
+        list(AdminSelectApartmentYearForm().fields['apartment'].choices)
+        # another worker created the apartment, this process never saw the signal
+        Apartment.objects.bulk_create([Apartment(number=4, area=40, acc_number=4)])
+        self.assertNotIn((4, 4), list(AdminSelectApartmentYearForm().fields['apartment'].choices))
+        later = time.time() + settings.FORM_CHOICES_TIMEOUT + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            self.assertIn((4, 4), list(AdminSelectApartmentYearForm().fields['apartment'].choices))
@@ -22,10 +22,16 @@ urlpatterns = [
     path('management/admin-yearly-summary/', AdminYearlySummaryView.as_view(), name='admin-yearly-summary'),
     path('management/summary/', SummaryView.as_view(), name='summary'),
     path('menagement/calculate-balance/', CalculatePayments.as_view(), name='calculate-balance'),
+    path('management/billing-runs/', BillingRunView.as_view(), name='billing-runs'),
+    path('management/billing-runs/<int:pk>/rollback/', BillingRunRollback.as_view(), name='billing-run-rollback'),
     path('management/apartment-balance/', ApartmentBalanceView.as_view(), name='apartment-balance'),
     path('management/association-balance/', AssociationBalanceView.as_view(), name='association-balance'),
     path('management/association-balance/create/', AssociationBalanceCreate.as_view(),
          name='association-balance-create'),
+    path('management/bank-statements/import/', BankStatementImport.as_view(), name='bank-statement-import'),
+    path('management/bank-statements/review/', BankStatementReviewView.as_view(), name='bank-statement-review'),
+    path('management/bank-statements/review/<int:pk>/', BankStatementLineResolve.as_view(),
+         name='bank-statement-resolve'),
     path('management/add-payment/<int:apartment_number>', ApartmentBalanceCreate.as_view(), name='add-payment'),
     path('management/add-payment/calculate-single-payment/<int:apartment_number>', CalculateSinglePayment.as_view(),
          name='calculate-single-payment'),
@@ -50,5 +56,7 @@ urlpatterns = [
     path('management/occupancy/create/<int:apartment_number>', OccupancyCreate.as_view(), name='occupancy-create'),
     path('management/occupancy/create/', OccupancyCreate.as_view(), name='occupancy-create'),
     path('management/occupancy/edit/<int:pk>', OccupancyEdit.as_view(), name='occupancy-edit'),
-    path('pdf/', GenerateYearlySummaryPdf.as_view(), name='generate-pdf')
+    path('management/metrics/', QueryMetricsView.as_view(), name='query-metrics'),
+    path('pdf/', GenerateYearlySummaryPdf.as_view(), name='generate-pdf'),
+    path('pdf/all/', GenerateYearlySummaryPdfZip.as_view(), name='generate-pdf-zip'),
 ]
@@ -1,69 +1,46 @@
-from .models import Apartment, Fees, WaterReadouts
+from .choices import invalidate_choices
+from .consumption import current_usage
+from .db import write_transaction
+from .effective_dated import EffectiveDatedIndex
+from .models import Apartment, Balance, Fees, WaterReadouts, Occupancy, ParkingCard, BigFamilyCard, \
+    CentralHeatingSurcharge
 from openpyxl import load_workbook
-from io import BytesIO
-from django.http import HttpResponse
-from django.template.loader import get_template
-from xhtml2pdf import pisa
-from xhtml2pdf.files import pisaFileObject
-
-
-def html_to_pdf(template_src, context_dict=None):
-    if context_dict is None:
-        context_dict = {}
-    template = get_template(template_src)
-    html = template.render(context_dict)
-    result = BytesIO()
-    pisaFileObject.getNamedFile = lambda self: self.uri
-    pdf = pisa.pisaDocument(BytesIO(html.encode("utf8")), result)
-    if not pdf.err:
-        return HttpResponse(result.getvalue(), content_type='application/pdf')
-    return None
+from collections import defaultdict
+from itertools import islice
+from zipfile import BadZipFile
+import csv
+import datetime
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 
 
 def calculate_water_usage(water_usage):
     """Takes WaterReadouts queryset and returns usage in m3
-    :param water_usage: WaterReadouts queryset
+    :param water_usage: WaterReadouts queryset or list ordered from the newest, read with a single query
     :returns: cold, hot, cold_curr, hot_curr"""
-    cold_curr, hot_curr = water_usage[0].get_water_readout
-    if water_usage[0].new_cold_water_meter:
-        cold_old = water_usage[1].get_cold_water_readout - water_usage[2].get_cold_water_readout
-        cold = cold_curr + cold_old
-    else:
-        cold = cold_curr - water_usage[1].get_cold_water_readout
-    if water_usage[0].new_hot_water_meter:
-        hot_old = water_usage[1].get_hot_water_readout - water_usage[2].get_hot_water_readout
-        hot = hot_curr + hot_old
-    else:
-        hot = hot_curr - water_usage[1].get_hot_water_readout
-
-    return cold, hot, cold_curr, hot_curr
-
-
-def calculate_fees(apt, water_id=None):
-
-    if water_id:
-        water_period = WaterReadouts.objects.get(pk=water_id)
-        water_date = water_period.readout_date
-        water_usage = WaterReadouts.objects.filter(apartment=apt, readout_date__lte=water_date).order_by('-readout_date')
-    else:
-        water_usage = WaterReadouts.objects.filter(apartment=apt).order_by('-readout_date')
-    cold, hot, cold_curr, hot_curr = calculate_water_usage(water_usage)
+    usage = current_usage(water_usage)
+    return usage.cold, usage.hot, usage.cold_curr, usage.hot_curr
 
-    fees = Fees.objects.values().filter(period__lte=water_usage[0].readout_date).latest('period')
 
-    readout_date = water_usage[0].readout_date
-    tenants = apt.occupancy_set.filter(start_date__lte=readout_date).latest('start_date').occupants
-    parking = apt.parkingcard_set.filter(start_date__lte=readout_date).order_by('start_date')
-    big_family_card = apt.bigfamilycard_set.filter(start_date__lte=readout_date).order_by('start_date')
-    ch_surcharge = apt.centralheatingsurcharge_set.filter(start_date__lte=readout_date, end_date__gte=readout_date)
+def build_fees_summary(apt, usage, fees, tenants, parking_cards, big_family_card, ch_surcharge):
+    """Builds the fee breakdown of a single month from already resolved inputs
+    :param usage: consumption.Usage of the billed readout
+    :param fees: Fees values() dict in force on the readout date
+    :param tenants: number of occupants on the readout date
+    :param parking_cards: number of parking cards on the readout date
+    :param big_family_card: BigFamilyCard in force on the readout date or None
+    :param ch_surcharge: CentralHeatingSurcharge covering the readout date or None"""
+    cold, hot, cold_curr, hot_curr = usage.cold, usage.hot, usage.cold_curr, usage.hot_curr
+    readout_date = usage.readout_date
     ch_payment = 0
     if ch_surcharge:
-        if readout_date == ch_surcharge[0].end_date:
-            ch_payment = ch_surcharge[0].last_payment
+        if readout_date == ch_surcharge.end_date:
+            ch_payment = ch_surcharge.last_payment
         else:
-            ch_payment = ch_surcharge[0].amount_per_month
+            ch_payment = ch_surcharge.amount_per_month
 
-    parking_cards = parking[0].number_of_cards if parking else 0
     obj = {'readout_date': readout_date,
            'hot_water_cost': hot * fees['hot_water'],
            'cold_water_cost': cold * fees['cold_water'],
@@ -86,30 +63,296 @@ def calculate_fees(apt, water_id=None):
            'central_heating_surcharge': ch_payment,
            }
     if big_family_card:
-        obj['garbage_cost'] -= big_family_card[0].amount
+        obj['garbage_cost'] -= big_family_card.amount
     obj['total'] = obj['hot_water_cost'] + obj['cold_water_cost'] + obj['maintenance_cost'] + obj['repair_fund_cost'] + obj['central_heating_cost'] + obj['garbage_cost'] + obj['parking_fee'] + obj['central_heating_surcharge']
 
     return obj
 
 
+def calculate_fees(apt, water_id=None):
+
+    if water_id:
+        water_period = WaterReadouts.objects.get(pk=water_id)
+        water_date = water_period.readout_date
+        water_usage = WaterReadouts.objects.filter(apartment=apt, readout_date__lte=water_date).order_by('-readout_date')
+    else:
+        water_usage = WaterReadouts.objects.filter(apartment=apt).order_by('-readout_date')
+    water_usage = list(water_usage[:3])
+
+    fees = Fees.objects.values().filter(period__lte=water_usage[0].readout_date).latest('period')
+
+    readout_date = water_usage[0].readout_date
+    tenants = apt.occupancy_set.filter(start_date__lte=readout_date).latest('start_date').occupants
+    parking = apt.parkingcard_set.filter(start_date__lte=readout_date).order_by('-start_date').first()
+    big_family_card = apt.bigfamilycard_set.filter(start_date__lte=readout_date).order_by('-start_date').first()
+    ch_surcharge = apt.centralheatingsurcharge_set.filter(start_date__lte=readout_date,
+                                                          end_date__gte=readout_date).order_by('-start_date',
+                                                                                               '-id').first()
+
+    parking_cards = parking.number_of_cards if parking else 0
+    return build_fees_summary(apt, current_usage(water_usage), fees, tenants, parking_cards, big_family_card,
+                              ch_surcharge)
+
+
+def load_fee_indexes(apartments=None):
+    """Loads every effective-dated input of the fee breakdown in one query per model.
+    :param apartments: apartments or their ids to restrict household records to, all apartments when None
+    :returns: dict of EffectiveDatedIndex: fees, occupancy, parking, big_family_card, ch_surcharge"""
+    def household(model):
+        queryset = model.objects.all()
+        if apartments is not None:
+            queryset = queryset.filter(apartment__in=apartments)
+        return queryset
+
+    return {'fees': EffectiveDatedIndex.from_queryset(Fees.objects.values(), 'period', key_field=None),
+            'occupancy': EffectiveDatedIndex.from_queryset(household(Occupancy)),
+            'parking': EffectiveDatedIndex.from_queryset(household(ParkingCard)),
+            'big_family_card': EffectiveDatedIndex.from_queryset(household(BigFamilyCard)),
+            'ch_surcharge': EffectiveDatedIndex.from_queryset(household(CentralHeatingSurcharge),
+                                                              end_field='end_date')}
+
+
+def calculate_fees_from_indexes(apt, usage, indexes):
+    """Same breakdown as calculate_fees with the tariffs and household records taken from load_fee_indexes.
+    :param usage: consumption.Usage of the billed readout"""
+    readout_date = usage.readout_date
+    fees = indexes['fees'].as_of(readout_date)
+    if fees is None:
+        raise Fees.DoesNotExist
+    occupancy = indexes['occupancy'].as_of(readout_date, apt.pk)
+    if occupancy is None:
+        raise Occupancy.DoesNotExist
+    parking = indexes['parking'].as_of(readout_date, apt.pk)
+    return build_fees_summary(apt, usage, fees, occupancy.occupants,
+                              parking.number_of_cards if parking else 0,
+                              indexes['big_family_card'].as_of(readout_date, apt.pk),
+                              indexes['ch_surcharge'].as_of(readout_date, apt.pk))
+
+
+def calculate_fees_bulk(apartments, as_of=None, strict=True):
+    """Computes the same breakdown as calculate_fees for many apartments in a constant number of queries.
+    :param apartments: iterable of Apartment objects
+    :param as_of: only readouts taken on or before this date are used, the newest one is billed
+    :param strict: raise like calculate_fees when an apartment is missing data, otherwise skip it
+    :returns: {apartment.pk: fees dict}"""
+    apartments = list(apartments)
+    ids = [apt.pk for apt in apartments]
+
+    readouts = WaterReadouts.objects.filter(apartment__in=ids)
+    if as_of:
+        readouts = readouts.filter(readout_date__lte=as_of)
+    readouts = readouts.annotate(row=Window(RowNumber(), partition_by=F('apartment'),
+                                            order_by=[F('readout_date').desc(), F('id').desc()])).filter(row__lte=3)
+    water_usage = defaultdict(list)
+    for readout in readouts.order_by('apartment', 'row'):
+        water_usage[readout.apartment_id].append(readout)
+
+    indexes = load_fee_indexes(ids)
+    result = {}
+    for apt in apartments:
+        try:
+            result[apt.pk] = calculate_fees_from_indexes(apt, current_usage(water_usage[apt.pk]), indexes)
+        except (ObjectDoesNotExist, IndexError):
+            if strict:
+                raise
+    return result
+
+
+IMPORT_BATCH_SIZE = 500
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime.datetime) else value
+
+
+def read_water_readouts(file):
+    """Streams readouts from the import sheet: the first row holds the readout dates, every following row
+    an apartment number and a cold, hot pair of readings per date. Empty cells are skipped.
+    :returns: generator of (apartment_number, readout_date, cold_water, hot_water)"""
+    wb = load_workbook(filename=file, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        dates = [_as_date(date) for date in next(rows, ()) if date]
+        for water_readout in rows:
+            apt = water_readout[0] if water_readout else None
+            if apt:
+                cold_water = water_readout[1::2]
+                hot_water = water_readout[2::2]
+                for value, (cold, hot) in enumerate(zip(cold_water, hot_water)):
+                    if value < len(dates) and cold is not None and hot is not None:
+                        yield apt, dates[value], cold, hot
+    finally:
+        wb.close()
+
+
 def import_water_readouts(file):
-    wb = load_workbook(filename=file)
-    sheet = wb.active
-    dates = [date for date in sheet.iter_rows(max_row=1, values_only=True)]
-    dates = [date for date in dates[0] if date]
-    water_readouts = [water for water in sheet.iter_rows(min_row=2, values_only=True)]
-
-    for water_readout in water_readouts:
-        apt = water_readout[0]
-        if apt:
-            cold_water = water_readout[1::2]
-            hot_water = water_readout[2::2]
-            water = zip(cold_water, hot_water)
-            for value, date in enumerate(dates):
-                if date:
-                    obj = WaterReadouts.objects.create(apartment=Apartment.objects.get(number=apt),
-                                                       readout_date=date,
-                                                       cold_water_readout=cold_water[value],
-                                                       hot_water_readout=hot_water[value],
-                                                       new_hot_water_meter=False,
-                                                       new_cold_water_meter=False)
+    """Imports the readouts sheet in one transaction, in batches of IMPORT_BATCH_SIZE.
+    Readouts already stored for the same apartment and date are updated, so importing a file again is safe.
+    Monthly statements of the imported apartments are refreshed from the earliest imported date.
+    :returns: number of created and updated readouts"""
+    from .statements import refresh_monthly_statements
+
+    apartments = dict(Apartment.objects.values_list('number', 'id'))
+    readouts = read_water_readouts(file)
+    created = updated = 0
+    touched = set()
+    since = None
+    with write_transaction():
+        transaction.on_commit(invalidate_choices)
+        while batch := list(islice(readouts, IMPORT_BATCH_SIZE)):
+            values = {}
+            for apt, date, cold, hot in batch:
+                try:
+                    apartment_id = apartments[int(apt)]
+                except (KeyError, TypeError, ValueError):
+                    raise ValidationError(f"Nieznany numer mieszkania: {apt}")
+                values[apartment_id, date] = cold, hot
+                touched.add(apartment_id)
+                since = min(since or date, date)
+
+            existing = WaterReadouts.objects.filter(apartment__in={key[0] for key in values},
+                                                    readout_date__in={key[1] for key in values})
+            to_update = []
+            for readout in existing:
+                key = readout.apartment_id, readout.readout_date
+                if key in values:
+                    readout.cold_water_readout, readout.hot_water_readout = values.pop(key)
+                    to_update.append(readout)
+            WaterReadouts.objects.bulk_update(to_update, ['cold_water_readout', 'hot_water_readout'])
+            WaterReadouts.objects.bulk_create(WaterReadouts(apartment_id=apartment_id,
+                                                            readout_date=date,
+                                                            cold_water_readout=cold,
+                                                            hot_water_readout=hot,
+                                                            new_hot_water_meter=False,
+                                                            new_cold_water_meter=False)
+                                              for (apartment_id, date), (cold, hot) in values.items())
+            created += len(values)
+            updated += len(to_update)
+        if touched:
+            refresh_monthly_statements(touched, since)
+    return created, updated
+
+
+def preview_water_readouts(file):
+    """Dry run of import_water_readouts: parses the sheet and compares it with the stored readouts
+    in a fixed number of queries, without writing anything.
+    :returns: list of per-apartment dicts with the imported rows, their usage since the previous readout
+    and the anomalies found (unknown apartment, duplicate date, reading lower than the previous one,
+    readout already stored for the date)"""
+    apartments = dict(Apartment.objects.values_list('number', 'id'))
+    imported = defaultdict(list)
+    for apt, date, cold, hot in read_water_readouts(file):
+        try:
+            apt = int(apt)
+        except (TypeError, ValueError):
+            pass
+        imported[apt].append({'readout_date': date, 'cold_water': cold, 'hot_water': hot,
+                              'cold_used': None, 'hot_used': None, 'anomalies': []})
+    if not imported:
+        return []
+
+    ids = {apartments[number] for number in imported if number in apartments}
+    dates = {row['readout_date'] for rows in imported.values() for row in rows}
+    stored = WaterReadouts.objects.filter(apartment__in=ids, readout_date__in=dates)
+    stored = {(readout.apartment_id, readout.readout_date): readout for readout in stored}
+    previous = WaterReadouts.objects.filter(apartment__in=ids, readout_date__lt=min(dates)).annotate(
+        row=Window(RowNumber(), partition_by=F('apartment'),
+                   order_by=[F('readout_date').desc(), F('id').desc()])).filter(row=1)
+    previous = {readout.apartment_id: readout for readout in previous}
+
+    preview = []
+    for number, rows in sorted(imported.items(), key=lambda item: (0, item[0]) if isinstance(item[0], int)
+                               else (1, str(item[0]))):
+        apartment_id = apartments.get(number)
+        anomalies = [] if apartment_id else ["Nieznany numer mieszkania"]
+        rows.sort(key=lambda row: row['readout_date'])
+        last = previous.get(apartment_id)
+        last = (last.cold_water_readout, last.hot_water_readout) if last else None
+        last_date = None
+        for row in rows:
+            if row['readout_date'] == last_date:
+                row['anomalies'].append("Powtórzona data odczytu")
+            existing = stored.get((apartment_id, row['readout_date']))
+            if existing:
+                row['anomalies'].append(f"Nadpisuje zapisany odczyt {existing.cold_water_readout}/"
+                                        f"{existing.hot_water_readout}")
+            if last:
+                row['cold_used'] = row['cold_water'] - last[0]
+                row['hot_used'] = row['hot_water'] - last[1]
+                if row['cold_used'] < 0 or row['hot_used'] < 0:
+                    row['anomalies'].append("Odczyt niższy niż poprzedni bez wymiany licznika")
+            last = row['cold_water'], row['hot_water']
+            last_date = row['readout_date']
+        preview.append({'number': number,
+                        'known': apartment_id is not None,
+                        'rows': rows,
+                        'anomalies': anomalies + [anomaly for row in rows for anomaly in row['anomalies']]})
+    return preview
+
+
+ENTRY_COLUMNS = ('date', 'type_of_transaction', 'title', 'amount', 'counterparty')
+
+
+def _entry_amount(value):
+    if isinstance(value, str):
+        return value.replace('\xa0', '').replace(' ', '').replace(',', '.')
+    return value
+
+
+def _entry_rows(rows):
+    """Maps sheet rows onto ENTRY_COLUMNS, skipping empty rows and a header row.
+    Transaction types may be given by code or by name, amounts with a decimal comma."""
+    types = {}
+    for code, name in Balance.TYPES_OF_TRANSACTION:
+        types[code.lower()] = types[name.lower()] = code
+    first = True
+    for number, row in enumerate(rows, start=1):
+        row = [value.strip() if isinstance(value, str) else value for value in row]
+        if not any(value not in (None, '') for value in row):
+            continue
+        data = dict(zip(ENTRY_COLUMNS, row))
+        data['amount'] = _entry_amount(data.get('amount'))
+        if first:
+            first = False
+            if isinstance(data['amount'], str) and not data['amount'].lstrip('+-').replace('.', '', 1).isdigit():
+                continue
+        if isinstance(data.get('type_of_transaction'), str):
+            data['type_of_transaction'] = types.get(data['type_of_transaction'].lower(),
+                                                    data['type_of_transaction'])
+        yield number, data
+
+
+def _decode(content):
+    try:
+        return content.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return content.decode('cp1250')
+
+
+def read_association_entries(file=None, text=None):
+    """Reads association ledger entries from an uploaded CSV or XLSX file or from text pasted from a spreadsheet,
+    one entry per row in ENTRY_COLUMNS order, the counterparty is optional. Pasted text is split on tabs,
+    CSV on semicolons or commas.
+    :returns: generator of (row number, form data dict)"""
+    if file is not None and file.name.lower().endswith('.xlsx'):
+        try:
+            wb = load_workbook(filename=file, read_only=True, data_only=True)
+        except (BadZipFile, KeyError, OSError):
+            raise ValidationError("Nie udało się odczytać pliku XLSX")
+        try:
+            yield from _entry_rows(wb.active.iter_rows(values_only=True))
+        finally:
+            wb.close()
+        return
+    if file is not None:
+        text = _decode(file.read())
+    lines = (text or '').splitlines()
+    sample = '\n'.join(lines[:10])
+    if '\t' in sample:
+        delimiter = '\t'
+    else:
+        try:
+            delimiter = csv.Sniffer().sniff(sample, delimiters=';,').delimiter
+        except csv.Error:
+            delimiter = ';'
+    yield from _entry_rows(csv.reader(lines, delimiter=delimiter))
@@ -7,6 +7,18 @@ def file_extension_validator(value):
         raise ValidationError('Niepoprawne rozszerzenie pliku')
 
 
+def entries_file_extension_validator(value):
+    ext = value.name.split('.')[-1].lower()
+    if ext not in ('csv', 'xlsx'):
+        raise ValidationError('Niepoprawne rozszerzenie pliku')
+
+
+def bank_statement_extension_validator(value):
+    ext = value.name.split('.')[-1].lower()
+    if ext not in ('csv', 'sta', 'mt940', 'txt'):
+        raise ValidationError('Niepoprawne rozszerzenie pliku')
+
+
 def phone_number_validator(value):
     if 999999999 < value < 100000000:
         raise ValidationError("Niepoprawny numer telefonu")
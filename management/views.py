@@ -1,9 +1,15 @@
+from decimal import Decimal
+from io import BytesIO
+
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.views import LoginView
 from django.contrib.messages.views import SuccessMessageMixin
+from django.core.exceptions import ValidationError
+from django.db.models import DecimalField, Value
+from django.db.models.functions import Coalesce
 from django.forms import modelformset_factory
-from django.http import HttpResponse
+from django.http import FileResponse, StreamingHttpResponse
 from django.http import HttpResponseRedirect
 from django.shortcuts import render
 from django.template.loader import render_to_string
@@ -12,9 +18,16 @@ from django.views.generic import TemplateView, DetailView, ListView, CreateView,
 from django.views.generic import View
 from django.views.generic.edit import FormMixin
 
+from .bank_import import import_bank_statement, resolve_statement_line
+from .billing import run_billing, rollback_billing_run
+from .metrics import view_metrics
 from .forms import *
 from .models import *
-from .utils import calculate_fees, import_water_readouts, html_to_pdf
+from .pdf import STATEMENT_TEMPLATE, PdfRenderError, render_pdf, render_pdfs, stream_zip
+from .pdf_cache import get_pdf_cache, statement_fingerprint
+from .reporting import SAFE_METHODS, reporting_database, wrote_recently
+from .statements import apartment_breakdown, building_statements, latest_breakdowns, yearly_statement
+from .utils import import_water_readouts, preview_water_readouts
 
 # Create your views here.
 DATETIME_FORMAT = '%d.%m.%Y %H:%M:%S'
@@ -32,12 +45,39 @@ class SelectApartmentYearFormMixin(FormMixin):
         return initial
 
 
+class FeeBreakdownMixin:
+    """fee breakdowns read from the monthly statements, memoized for the rest of the request"""
+
+    def get_fees(self, apartment, readout_id=None):
+        if not hasattr(self, '_fees'):
+            self._fees = {}
+        key = apartment.pk, readout_id
+        if key not in self._fees:
+            self._fees[key] = apartment_breakdown(apartment, readout_id)
+        return self._fees[key]
+
+
 class AdminStaffRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
 
     def test_func(self):
         return self.request.user.is_superuser or self.request.user.is_staff
 
 
+class ReportingDatabaseMixin:
+    """Serves read-only requests from the reporting database, the response is rendered inside so lazy
+    querysets are read there too. Clients that changed data recently stay on the primary.
+    Put it after the access mixins, the user is then loaded from the primary."""
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in SAFE_METHODS or wrote_recently(request):
+            return super().dispatch(request, *args, **kwargs)
+        with reporting_database():
+            response = super().dispatch(request, *args, **kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+        return response
+
+
 class MyLoginView(LoginView):
 
     def get_success_url(self):
@@ -72,11 +112,12 @@ class WaterReadoutsAdminView(AdminStaffRequiredMixin, SelectApartmentYearFormMix
 
     def get_queryset(self):
         if self.request.GET.get('apartment') == '0' or not self.request.GET.get('apartment'):
-            queryset = Apartment.objects.all()
+            queryset = Apartment.objects.with_current_state()
             queryset = [query.get_latest_water_readouts for query in queryset]
         else:
             queryset = WaterReadouts.objects.filter(apartment__number=self.request.GET.get('apartment'),
-                                                    readout_date__year=self.request.GET.get('year'))
+                                                    readout_date__year=self.request.GET.get('year')).select_related(
+                'apartment')
         return queryset
 
 
@@ -150,19 +191,32 @@ class FeesHistoryView(AdminStaffRequiredMixin, ListView):
 
 class AdminSummaryView(AdminStaffRequiredMixin, FormMixin, ListView):
     template_name = 'admin-summary.html'
-    queryset = Apartment.objects.all()
     form_class = AdminSummaryForm
+    paginate_by = 40
 
-    def get_queryset(self):
+    def get_initial(self):
+        initial = {'only_not_paid': self.request.GET.get('only_not_paid'),
+                   'ordering': self.request.GET.get('ordering')}
+        return initial
 
-        if self.request.POST.get('only_not_paid'):
-            queryset = Apartment.objects.all()
-            qs = [obj.get_latest_balance for obj in queryset if obj.get_latest_balance.balance > 0]
-        else:
-            queryset = Apartment.objects.all()
-            qs = [obj.get_latest_balance for obj in queryset]
+    def get_queryset(self):
+        params = self.request.POST if self.request.method == 'POST' else self.request.GET
+        queryset = Apartment.objects.annotate(
+            current_balance=Coalesce('balance_head__balance', Value(Decimal(0)), output_field=DecimalField()))
+        if params.get('only_not_paid'):
+            queryset = queryset.filter(current_balance__gt=0)
+        if params.get('ordering') == 'debt':
+            queryset = queryset.order_by('-current_balance', 'number')
+        return queryset
 
-        return qs
+    def get_context_data(self, **kwargs):
+        context = super(AdminSummaryView, self).get_context_data(**kwargs)
+        apartments = list(context['object_list'])
+        fees = latest_breakdowns(apartments, strict=False)
+        for apartment in apartments:
+            apartment.monthly_fees = fees.get(apartment.pk)
+        context['object_list'] = apartments
+        return context
 
     def post(self, request):
         self.object_list = self.get_queryset()
@@ -170,59 +224,78 @@ class AdminSummaryView(AdminStaffRequiredMixin, FormMixin, ListView):
         return self.render_to_response(context)
 
 
-class AdminYearlySummaryView(AdminStaffRequiredMixin, SelectApartmentYearFormMixin, ListView):
-    template_name = 'admin-yearly-summary.html'
+class YearlyStatementMixin:
+    """selects the apartment and readout range of the yearly summary and its PDF from GET parameters"""
+
+    def get_apartment(self):
+        if not hasattr(self, '_apartment'):
+            self._apartment = Apartment.objects.select_related('balance_head__entry').get(
+                number=self.request.GET.get('apartment') or 1)
+        return self._apartment
 
     def get_queryset(self):
-        if self.request.GET.get('year'):
-            queryset = WaterReadouts.objects.filter(readout_date__year=self.request.GET.get('year'),
-                                                    apartment__number=self.request.GET.get('apartment'))
-        else:
-            queryset = WaterReadouts.objects.filter(readout_date__year='2023', apartment__number=1)
-        if self.request.GET.get('start_date'):
-            queryset = queryset.filter(readout_date__month__gte=self.request.GET.get('start_date'))
-        if self.request.GET.get('end_date'):
-            queryset = queryset.filter(readout_date__month__lte=self.request.GET.get('end_date'))
+        return yearly_statement(self.get_apartment(),
+                                year=self.request.GET.get('year') or 2023,
+                                start_month=self.request.GET.get('start_date'),
+                                end_month=self.request.GET.get('end_date'))
 
-        queryset = (calculate_fees(readout.apartment, readout.id) for readout in queryset)
-        return queryset
+
+class AdminYearlySummaryView(AdminStaffRequiredMixin, ReportingDatabaseMixin, SelectApartmentYearFormMixin,
+                             YearlyStatementMixin, ListView):
+    template_name = 'admin-yearly-summary.html'
 
     def get_context_data(self, **kwargs):
         context = super(AdminYearlySummaryView, self).get_context_data()
         context['number_of_apartments'] = Apartment.objects.all().count()
-        context['balance'] = Apartment.objects.get(number=self.request.GET.get('apartment')).get_latest_balance
+        context['balance'] = self.get_apartment().get_latest_balance
         return context
 
 
-class GenerateYearlySummaryPdf(AdminStaffRequiredMixin, View):
-    def get_queryset(self):
-        if self.request.GET.get('year'):
-            queryset = WaterReadouts.objects.filter(readout_date__year=self.request.GET.get('year'),
-                                                    apartment__number=self.request.GET.get('apartment'))
-        else:
-            queryset = WaterReadouts.objects.filter(readout_date__year=2023, apartment__number=1)
-        if self.request.GET.get('start_date'):
-            queryset = queryset.filter(readout_date__month__gte=self.request.GET.get('start_date'))
-        if self.request.GET.get('end_date'):
-            queryset = queryset.filter(readout_date__month__lte=self.request.GET.get('end_date'))
-
-        queryset = [calculate_fees(readout.apartment, readout.id) for readout in queryset]
-        return queryset
+class GenerateYearlySummaryPdf(AdminStaffRequiredMixin, ReportingDatabaseMixin, YearlyStatementMixin, View):
 
     def get(self, request, *args, **kwargs):
-        context = {'data': self.get_queryset(),
-                   'balance': Apartment.objects.get(number=self.request.GET.get('apartment')).get_latest_balance,
-                   'apartment': self.request.GET.get('apartment')}
-        open('templates/temp.html', "w", encoding='utf-8').write(render_to_string('summary-template.html', context))
-
-        # Converting the HTML template into a PDF file
-        pdf = html_to_pdf('temp.html')
-
-        # rendering the template
-        return HttpResponse(pdf, content_type='application/pdf')
-
+        apartment = self.get_apartment()
+        pdf_cache = get_pdf_cache()
+        fingerprint = statement_fingerprint(apartment,
+                                            year=self.request.GET.get('year') or 2023,
+                                            start_month=self.request.GET.get('start_date'),
+                                            end_month=self.request.GET.get('end_date'))
+        pdf = pdf_cache.get(apartment.pk, fingerprint)
+        if pdf is None:
+            context = {'data': self.get_queryset(),
+                       'balance': apartment.get_latest_balance,
+                       'apartment': apartment.number}
+            try:
+                pdf = render_pdf(STATEMENT_TEMPLATE, context)
+            except PdfRenderError:
+                messages.error(request, "Nie udało się wygenerować pliku PDF, spróbuj ponownie.")
+                return HttpResponseRedirect(f"{reverse_lazy('admin-yearly-summary')}?{request.GET.urlencode()}")
+            pdf_cache.set(apartment.pk, fingerprint, pdf)
+        return FileResponse(BytesIO(pdf), content_type='application/pdf',
+                            filename=f"podsumowanie-{apartment.number}-{self.request.GET.get('year') or 2023}.pdf")
+
+
+class GenerateYearlySummaryPdfZip(AdminStaffRequiredMixin, ReportingDatabaseMixin, View):
+    """yearly summaries of all apartments rendered in parallel and streamed as one ZIP archive"""
 
-class SummaryView(LoginRequiredMixin, FormMixin, DetailView):
+    def get(self, request, *args, **kwargs):
+        year = self.request.GET.get('year') or 2023
+        # read before the response is returned, the stream is consumed after ReportingDatabaseMixin has exited
+        statements = list(building_statements(year,
+                                              start_month=self.request.GET.get('start_date'),
+                                              end_month=self.request.GET.get('end_date')))
+        documents = ((f"podsumowanie-{apartment.number}-{year}.pdf",
+                      render_to_string(STATEMENT_TEMPLATE, {'data': statement,
+                                                            'balance': apartment.get_latest_balance,
+                                                            'apartment': apartment.number}))
+                     for apartment, statement in statements)
+        response = StreamingHttpResponse(stream_zip(render_pdfs(documents)),
+                                         content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="podsumowania-{year}.zip"'
+        return response
+
+
+class SummaryView(LoginRequiredMixin, FeeBreakdownMixin, FormMixin, DetailView):
     template_name = 'summary.html'
     form_class = SummaryForm
 
@@ -235,9 +308,12 @@ class SummaryView(LoginRequiredMixin, FormMixin, DetailView):
         date = None
         if self.request.method == 'POST':
             date = self.request.POST.get('readout_dates')
-        user = self.request.user
-        obj = calculate_fees(user.apartment, date)
-        return obj
+        return self.get_fees(self.request.user.apartment, date)
+
+    def get_context_data(self, **kwargs):
+        context = super(SummaryView, self).get_context_data(**kwargs)
+        context['balance'] = self.request.user.apartment.get_latest_balance
+        return context
 
     def post(self, request):
         self.object = self.get_object()
@@ -253,20 +329,37 @@ class CalculatePayments(AdminStaffRequiredMixin, SuccessMessageMixin, CreateView
 
     def form_valid(self, form):
         cleaned_data = form.cleaned_data
-        apartments = Apartment.objects.all()
-        for apartment in apartments:
-            balance = calculate_fees(apartment)
-            ApartmentBalance.objects.create(apartment=apartment,
-                                            date=cleaned_data['date'],
-                                            title=cleaned_data['title'],
-                                            amount=balance['total'],
-                                            type_of_transaction=cleaned_data['type_of_transaction']
-                                            )
+        try:
+            run_billing(date=cleaned_data['date'],
+                        title=cleaned_data['title'],
+                        type_of_transaction=cleaned_data['type_of_transaction'],
+                        user=self.request.user)
+        except ValidationError as e:
+            form.add_error(None, e)
+            return self.form_invalid(form)
         messages.success(self.request, "Bilans został zaktualizowany.")
         return HttpResponseRedirect(reverse_lazy('admin-summary'))
 
 
-class ApartmentBalanceView(AdminStaffRequiredMixin, FormMixin, ListView):
+class BillingRunView(AdminStaffRequiredMixin, ListView):
+    model = BillingRun
+    template_name = 'billing-runs.html'
+    paginate_by = 20
+
+
+class BillingRunRollback(AdminStaffRequiredMixin, View):
+
+    def post(self, request, pk):
+        try:
+            run = rollback_billing_run(BillingRun.objects.get(pk=pk))
+        except ValidationError as e:
+            messages.error(request, e.messages[0])
+        else:
+            messages.success(request, f"Naliczenie {run} zostało wycofane.")
+        return HttpResponseRedirect(reverse_lazy('billing-runs'))
+
+
+class ApartmentBalanceView(AdminStaffRequiredMixin, ReportingDatabaseMixin, FormMixin, ListView):
     template_name = 'apartment-balance.html'
     form_class = ApartmentBalanceHistoryForm
     paginate_by = 40
@@ -279,7 +372,7 @@ class ApartmentBalanceView(AdminStaffRequiredMixin, FormMixin, ListView):
         return initial
 
     def get_queryset(self):
-        queryset = ApartmentBalance.objects.all().order_by('-id')
+        queryset = ApartmentBalance.objects.select_related('apartment').order_by('-id')
         start_date = self.request.GET.get('start_date')
         end_date = self.request.GET.get('end_date')
         apartment = self.request.GET.get('apartment')
@@ -313,15 +406,20 @@ class ApartmentBalanceCreate(AdminStaffRequiredMixin, SuccessMessageMixin, Creat
         return initial
 
 
-class CalculateSinglePayment(AdminStaffRequiredMixin, SuccessMessageMixin, CreateView):
+class CalculateSinglePayment(AdminStaffRequiredMixin, FeeBreakdownMixin, SuccessMessageMixin, CreateView):
     form_class = ApartmentBalanceForm
     template_name = 'calculate-single-payment.html'
     success_message = 'Opłata dodana pomyślnie'
     success_url = reverse_lazy('admin-summary')
 
+    def get_apartment(self):
+        if not hasattr(self, '_apartment'):
+            self._apartment = Apartment.objects.get(number=self.kwargs.get('apartment_number'))
+        return self._apartment
+
     def get_initial(self, **kwargs):
         obj = self.get_object()
-        initial = {'apartment': Apartment.objects.get(number=self.kwargs.get('apartment_number')),
+        initial = {'apartment': self.get_apartment(),
                    'date': datetime.date.today(),
                    'amount': f"{obj['total']:.2f}"}
         return initial
@@ -332,14 +430,14 @@ class CalculateSinglePayment(AdminStaffRequiredMixin, SuccessMessageMixin, Creat
         return context
 
     def get_object(self, queryset=None):
-        obj = calculate_fees(apt=Apartment.objects.get(number=self.kwargs.get('apartment_number')))
-        return obj
+        return self.get_fees(self.get_apartment())
 
 
-class AssociationBalanceView(AdminStaffRequiredMixin, FormMixin, ListView):
+class AssociationBalanceView(AdminStaffRequiredMixin, ReportingDatabaseMixin, FormMixin, ListView):
     template_name = 'association-balance.html'
     model = AssociationBalance
     form_class = TransactionHistoryForm
+    paginate_by = 40
 
     def get_initial(self):
         initial = {'apartment': self.request.GET.get('apartment'),
@@ -361,34 +459,55 @@ class AssociationBalanceView(AdminStaffRequiredMixin, FormMixin, ListView):
             queryset = queryset.filter(type_of_transaction=type_of_transaction)
         return queryset
 
+    def get_context_data(self, **kwargs):
+        context = super(AssociationBalanceView, self).get_context_data(**kwargs)
+        form = TransactionHistoryForm(self.request.GET)
+        start = end = type_of_transaction = None
+        if form.is_valid():
+            start, end = (date and date.replace(day=1) for date in (form.cleaned_data['start_date'],
+                                                                    form.cleaned_data['end_date']))
+            type_of_transaction = form.cleaned_data['type_of_transaction']
+        context['totals'] = AssociationMonthlyRollup.objects.totals(start, end, type_of_transaction)
+        head = AssociationBalanceHead.objects.first()
+        context['balance'] = head.balance if head else 0
+        query = self.request.GET.copy()
+        query.pop('page', None)
+        context['query'] = query.urlencode()
+        return context
 
-class AssociationBalanceCreate(AdminStaffRequiredMixin, SuccessMessageMixin, CreateView):
-    model = AssociationBalance
-    form_class = AssociationBalanceForm
-    AssociationFormSet = modelformset_factory(model=AssociationBalance, form=AssociationBalanceForm, extra=3)
-    template_name = 'form-multiple.html'
+
+class AssociationBalanceCreate(AdminStaffRequiredMixin, View):
+    """Enters many association ledger entries at once from the formset, an uploaded CSV/XLSX file and pasted
+    spreadsheet rows. All rows are validated together and saved with one bulk insert, so either all of them
+    are posted or none."""
+    template_name = 'association-balance-create.html'
+    form_class = AssociationBalanceImportForm
     success_message = 'Dodano pomyślnie'
+    success_url = reverse_lazy('association-balance')
+    max_forms = 200
 
-    def get_context_data(self, **kwargs):
-        if self.request.POST:
-            formset = self.AssociationFormSet(self.request.POST)
-            context = {}
-        else:
-            context = super(AssociationBalanceCreate, self).get_context_data(**kwargs)
-            formset = self.AssociationFormSet(queryset=AssociationBalance.objects.none())
+    def get_formset(self, data=None):
+        try:
+            extra = min(max(int(self.request.GET.get('forms', 3)), 1), self.max_forms)
+        except ValueError:
+            extra = 3
+        formset_class = modelformset_factory(model=AssociationBalance, form=AssociationBalanceForm, extra=extra)
+        return formset_class(data, queryset=AssociationBalance.objects.none())
 
-        context['formset'] = formset
-        return context
+    def get(self, request, *args, **kwargs):
+        return render(request, self.template_name, {'formset': self.get_formset(), 'form': self.form_class()})
 
     def post(self, request, *args, **kwargs):
-        formset = self.AssociationFormSet(request.POST)
-        if formset.is_valid():
-            return self.form_valid(formset)
-        else:
-            return self.form_invalid(formset)
-
-    def get_success_url(self):
-        return reverse_lazy('association-balance')
+        formset = self.get_formset(request.POST)
+        form = self.form_class(request.POST, request.FILES)
+        if all([formset.is_valid(), form.is_valid()]):
+            entries = formset.save(commit=False) + form.cleaned_data['entries']
+            if entries:
+                AssociationBalance.objects.bulk_post(entries)
+                messages.success(request, f"{self.success_message} (operacje: {len(entries)})")
+                return HttpResponseRedirect(self.success_url)
+            form.add_error(None, "Nie podano żadnej operacji")
+        return render(request, self.template_name, {'formset': formset, 'form': form})
 
 
 class CentralHeatingSurchargeView(AdminStaffRequiredMixin, SelectApartmentYearFormMixin, ListView):
@@ -439,12 +558,12 @@ class ParkingCardView(AdminStaffRequiredMixin, SelectApartmentYearFormMixin, Lis
 
     def get_queryset(self):
         if self.request.GET.get('apartment'):
-            queryset = ParkingCard.objects.filter(apartment__number=self.request.GET.get('apartment')).order_by(
-                '-start_date')
+            queryset = ParkingCard.objects.filter(apartment__number=self.request.GET.get('apartment')).select_related(
+                'apartment').order_by('-start_date')
             if self.request.GET.get('year'):
                 queryset = queryset.filter(start_date__year=self.request.GET.get('year'))
         else:
-            queryset = ParkingCard.objects.all().order_by('apartment__number')
+            queryset = ParkingCard.objects.select_related('apartment').order_by('apartment__number')
             if self.request.GET.get('year'):
                 queryset = queryset.filter(start_date__year=self.request.GET.get('year'))
         return queryset
@@ -482,7 +601,7 @@ class BigFamilyCardView(AdminStaffRequiredMixin, SelectApartmentYearFormMixin, L
             if self.request.GET.get('year'):
                 queryset = queryset.filter(start_date__year=self.request.GET.get('year'))
         else:
-            queryset = BigFamilyCard.objects.all()
+            queryset = BigFamilyCard.objects.all().order_by('apartment__number', 'start_date')
             if self.request.GET.get('year'):
                 queryset = queryset.filter(start_date__year=self.request.GET.get('year'))
         return queryset
@@ -523,7 +642,7 @@ class OccupancyView(AdminStaffRequiredMixin, SelectApartmentYearFormMixin, ListV
                                                     apartment__number=self.request.GET.get('apartment')).order_by(
                     "apartment")
         else:
-            queryset = [apartment.get_latest_occupancy for apartment in Apartment.objects.all()]
+            queryset = [apartment.get_latest_occupancy for apartment in Apartment.objects.with_current_state()]
         return queryset
 
 
@@ -564,8 +683,85 @@ class WaterReadoutsImport(AdminStaffRequiredMixin, SuccessMessageMixin, View):
         form = self.form_class(request.POST, request.FILES)
         if form.is_valid():
             data = form.cleaned_data.get('file')
-            import_water_readouts(data)
-            messages.success(self.request, self.success_message)
+            if form.cleaned_data.get('dry_run'):
+                preview = preview_water_readouts(data)
+                return render(request, self.template_name,
+                              {'form': self.form_class(initial={'dry_run': False}),
+                               'preview': preview,
+                               'anomalies': sum(len(apartment['anomalies']) for apartment in preview)})
+            try:
+                created, updated = import_water_readouts(data)
+            except ValidationError as e:
+                form.add_error('file', e)
+                return render(request, self.template_name, {'form': form})
+            messages.success(self.request, f"{self.success_message} (nowe: {created}, zaktualizowane: {updated})")
             return HttpResponseRedirect(reverse_lazy('admin-water-readouts'))
         else:
             return render(request, self.template_name, {'form': form})
+
+
+class BankStatementImport(AdminStaffRequiredMixin, View):
+    template_name = 'bank-statement-import.html'
+    form_class = BankStatementImportForm
+    success_message = "Wyciąg został zaimportowany"
+
+    def get(self, request, *args, **kwargs):
+        return render(request, self.template_name, {'form': self.form_class()})
+
+    def post(self, request, *args, **kwargs):
+        form = self.form_class(request.POST, request.FILES)
+        if form.is_valid():
+            file = form.cleaned_data.get('file')
+            try:
+                result = import_bank_statement(file, source=file.name)
+            except ValidationError as e:
+                form.add_error('file', e)
+                return render(request, self.template_name, {'form': form})
+            messages.success(self.request, f"{self.success_message} (zaksięgowane: {result['matched']}, "
+                                           f"do wyjaśnienia: {result['unmatched']}, "
+                                           f"zaimportowane wcześniej: {result['duplicates']}, "
+                                           f"pominięte obciążenia: {result['debits']})")
+            return HttpResponseRedirect(reverse_lazy('bank-statement-review'))
+        return render(request, self.template_name, {'form': form})
+
+
+class BankStatementReviewView(AdminStaffRequiredMixin, ListView):
+    template_name = 'bank-statement-review.html'
+    queryset = BankStatementLine.objects.filter(status='UNMATCHED')
+    paginate_by = 40
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['form'] = BankStatementLineResolveForm()
+        return context
+
+
+class BankStatementLineResolve(AdminStaffRequiredMixin, View):
+
+    def post(self, request, pk):
+        form = BankStatementLineResolveForm(request.POST)
+        apartment = None
+        if 'ignore' not in request.POST:
+            if not form.is_valid() or not form.cleaned_data['apartment']:
+                messages.error(request, "Wybierz mieszkanie.")
+                return HttpResponseRedirect(reverse_lazy('bank-statement-review'))
+            apartment = Apartment.objects.get(number=form.cleaned_data['apartment'])
+        try:
+            line = resolve_statement_line(BankStatementLine.objects.get(pk=pk), apartment)
+        except ValidationError as e:
+            messages.error(request, e.messages[0])
+        else:
+            if apartment:
+                messages.success(request, f"Wpłata {line.amount}zł zaksięgowana dla mieszkania {apartment.number}.")
+            else:
+                messages.success(request, f"Operacja {line} została pominięta.")
+        return HttpResponseRedirect(reverse_lazy('bank-statement-review'))
+
+
+class QueryMetricsView(AdminStaffRequiredMixin, TemplateView):
+    template_name = 'query-metrics.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['metrics'] = view_metrics()
+        return context